@@ -0,0 +1,85 @@
+"""
+Measure the provider calls and throughput of many concurrent single-text embedding requests, with and without
+the embedding batching. The local provider has a fixed latency per call and a small cost per text, like a
+remote embedding API.
+
+    uv run python -m benchmarks.embedding_batch --requests 5000 --concurrency 500
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from typing import Any
+
+from src.config import LogConfiguration, LoadBalancerConfig, EmbeddingBatchConfig, LoadBalancerStrategy
+from src.model.input import EmbeddingParams
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from src.router.base_provider import BaseLLMProvider
+
+
+class LocalEmbeddingProvider(BaseLLMProvider):
+    def __init__(self, latency: float, latency_per_text: float):
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+        self.calls = 0
+
+    async def completion(self, *_args, **_kwargs) -> Any:
+        pass
+
+    async def embedding(self, param: EmbeddingParams) -> list[Any]:
+        self.calls += 1
+        await asyncio.sleep(self.latency + self.latency_per_text * len(param.texts))
+        return [[0.0] * 8 for _ in param.texts]
+
+
+async def run(args, enabled: bool):
+    impl = LocalEmbeddingProvider(args.latency, args.latency_per_text)
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"bench": [LLMProviderConfig(model_id="local", impl=impl, max_batch_size=args.batch)]},
+            log_config=LogConfiguration(level=logging.WARNING),
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            embedding_batch_config=EmbeddingBatchConfig(enabled=enabled, linger_seconds=args.linger),
+        )
+    )
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def request(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await router.async_embedding(EmbeddingParams(model_group="bench", texts=[f"text {i}"]))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request(i) for i in range(args.requests)))
+    seconds = time.perf_counter() - start
+    await router.close()
+    latencies.sort()
+    sys.stdout.write(
+        f"batching={'on' if enabled else 'off'}: {args.requests / seconds:.0f} requests/s, "
+        f"provider calls={impl.calls}, p50={latencies[len(latencies) // 2] * 1e3:.1f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99)] * 1e3:.1f}ms\n"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=128, help="the max batch size of the provider")
+    parser.add_argument("--linger", type=float, default=0.005)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--latency-per-text", type=float, default=0.0001)
+    args = parser.parse_args()
+
+    sys.stdout.write(f"requests={args.requests} concurrency={args.concurrency} batch={args.batch}\n")
+    asyncio.run(run(args, enabled=False))
+    asyncio.run(run(args, enabled=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Load test of the HTTP gateway against local providers in the same process, through the ASGI transport of httpx,
+so it measures the gateway and the router without the network. With more clients than `--max-in-flight`, the
+excess requests are shed with 503 instead of queueing.
+
+    uv run python -m benchmarks.gateway_load --clients 256 --requests 20000 --max-in-flight 128
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from typing import Any, AsyncIterator
+
+import httpx
+
+from src.config import GatewayConfig, LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.server import GatewayApp
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from src.router.base_provider import BaseLLMProvider
+
+
+class LocalProvider(BaseLLMProvider):
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def completion(self, *_args, **_kwargs) -> Any:
+        await asyncio.sleep(self.latency)
+        return "ok"
+
+    async def stream_completion(self, *_args, **_kwargs) -> AsyncIterator[Any]:
+        for chunk in ("o", "k"):
+            await asyncio.sleep(self.latency / 2)
+            yield chunk
+
+    async def embedding(self, param) -> list[Any]:
+        await asyncio.sleep(self.latency)
+        return [[0.0] * 16 for _ in param.texts]
+
+
+def create_app(args) -> GatewayApp:
+    providers = [LLMProviderConfig(model_id=f"local-{i}", impl=LocalProvider(args.latency)) for i in range(4)]
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"bench": providers},
+            log_config=LogConfiguration(level=logging.ERROR),
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+        )
+    )
+    return GatewayApp(router, GatewayConfig(max_in_flight=args.max_in_flight))
+
+
+async def run(args):
+    app = create_app(args)
+    path, body = {
+        "chat": ("/v1/chat/completions", {"model": "bench", "messages": [{"role": "user", "content": "hello"}]}),
+        "stream": ("/v1/chat/completions", {"model": "bench", "prompt": "hello", "stream": True}),
+        "embeddings": ("/v1/embeddings", {"model": "bench", "input": ["hello"] * 8}),
+    }[args.endpoint]
+    statuses: dict[int, int] = {}
+    latencies = []
+    remaining = args.requests
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.post(path, json=body)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            elif response.status_code == 503:
+                # A shed client backs off, rather than the `Retry-After` of the gateway, to keep the test short.
+                await asyncio.sleep(args.backoff)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(args.clients)))
+        seconds = time.perf_counter() - start
+    await app.router.close()
+
+    latencies.sort()
+    ok = statuses.get(200, 0)
+    sys.stdout.write(
+        f"{args.endpoint}: {args.requests / seconds:.0f} requests/s, {ok / seconds:.0f} ok/s, statuses={statuses}\n"
+    )
+    if latencies:
+        sys.stdout.write(
+            f"latency of ok: p50={latencies[len(latencies) // 2] * 1e3:.1f}ms "
+            f"p99={latencies[int(len(latencies) * 0.99)] * 1e3:.1f}ms\n"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", choices=["chat", "stream", "embeddings"], default="chat")
+    parser.add_argument("--clients", type=int, default=256)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--max-in-flight", type=int, default=128)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--backoff", type=float, default=0.05, help="the wait of a client after a 503")
+    args = parser.parse_args()
+
+    sys.stdout.write(
+        f"clients={args.clients} requests={args.requests} max_in_flight={args.max_in_flight} "
+        f"latency={args.latency * 1000:g}ms\n"
+    )
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
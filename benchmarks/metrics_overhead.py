@@ -0,0 +1,71 @@
+"""
+Measure the throughput of `Router.async_completion` with the stage metrics disabled and enabled, and print the
+stage percentiles of the enabled run.
+
+    uv run python -m benchmarks.metrics_overhead --requests 20000
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from typing import Any
+
+from src.config import MetricsConfig, LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.model.input import RouterParams
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from src.router.base_provider import BaseLLMProvider
+
+
+class LocalProvider(BaseLLMProvider):
+    async def completion(self, *_args, **_kwargs) -> Any:
+        return "ok"
+
+
+async def measure(requests: int, concurrency: int, metrics_config: MetricsConfig) -> tuple[float, Router]:
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"bench": [LLMProviderConfig(model_id="local", impl=LocalProvider())]},
+            log_config=LogConfiguration(level=logging.WARNING),
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            metrics_config=metrics_config,
+        )
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await router.async_completion(RouterParams(model_group="bench", text="benchmark"))
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await router.close()
+    return elapsed, router
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+    disabled, _ = asyncio.run(measure(args.requests, args.concurrency, MetricsConfig()))
+    enabled, router = asyncio.run(measure(args.requests, args.concurrency, MetricsConfig(enabled=True)))
+    sys.stdout.write(
+        f"requests={args.requests} disabled={args.requests / disabled:.0f}req/s "
+        f"enabled={args.requests / enabled:.0f}req/s overhead={(enabled - disabled) / args.requests * 1e6:.1f}us/req\n"
+    )
+    histogram = router.metrics.stage_seconds
+    for labels in histogram.labels():
+        p50, p99 = histogram.quantile(labels, 0.5), histogram.quantile(labels, 0.99)
+        sys.stdout.write(
+            f"{labels[0]:<24} count={histogram.count(labels)} p50={p50 * 1e6:.0f}us p99={p99 * 1e6:.0f}us\n"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Measure the hit rate and lookup cost of the near-duplicate index on a synthetic corpus.
+A share of the prompts are variants of a set of templates, which differ in whitespace, timestamps and ids, and should
+hit once their template was seen, the rest are unique prompts, which should miss.
+
+    uv run python -m benchmarks.near_duplicate --prompts 1000000
+"""
+
+import sys
+import time
+import random
+import argparse
+
+from src.cache.near_duplicate import NearDuplicateIndex, max_distance, signature_of
+
+
+def variant(template: list[str], rng: random.Random) -> str:
+    words = list(template)
+    words.insert(rng.randrange(len(words)), f"id={rng.getrandbits(48):x}")
+    words.insert(rng.randrange(len(words)), time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(rng.getrandbits(31))))
+    separators = [" ", "  ", "\n", " \t"]
+    return "".join(w + rng.choice(separators) for w in words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--prompts", type=int, default=1_000_000)
+    parser.add_argument("--templates", type=int, default=20_000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.6)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vocabulary = [f"{''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(3, 9)))}" for _ in range(20_000)]
+    templates = [rng.choices(vocabulary, k=rng.randint(20, 60)) for _ in range(args.templates)]
+    index = NearDuplicateIndex(capacity=args.prompts)
+    distance = max_distance(args.threshold)
+    owners: dict[str, int] = {}
+    seen: set[int] = set()
+    expected_hits = true_hits = false_hits = 0
+    signature_seconds = lookup_seconds = 0.0
+    lookup_samples = []
+
+    for i in range(args.prompts):
+        if rng.random() < args.duplicate_ratio:
+            template = rng.randrange(args.templates)
+            text = variant(templates[template], rng)
+        else:
+            template = -1
+            text = " ".join(rng.choices(vocabulary, k=rng.randint(20, 60)))
+        start = time.perf_counter()
+        signature = signature_of(text)
+        signed = time.perf_counter()
+        key = index.lookup(signature, distance)
+        looked = time.perf_counter()
+        signature_seconds += signed - start
+        lookup_seconds += looked - signed
+        if i % 100 == 0:
+            lookup_samples.append(looked - start)
+        if template in seen:
+            expected_hits += 1
+        if key is None:
+            key = str(i)
+            owners[key] = template
+            index.add(signature, key)
+            if template >= 0:
+                seen.add(template)
+        elif template >= 0 and owners[key] == template:
+            true_hits += 1
+        else:
+            false_hits += 1
+
+    lookup_samples.sort()
+    p99 = lookup_samples[int(len(lookup_samples) * 0.99)]
+    sys.stdout.write(
+        f"prompts={args.prompts} entries={len(index)} threshold={args.threshold}\n"
+        f"hit rate={true_hits / max(expected_hits, 1):.4f} ({true_hits}/{expected_hits} expected hits) "
+        f"false hits={false_hits}\n"
+        f"signature={signature_seconds / args.prompts * 1e6:.1f}us lookup={lookup_seconds / args.prompts * 1e6:.1f}us "
+        f"p99 signature+lookup={p99 * 1e6:.1f}us\n"
+    )
+
+
+if __name__ == "__main__":
+    main()
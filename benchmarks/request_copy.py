@@ -0,0 +1,90 @@
+"""
+Measure the allocations and time of preparing and logging a request for an attempt and a fallback, with the copy-on-write params
+compared with the deep copies they replaced, on a conversation of about 200 KB.
+
+    uv run python -m benchmarks.request_copy --kilobytes 200
+"""
+
+import sys
+import time
+import base64
+import logging
+import argparse
+import tracemalloc
+from copy import deepcopy
+from typing import Callable
+
+from src.config import RetryConfig, FallbackConfig, LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.model.input import RouterParams
+from src.config.config import RouterConfig
+from src.router.router import Router
+
+
+def conversation(kilobytes: int) -> list:
+    """
+    A multi-turn conversation with a base64 image, half of its size is text.
+    """
+    image = base64.b64encode(b"\x89PNG" * (kilobytes * 128)).decode()
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    turn = "Please review the following paragraph and suggest improvements. " * 16
+    while sum(len(m["content"]) for m in messages if isinstance(m["content"], str)) < kilobytes * 512:
+        messages.append({"role": "user", "content": turn})
+        messages.append({"role": "assistant", "content": turn})
+    image_part = {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{image}"}}
+    messages.append({"role": "user", "content": [{"type": "text", "text": "Describe it."}, image_part]})
+    return messages
+
+
+def deep_copies(router: Router, arg: RouterParams):
+    # The previous implementation, a deep copy to normalize the input, which was logged, and another one to fall back.
+    new_arg = deepcopy(arg)
+    new_arg.retry_config = router.retry_config
+    new_arg.fallback_config = router.fallback_config
+    router.logger.info(f"Normalized input: before {arg} after {new_arg}")
+    fallback = deepcopy(new_arg)
+    fallback.model_group = "fallback"
+    fallback.retry_config = RetryConfig(max_attempt=1)
+    fallback.fallback_config = FallbackConfig(allow_fallback=False)
+
+
+def copy_on_write(router: Router, arg: RouterParams):
+    new_arg = router.normalize_input(arg)
+    new_arg.override(
+        model_group="fallback", retry_config=RetryConfig(max_attempt=1), fallback_config=FallbackConfig(False)
+    )
+
+
+def measure(fn: Callable[[Router, RouterParams], None], router: Router, arg: RouterParams, rounds: int):
+    tracemalloc.start()
+    fn(router, arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(router, arg)
+    return peak, (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--kilobytes", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"bench": []},
+            log_config=LogConfiguration(level=logging.WARNING),
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+        )
+    )
+    arg = RouterParams(model_group="bench", messages=conversation(args.kilobytes))
+    size = sum(len(str(m["content"])) for m in arg.messages)
+    sys.stdout.write(f"conversation={size / 1024:.0f}KB messages={len(arg.messages)}\n")
+    for name, fn in [("deepcopy", deep_copies), ("copy-on-write", copy_on_write)]:
+        peak, seconds = measure(fn, router, arg, args.rounds)
+        sys.stdout.write(f"{name}: peak allocation={peak / 1024:.1f}KB time={seconds * 1e6:.1f}us\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Measure the overhead of `Router.astream_completion` per chunk, compared with iterating the provider directly.
+
+    uv run python -m benchmarks.stream_overhead --chunks 100000
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from typing import Any, AsyncIterator
+
+from src.config import LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.model.input import RouterParams
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from src.router.base_provider import BaseLLMProvider
+
+
+class LocalStreamingProvider(BaseLLMProvider):
+    def __init__(self, chunks: int):
+        self.chunks = chunks
+
+    async def completion(self, *_args, **_kwargs) -> Any:
+        return ""
+
+    async def stream_completion(self, *_args, **_kwargs) -> AsyncIterator[Any]:
+        for i in range(self.chunks):
+            yield i
+
+
+async def measure(chunks: int) -> tuple[float, float]:
+    impl = LocalStreamingProvider(chunks)
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"bench": [LLMProviderConfig(model_id="local", impl=impl)]},
+            log_config=LogConfiguration(level=logging.WARNING),
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+        )
+    )
+    try:
+        start = time.perf_counter()
+        async for _ in impl.stream_completion():
+            pass
+        direct = time.perf_counter() - start
+
+        start = time.perf_counter()
+        async for _ in router.astream_completion(RouterParams(model_group="bench", text="benchmark")):
+            pass
+        routed = time.perf_counter() - start
+    finally:
+        await router.close()
+    return direct, routed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    args = parser.parse_args()
+    direct, routed = asyncio.run(measure(args.chunks))
+    overhead = (routed - direct) / args.chunks * 1e9
+    sys.stdout.write(
+        f"chunks={args.chunks} direct={direct:.3f}s routed={routed:.3f}s overhead={overhead:.0f}ns/chunk\n"
+    )
+
+
+if __name__ == "__main__":
+    main()
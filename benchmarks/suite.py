@@ -0,0 +1,280 @@
+"""
+Benchmark the hot paths of the router, and write the results as JSON so that runs of different commits can be
+compared. A case is run `--repeat` times and its best run is kept, the other benchmarks of this package go deeper
+into a single feature.
+
+    uv run python -m benchmarks.suite --output bench.json
+    uv run python -m benchmarks.suite --quick -k balancer -k router
+    uv run python -m benchmarks.suite --output new.json --compare bench.json --threshold 0.1
+
+With `--compare`, the throughput of each case is compared with the baseline file, and the exit status is 1 if a
+case regressed by more than the threshold.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import subprocess
+from typing import Any, Callable, Awaitable
+from datetime import datetime, timezone
+from dataclasses import field, asdict, dataclass
+
+from src.config import LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.model.input import RouterParams
+from src.cache.memory import MemoryCache
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from src.token.counter import TokenCounter
+from src.utils.context import RouterContext, router_context
+from src.router.base_provider import BaseLLMProvider
+from src.load_balance.rpm_tpm_manager import RpmTpmManager
+
+LOG_CONFIG = LogConfiguration(level=logging.WARNING)
+GROUP = "bench"
+WORDS = "the quick brown fox jumps over the lazy dog".split()
+
+
+@dataclass
+class Result:
+    name: str
+    params: dict[str, Any]
+    ops: int
+    seconds: float
+    ops_per_sec: float = 0
+    ns_per_op: float = 0
+    extra: dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.ops_per_sec = self.ops / self.seconds
+        self.ns_per_op = self.seconds / self.ops * 1e9
+
+    @property
+    def key(self) -> str:
+        return self.name + "".join(f"[{k}={v}]" for k, v in self.params.items())
+
+
+class ZeroLatencyProvider(BaseLLMProvider):
+    async def completion(self, *_args, **_kwargs) -> Any:
+        return "ok"
+
+
+def create_router(providers: int, lb_config: LoadBalancerConfig) -> Router:
+    impl = ZeroLatencyProvider()
+    return Router(
+        RouterConfig(
+            llm_provider_group={
+                GROUP: [
+                    LLMProviderConfig(model_id=f"p{i}", impl=impl, rpm=10**6, tpm=10**9, weight=1, cost=i % 3)
+                    for i in range(providers)
+                ]
+            },
+            log_config=LOG_CONFIG,
+            load_balancer_config=lb_config,
+        )
+    )
+
+
+def words(n: int) -> str:
+    return " ".join(WORDS[i % len(WORDS)] for i in range(n))
+
+
+async def run_workers(concurrency: int, ops: int, op: Callable[[], Awaitable[Any]]) -> float:
+    """
+    Run `ops` operations on `concurrency` workers.
+    :return: the elapsed seconds.
+    """
+    per_worker, rest = divmod(ops, concurrency)
+
+    async def worker(n: int):
+        for _ in range(n):
+            await op()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(per_worker + (i < rest)) for i in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def bench_token_counter(scale: float) -> list[Result]:
+    tc = TokenCounter(LOG_CONFIG)
+    results = []
+    for count, size in ((1, 10), (10, 100), (100, 1000)):
+        messages = [{"role": "user", "content": words(size)} for _ in range(count)]
+        ops = max(10, int(20_000 * scale / count))
+        start = time.perf_counter()
+        for _ in range(ops):
+            tc.token_counter(messages=messages)
+        results.append(Result("token_counter", {"messages": count, "words": size}, ops, time.perf_counter() - start))
+    return results
+
+
+async def bench_memory_cache(scale: float) -> list[Result]:
+    return [await memory_cache_case(concurrency, int(100_000 * scale)) for concurrency in (1, 100)]
+
+
+async def memory_cache_case(concurrency: int, ops: int) -> Result:
+    cache = MemoryCache(LOG_CONFIG)
+    keys = [f"key:{i}" for i in range(16)]
+    counter = iter(range(ops))
+
+    async def op():
+        key = keys[next(counter) % len(keys)]
+        await cache.async_set_value(key, 1)
+        await cache.async_get_value(key)
+
+    seconds = await run_workers(concurrency, ops, op)
+    return Result("memory_cache_set_get", {"concurrency": concurrency}, ops, seconds)
+
+
+async def bench_balancers(scale: float) -> list[Result]:
+    results = []
+    for strategy in LoadBalancerStrategy:
+        dimension = "rpm" if strategy == LoadBalancerStrategy.CAPACITY_BASED_BALANCER else None
+        for providers in (2, 20, 200):
+            router = create_router(providers, LoadBalancerConfig(strategy=strategy, capacity_dimension=dimension))
+            balancer = router.routing_state.get_load_balancer(GROUP)
+            candidates = router.routing_state.providers(GROUP)
+            token = router_context.set(RouterContext(model_group=GROUP, token_count=10))
+            try:
+                ops = max(100, int(200_000 * scale / providers))
+                start = time.perf_counter()
+                for _ in range(ops):
+                    await balancer.schedule_provider(GROUP, candidates, "benchmark")
+                seconds = time.perf_counter() - start
+            finally:
+                router_context.reset(token)
+                await router.close()
+            results.append(
+                Result("schedule_provider", {"strategy": strategy.value, "providers": providers}, ops, seconds)
+            )
+    return results
+
+
+async def bench_rpm_tpm(scale: float) -> list[Result]:
+    return [await rpm_tpm_case(concurrency, int(50_000 * scale)) for concurrency in (1, 100)]
+
+
+async def rpm_tpm_case(concurrency: int, ops: int) -> Result:
+    manager = RpmTpmManager(MemoryCache(LOG_CONFIG), LOG_CONFIG)
+    counter = iter(range(ops))
+
+    async def op():
+        # The occupancy before a call and its conversion to usage after it.
+        provider_id = f"p{next(counter) % 16}"
+        await manager.increase_rpm_occupied(GROUP, provider_id)
+        await manager.increase_tpm_occupied(GROUP, provider_id, 10)
+        await manager.update_rpm_used_usage(GROUP, provider_id)
+        await manager.update_tpm_used_usage(GROUP, provider_id, 10)
+
+    # The usage keys are built from the start minute of the request context.
+    token = router_context.set(RouterContext(model_group=GROUP, token_count=10))
+    try:
+        seconds = await run_workers(concurrency, ops, op)
+    finally:
+        router_context.reset(token)
+    return Result("rpm_tpm_update", {"concurrency": concurrency}, ops, seconds)
+
+
+async def bench_router(scale: float) -> list[Result]:
+    return [await router_case(concurrency, max(concurrency, int(20_000 * scale))) for concurrency in (1, 100, 10_000)]
+
+
+async def router_case(concurrency: int, ops: int) -> Result:
+    """
+    The throughput of the router with a zero-latency provider, its overhead is compared with calling the provider
+    directly at the same concurrency.
+    """
+    router = create_router(2, LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM))
+    impl = router.routing_state.providers(GROUP)[0].impl
+    params = RouterParams(model_group=GROUP, text="benchmark")
+    try:
+        direct = await run_workers(concurrency, ops, lambda: impl.completion(text=params.text))
+        routed = await run_workers(concurrency, ops, lambda: router.async_completion(params))
+    finally:
+        await router.close()
+    overhead = {"overhead_us_per_request": (routed - direct) / ops * 1e6}
+    return Result("router_async_completion", {"concurrency": concurrency}, ops, routed, extra=overhead)
+
+
+CASES: dict[str, Callable[[float], Awaitable[list[Result]]]] = {
+    "token_counter": bench_token_counter,
+    "memory_cache": bench_memory_cache,
+    "balancer": bench_balancers,
+    "rpm_tpm": bench_rpm_tpm,
+    "router": bench_router,
+}
+
+
+def best_of(results: list[list[Result]]) -> list[Result]:
+    return [min(runs, key=lambda r: r.seconds) for runs in zip(*results)]
+
+
+def metadata() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def compare(results: list[Result], baseline_path: str, threshold: float) -> bool:
+    """
+    Print the throughput of each case relative to the baseline.
+    :return: True if no case regressed by more than the threshold.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["key"]: r for r in json.load(f)["results"]}
+    ok = True
+    for result in results:
+        base = baseline.get(result.key)
+        if base is None:
+            sys.stdout.write(f"{result.key:<72} new\n")
+            continue
+        ratio = result.ops_per_sec / base["ops_per_sec"]
+        regressed = ratio < 1 - threshold
+        ok = ok and not regressed
+        sys.stdout.write(f"{result.key:<72} {ratio:6.2f}x{'  REGRESSION' if regressed else ''}\n")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="only", action="append", choices=list(CASES), help="run only these cases")
+    parser.add_argument("--quick", action="store_true", help="run a tenth of the operations, e.g. for a smoke test")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare the results with this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="the relative throughput loss of a regression")
+    args = parser.parse_args()
+    scale = 0.1 if args.quick else 1.0
+
+    results: list[Result] = []
+    for name in args.only or CASES:
+        runs = [asyncio.run(CASES[name](scale)) for _ in range(args.repeat)]
+        for result in best_of(runs):
+            extra = "".join(f" {k}={v:.2f}" for k, v in result.extra.items())
+            sys.stdout.write(
+                f"{result.key:<72} {result.ops_per_sec:>12.0f} ops/s {result.ns_per_op:>10.0f} ns/op{extra}\n"
+            )
+            results.append(result)
+
+    if args.output:
+        report = {"meta": metadata(), "results": [{"key": r.key, **asdict(r)} for r in results]}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Measure the throughput of sync calls from many threads.
+The overhead of the loop is compared on a bare coroutine, between a new event loop per call (`run_async_function`)
+and a shared background loop. A router can't be shared across loops, its locks and tasks are bound to the first one,
+so `Router.completion` is only measured with its background loop.
+
+    uv run python -m benchmarks.sync_throughput --threads 32 --calls 200
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.model.input import RouterParams
+from src.utils.asyncy import BackgroundLoop, run_async_function
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from src.router.base_provider import BaseLLMProvider
+
+
+class LocalProvider(BaseLLMProvider):
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def completion(self, *_args, **_kwargs) -> Any:
+        await asyncio.sleep(self.latency)
+        return "ok"
+
+
+def create_router(latency: float) -> Router:
+    return Router(
+        RouterConfig(
+            llm_provider_group={"bench": [LLMProviderConfig(model_id="local", impl=LocalProvider(latency))]},
+            log_config=LogConfiguration(level=logging.WARNING),
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+        )
+    )
+
+
+def measure(call: Callable[[], Any], threads: int, calls: int) -> tuple[float, int]:
+    def worker(_):
+        errors = 0
+        for _ in range(calls):
+            try:
+                call()
+            except Exception:
+                errors += 1
+        return errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        errors = sum(executor.map(worker, range(threads)))
+    return time.perf_counter() - start, errors
+
+
+def report(name: str, seconds: float, errors: int, total: int, calls: int):
+    sys.stdout.write(
+        f"{name}: {total / seconds:.0f} calls/s, {seconds / calls * 1e3:.2f}ms/call per thread, errors={errors}\n"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    total = args.threads * args.calls
+    sys.stdout.write(f"threads={args.threads} calls={total} latency={args.latency * 1000:g}ms\n")
+
+    report(
+        "bare coroutine, new loop per call",
+        *measure(lambda: run_async_function(asyncio.sleep, args.latency), args.threads, args.calls),
+        total,
+        args.calls,
+    )
+    background = BackgroundLoop()
+    try:
+        report(
+            "bare coroutine, background loop",
+            *measure(lambda: background.run(asyncio.sleep(args.latency)), args.threads, args.calls),
+            total,
+            args.calls,
+        )
+    finally:
+        background.stop()
+
+    router = create_router(args.latency)
+    arg = RouterParams(model_group="bench", text="hello")
+    try:
+        report(
+            "Router.completion", *measure(lambda: router.completion(arg), args.threads, args.calls), total, args.calls
+        )
+    finally:
+        router.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Replay a JSONL trace through the router against simulated providers, open-loop, and compare the balancer strategies.
+The trace is streamed line by line, a request is sent at its recorded `timestamp` (seconds or ISO 8601, relative
+to the first request, scaled by `--speed`) or at `--qps`, whether or not the previous requests completed.
+
+A record is a JSON object, its prompt is `messages`, `prompt` or `text`, and otherwise the string values of the
+record, so any JSONL file with text, e.g. the `requests.jsonl` of the repository, can drive the load.
+
+    uv run python -m benchmarks.trace_replay requests.jsonl --qps 200 --loop 40
+    uv run python -m benchmarks.trace_replay trace.jsonl --speed 2 --strategy random-balancer \\
+        --provider fast:latency=0.02,rpm=600 --provider slow:latency=0.2,sigma=0.8,rpm=6000,errors=0.02
+
+A provider is `name:key=value,...`, with `latency` the median seconds of its log-normal latency, `sigma` its
+spread, `rpm` its rate limit, above which it fails with 429, `errors` the share of calls failing with 500, and
+`cost` and `weight` for the balancers. The providers serve the group `replay`, which falls back to a single
+provider in the group `fallback` when its retries are exhausted.
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import logging
+import argparse
+from typing import Any, Iterator, Optional
+from datetime import datetime
+from contextvars import ContextVar
+from dataclasses import field, dataclass
+
+from src.config import (
+    RetryConfig,
+    FallbackConfig,
+    LogConfiguration,
+    LoadBalancerConfig,
+    LoadBalancerStrategy,
+)
+from src.model.input import RouterParams
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from src.router.base_provider import BaseLLMProvider
+from src.exceptions.exceptions import RateLimitError, InternalServerError
+
+GROUP = "replay"
+FALLBACK_GROUP = "fallback"
+DEFAULT_PROVIDERS = [
+    "fast:latency=0.02,sigma=0.3,rpm=3000,cost=3",
+    "cheap:latency=0.08,sigma=0.5,rpm=6000,cost=1",
+    "flaky:latency=0.03,sigma=1.0,rpm=1200,errors=0.05,cost=2",
+]
+FALLBACK_PROVIDER = "backup:latency=0.05,sigma=0.3,rpm=100000"
+
+
+@dataclass
+class TraceRecord:
+    # Seconds since the first record of the trace, None if the record has no timestamp.
+    offset: Optional[float]
+    text: Optional[str] = None
+    messages: Optional[list] = None
+
+
+def iter_trace(path: str) -> Iterator[TraceRecord]:
+    """
+    Stream the records of a JSONL trace, the blank lines are skipped.
+    :param path:
+    :return:
+    """
+    first: Optional[float] = None
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Invalid JSON at {path}:{number}: {e}") from e
+            timestamp = _timestamp(record.get("timestamp", record.get("ts")))
+            offset = None
+            if timestamp is not None:
+                first = timestamp if first is None else first
+                offset = timestamp - first
+            messages = record.get("messages")
+            if isinstance(messages, list) and messages:
+                yield TraceRecord(offset, messages=messages)
+                continue
+            text = record.get("prompt", record.get("text"))
+            if not isinstance(text, str):
+                text = "\n".join(v for v in record.values() if isinstance(v, str))
+            yield TraceRecord(offset, text=text or " ")
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value).timestamp()
+
+
+@dataclass
+class ProviderSpec:
+    name: str
+    latency: float = 0.05
+    sigma: float = 0.5
+    rpm: int = 6000
+    errors: float = 0.0
+    cost: Optional[float] = None
+    weight: Optional[int] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "ProviderSpec":
+        name, _, options = spec.partition(":")
+        kwargs: dict[str, Any] = {}
+        for option in filter(None, options.split(",")):
+            key, _, value = option.partition("=")
+            if key not in ("latency", "sigma", "rpm", "errors", "cost", "weight"):
+                raise ValueError(f"Unknown option {key!r} of provider {name}")
+            kwargs[key] = int(value) if key in ("rpm", "weight") else float(value)
+        return cls(name, **kwargs)
+
+
+@dataclass
+class RequestStats:
+    calls: int = 0
+    provider_seconds: float = 0
+
+
+# The stats of the request of the current task, shared with the tasks of its fallbacks.
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class SimulatedProvider(BaseLLMProvider):
+    def __init__(self, spec: ProviderSpec, rng: random.Random):
+        """
+        A provider with a log-normal latency, a rate limit and injected errors. The rate limit is a token bucket
+        refilled at `rpm / 60` per second with a burst of one second.
+        :param spec:
+        :param rng:
+        """
+        self.spec = spec
+        self.rng = rng
+        self.rate = spec.rpm / 60
+        self.tokens = max(1.0, self.rate)
+        self.refilled_at = time.monotonic()
+        self.calls = 0
+        self.ok = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    def __repr__(self):
+        return f"SimulatedProvider({self.spec.name})"
+
+    async def completion(self, *_args, **_kwargs) -> Any:
+        self.calls += 1
+        stats = _request_stats.get()
+        start = time.perf_counter()
+        try:
+            return await self._serve()
+        finally:
+            if stats is not None:
+                stats.calls += 1
+                stats.provider_seconds += time.perf_counter() - start
+
+    async def _serve(self) -> str:
+        now = time.monotonic()
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        if self.tokens < 1:
+            self.rate_limited += 1
+            raise RateLimitError(f"{self.spec.name} is over {self.spec.rpm} rpm")
+        self.tokens -= 1
+        await asyncio.sleep(self.spec.latency * math.exp(self.spec.sigma * self.rng.gauss(0, 1)))
+        if self.rng.random() < self.spec.errors:
+            self.failed += 1
+            raise InternalServerError(f"{self.spec.name} failed")
+        self.ok += 1
+        return self.spec.name
+
+
+@dataclass
+class Report:
+    strategy: str
+    sent: int = 0
+    ok: int = 0
+    fallback: int = 0
+    failed: int = 0
+    seconds: float = 0
+    # How late the requests were sent compared with their schedule, the replay is saturated if it grows.
+    max_lag: float = 0
+    latencies: list[float] = field(default_factory=list)
+    # The router time of the requests served by a single provider call, i.e. without retry waits.
+    overheads: list[float] = field(default_factory=list)
+    errors: dict[str, int] = field(default_factory=dict)
+
+
+def create_router(
+    strategy: LoadBalancerStrategy, specs: list[ProviderSpec], fallback: ProviderSpec, args
+) -> tuple[Router, list[SimulatedProvider]]:
+    rng = random.Random(args.seed)
+    impls = [SimulatedProvider(spec, rng) for spec in [*specs, fallback]]
+
+    def provider(impl: SimulatedProvider) -> LLMProviderConfig:
+        spec = impl.spec
+        return LLMProviderConfig(
+            model_id=spec.name, impl=impl, rpm=spec.rpm, tpm=spec.rpm * 1000, cost=spec.cost, weight=spec.weight
+        )
+
+    dimension = "rpm" if strategy == LoadBalancerStrategy.CAPACITY_BASED_BALANCER else None
+    router = Router(
+        RouterConfig(
+            llm_provider_group={GROUP: [provider(i) for i in impls[:-1]], FALLBACK_GROUP: [provider(impls[-1])]},
+            log_config=LogConfiguration(level=logging.CRITICAL),
+            load_balancer_config=LoadBalancerConfig(strategy=strategy, capacity_dimension=dimension),
+            retry_config=RetryConfig(max_attempt=args.max_attempt),
+            fallback_config=FallbackConfig(degraded_map={GROUP: [FALLBACK_GROUP]}, allow_fallback=True),
+            timeout_seconds=args.timeout,
+        )
+    )
+    return router, impls
+
+
+async def replay(strategy: LoadBalancerStrategy, specs: list[ProviderSpec], fallback: ProviderSpec, args) -> Report:
+    router, impls = create_router(strategy, specs, fallback, args)
+    report = Report(strategy.value)
+    tasks: set[asyncio.Task] = set()
+    arrivals = random.Random(args.seed)
+
+    async def send(record: TraceRecord):
+        stats = RequestStats()
+        _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            served_by = await router.async_completion(
+                RouterParams(model_group=GROUP, text=record.text, messages=record.messages)
+            )
+        except Exception as e:
+            report.failed += 1
+            name = type(getattr(e, "last_exception", None) or e).__name__
+            report.errors[name] = report.errors.get(name, 0) + 1
+            return
+        elapsed = time.perf_counter() - start
+        report.ok += 1
+        report.fallback += served_by == fallback.name
+        report.latencies.append(elapsed)
+        if stats.calls == 1:
+            report.overheads.append(elapsed - stats.provider_seconds)
+
+    start = time.perf_counter()
+    due = 0.0
+    try:
+        for _ in range(args.loop):
+            for record in iter_trace(args.trace):
+                if report.sent >= args.limit:
+                    break
+                if args.qps:
+                    due += arrivals.expovariate(args.qps) if args.poisson else 1 / args.qps
+                elif record.offset is None:
+                    raise ValueError("The trace has no timestamps, replay it with --qps")
+                else:
+                    due = record.offset / args.speed
+                delay = start + due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                report.max_lag = max(report.max_lag, -delay)
+                task = asyncio.create_task(send(record))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                report.sent += 1
+        await asyncio.gather(*tasks)
+        report.seconds = time.perf_counter() - start
+    finally:
+        await router.close()
+
+    write_report(report, impls)
+    return report
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return math.nan
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def write_report(report: Report, impls: list[SimulatedProvider]):
+    sent = report.sent or 1
+    calls = sum(i.calls for i in impls) or 1
+    rate_limited = sum(i.rate_limited for i in impls)
+    sys.stdout.write(
+        f"== {report.strategy}: {report.sent} requests in {report.seconds:.1f}s "
+        f"({report.sent / max(report.seconds, 1e-9):.0f} qps, max send lag {report.max_lag * 1e3:.1f}ms)\n"
+        f"   success {report.ok / sent:.1%}, fallback {report.fallback / sent:.1%}, failed {report.failed / sent:.1%}"
+        f"{' ' + str(report.errors) if report.errors else ''}\n"
+        f"   provider calls {calls}, 429 rate {rate_limited / calls:.1%}\n"
+        f"   latency p50={_percentile(report.latencies, 0.5) * 1e3:.1f}ms "
+        f"p99={_percentile(report.latencies, 0.99) * 1e3:.1f}ms, router overhead "
+        f"p50={_percentile(report.overheads, 0.5) * 1e6:.0f}us p99={_percentile(report.overheads, 0.99) * 1e6:.0f}us\n"
+    )
+    for impl in impls:
+        sys.stdout.write(
+            f"   {impl.spec.name:<12} load {impl.calls / calls:6.1%}  ok={impl.ok} 429={impl.rate_limited} "
+            f"500={impl.failed}\n"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="a JSONL trace")
+    parser.add_argument("--qps", type=float, help="send at this rate instead of the recorded timestamps")
+    parser.add_argument("--poisson", action="store_true", help="with --qps, exponential inter-arrival times")
+    parser.add_argument("--speed", type=float, default=1.0, help="the speed-up of the recorded timestamps")
+    parser.add_argument("--loop", type=int, default=1, help="replay the trace this many times, with --qps")
+    parser.add_argument("--limit", type=int, default=sys.maxsize, help="the maximum number of requests")
+    parser.add_argument(
+        "--strategy",
+        action="append",
+        choices=[s.value for s in LoadBalancerStrategy],
+        help="the balancer strategies to compare, default is all",
+    )
+    parser.add_argument("--provider", action="append", help="a simulated provider, see above")
+    parser.add_argument("--fallback-provider", default=FALLBACK_PROVIDER)
+    parser.add_argument("--max-attempt", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.loop > 1 and not args.qps:
+        parser.error("--loop requires --qps, the recorded timestamps are not repeated")
+
+    specs = [ProviderSpec.parse(s) for s in args.provider or DEFAULT_PROVIDERS]
+    fallback = ProviderSpec.parse(args.fallback_provider)
+    strategies = [LoadBalancerStrategy(s) for s in args.strategy] if args.strategy else list(LoadBalancerStrategy)
+    pace = f"{args.qps:g} qps{' poisson' if args.poisson else ''}" if args.qps else f"recorded x{args.speed:g}"
+    sys.stdout.write(f"trace={args.trace} pace={pace} providers={', '.join(s.name for s in specs)}\n")
+    for strategy in strategies:
+        asyncio.run(replay(strategy, specs, fallback, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,3 +13,12 @@ class BaseCache(ABC):
     @abstractmethod
     async def async_get_value(self, key: str, **kwargs) -> Any:
         raise NotImplementedError
+
+    async def async_delete_value(self, key: str, **kwargs):
+        """
+        Delete the value, the default implementation overwrites it with an expired None.
+        :param key:
+        :param kwargs:
+        :return:
+        """
+        await self.async_set_value(key, None, ttl=0, **kwargs)
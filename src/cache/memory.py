@@ -121,6 +121,12 @@ class MemoryCache(BaseCache):
                 return None
             return cache[key]
 
+    async def async_delete_value(self, key: str, **_kwargs):
+        bucket_idx = self._get_bucket_index(key)
+        async with self.locks[bucket_idx]:
+            self.cache_buckets[bucket_idx].pop(key, None)
+            self.ttl_buckets[bucket_idx].pop(key, None)
+
     async def _periodic_cleanup(self):
         while True:
             await asyncio.sleep(self.cleanup_interval)
@@ -0,0 +1,206 @@
+import string
+from array import array
+from typing import Iterable, Optional
+
+from src.model.message import ChatMessageValues
+
+MASK_64 = (1 << 64) - 1
+SIGNATURE_BITS = 64
+# The signature is split into bands, two signatures within `NUM_BANDS - 1` bits are always in a common bucket.
+NUM_BANDS = 4
+BAND_BITS = SIGNATURE_BITS // NUM_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+# Mix the hashes of two adjacent tokens into a bigram feature.
+_BIGRAM_PRIME = 0x100000001B3
+
+# The punctuation separates words, e.g. the parts of dates, times and ids.
+_PUNCTUATION = str.maketrans({c: " " for c in string.punctuation})
+
+
+def prompt_text(text: Optional[str], messages: Optional[list[ChatMessageValues]]) -> Optional[str]:
+    """
+    Flatten the prompt to text.
+    :param text:
+    :param messages:
+    :return: None if the prompt has non-text content, e.g. images, which can't be compared by text.
+    """
+    if not messages:
+        return text
+    parts = [text] if text else []
+    for message in messages:
+        content = message.get("content")
+        parts.append(message.get("role", ""))
+        if isinstance(content, str):
+            parts.append(content)
+        elif content is not None:
+            for part in content:
+                if part.get("type") != "text":
+                    return None
+                parts.append(part["text"])
+    return "\n".join(parts)
+
+
+def normalize(text: str) -> list[str]:
+    """
+    Lowercase and split by whitespace and punctuation. The numbers are kept, the prompts differing only by a number,
+    e.g. an order id or an operand, usually don't have the same answer.
+    :param text:
+    :return: tokens
+    """
+    return text.lower().translate(_PUNCTUATION).split()
+
+
+def simhash(tokens: list[str]) -> int:
+    """
+    64-bit SimHash of the unigrams and bigrams of the tokens.
+    The bits of the feature hashes are counted in bit-sliced counters, i.e. bit i of `planes[j]` is bit j of the
+    count of bit i, which are added with carry-save adders, so a feature costs a few integer operations instead of
+    one per bit. The signatures are only comparable within a process, since `hash` of str is seeded.
+    :param tokens:
+    :return:
+    """
+    hashes = [hash(t) & MASK_64 for t in tokens]
+    features = hashes + [((a * _BIGRAM_PRIME) ^ b) & MASK_64 for a, b in zip(hashes, hashes[1:])]
+    n = len(features)
+    size = n.bit_length() + 2
+    planes = [0] * size
+    # The carries waiting for a pair at each level, they have the weight of the level.
+    pending: list[Optional[int]] = [None] * size
+    it = iter(features)
+    for a in it:
+        b = next(it, 0)
+        level = 0
+        while True:
+            plane = planes[level]
+            u = a ^ b
+            planes[level] = plane ^ u
+            carry = (plane & u) | (a & b)
+            level += 1
+            if pending[level] is None:
+                pending[level] = carry
+                break
+            a, b = pending[level], carry
+            pending[level] = None
+    for level, carry in enumerate(pending):
+        while carry:
+            plane = planes[level]
+            planes[level] = plane ^ carry
+            carry &= plane
+            level += 1
+    # A bit is set if more than half of the features have it, compare the counters with n // 2 from the top bit.
+    threshold = n // 2
+    greater = 0
+    equal = MASK_64
+    for j in range(size - 1, -1, -1):
+        if (threshold >> j) & 1:
+            equal &= planes[j]
+        else:
+            greater |= equal & planes[j]
+            equal &= ~planes[j] & MASK_64
+    return greater
+
+
+class _Generation:
+    __slots__ = ("signatures", "keys", "positions", "heads", "next")
+
+    def __init__(self):
+        self.signatures = array("Q")
+        # The removed entries are None, they stay in the bucket chains until the generation is dropped.
+        self.keys: list[Optional[str]] = []
+        self.positions: dict[str, int] = {}
+        # The chained buckets of each band, heads[b][v] is the latest entry whose band b is v, -1 if none.
+        self.heads = [array("l", [-1]) * (1 << BAND_BITS) for _ in range(NUM_BANDS)]
+        self.next = [array("l") for _ in range(NUM_BANDS)]
+
+
+class NearDuplicateIndex:
+    def __init__(self, capacity: int):
+        """
+        Banded LSH over SimHash signatures, held in integer arrays: each entry costs 8 bytes of signature and
+        8 bytes per band of bucket chain, a C long on 64-bit Linux, besides its key and its position, which is kept
+        to remove the entry. The bucket heads are a fixed 8 bytes per bucket of each band in each generation.
+        The index keeps two generations of at most `capacity` entries, when the current one is full, the previous
+        one is dropped, so the memory is bounded and the recent entries are kept.
+        :param capacity:
+        """
+        if capacity <= 0:
+            raise ValueError(f"Invalid capacity value: {capacity}")
+        self.capacity = capacity
+        self.current = _Generation()
+        self.previous: Optional[_Generation] = None
+
+    def __len__(self):
+        return sum(len(generation.positions) for generation in self._generations())
+
+    def add(self, signature: int, key: str):
+        self.remove(key)
+        generation = self.current
+        if len(generation.keys) >= self.capacity:
+            self.previous = generation
+            generation = self.current = _Generation()
+        index = len(generation.keys)
+        generation.signatures.append(signature)
+        generation.keys.append(key)
+        generation.positions[key] = index
+        for b in range(NUM_BANDS):
+            band = (signature >> (b * BAND_BITS)) & BAND_MASK
+            generation.next[b].append(generation.heads[b][band])
+            generation.heads[b][band] = index
+
+    def remove(self, key: str):
+        """
+        Remove the entry of the key, e.g. once its response is evicted or expired.
+        :param key:
+        :return:
+        """
+        for generation in self._generations():
+            index = generation.positions.pop(key, None)
+            if index is not None:
+                generation.keys[index] = None
+
+    def lookup(self, signature: int, max_distance: int) -> Optional[str]:
+        """
+        Find the nearest entry sharing a band with the signature, within `max_distance` bits.
+        :param signature:
+        :param max_distance: the maximum Hamming distance.
+        :return: the key of the entry, None if not found.
+        """
+        best_key = None
+        best = max_distance + 1
+        for generation in self._generations():
+            signatures = generation.signatures
+            for b in range(NUM_BANDS):
+                nxt = generation.next[b]
+                index = generation.heads[b][(signature >> (b * BAND_BITS)) & BAND_MASK]
+                while index >= 0:
+                    distance = (signatures[index] ^ signature).bit_count()
+                    if distance < best and generation.keys[index] is not None:
+                        best = distance
+                        best_key = generation.keys[index]
+                        if distance == 0:
+                            return best_key
+                    index = nxt[index]
+        return best_key
+
+    def _generations(self) -> Iterable[_Generation]:
+        yield self.current
+        if self.previous is not None:
+            yield self.previous
+
+
+def max_distance(similarity_threshold: float) -> int:
+    """
+    Convert the similarity threshold, i.e. the fraction of equal signature bits, to the maximum Hamming distance.
+    :param similarity_threshold:
+    :return:
+    """
+    return int((1 - similarity_threshold) * SIGNATURE_BITS + 1e-9)
+
+
+def signature_of(text: str) -> Optional[int]:
+    """
+    :param text:
+    :return: None if the text has no token, the signature of an empty prompt would match any other one.
+    """
+    tokens = normalize(text)
+    return simhash(tokens) if tokens else None
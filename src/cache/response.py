@@ -0,0 +1,183 @@
+import sys
+import json
+import time
+import zlib
+from typing import Any, Optional
+from collections import OrderedDict
+
+from pydantic import BaseModel
+
+from src.config import LogConfiguration, ResponseCacheConfig
+from src.cache.base import BaseCache
+from src.router.log import get_logger
+from src.model.message import ChatMessageValues
+from src.cache.near_duplicate import NearDuplicateIndex, prompt_text, max_distance, signature_of
+
+# The first byte of a payload tells whether it's compressed.
+_RAW = b"r"
+_COMPRESSED = b"z"
+# A pydantic model is stored as {"__model__": "module:QualName", "data": ...}.
+_MODEL = "__model__"
+
+
+class ResponseCache:
+    def __init__(self, log_cfg: LogConfiguration, response_cache_config: ResponseCacheConfig, cache: BaseCache):
+        """
+        The responses are encoded as JSON, optionally compressed, and stored in the cache under `response:{key}`.
+        The backend may be shared, so the payloads are data only: a pydantic model, e.g. a `ChatCompletion` of the
+        OpenAI SDK, is restored only if its class is already imported, the payload never imports or runs code.
+        A response which can't be encoded is not cached, a payload which can't be decoded is a miss.
+        The size and expiry of the entries written by this router are indexed in LRU order, so the least recently
+        used entries are deleted from the cache once the total size exceeds the cap.
+        The near-duplicate index of each group maps the signatures of the prompts to their keys, it's local, and the
+        keys are removed from it once their entries are evicted or expired.
+        :param log_cfg:
+        :param response_cache_config:
+        :param cache:
+        """
+        self.logger = get_logger(__name__, log_cfg)
+        self.config = response_cache_config
+        self.cache = cache
+        # key -> (size, expires_at, group), ordered from the least recently used.
+        self.entries: OrderedDict[str, tuple[int, float, Optional[str]]] = OrderedDict()
+        # key -> expires_at, ordered from the first to expire, since the entries have the same TTL.
+        self.expiries: OrderedDict[str, float] = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # The hits served by a similar prompt, they are also counted in `hits`.
+        self.similar_hits = 0
+        self.near_duplicates: dict[str, NearDuplicateIndex] = {}
+
+    def similarity_threshold(self, group: str) -> Optional[float]:
+        return self.config.group_similarity_threshold.get(group, self.config.similarity_threshold)
+
+    def signature(self, group: str, text: Optional[str], messages: Optional[list[ChatMessageValues]]) -> Optional[int]:
+        """
+        The SimHash signature of the prompt, computed once per request and passed to `get` and `set`.
+        :param group:
+        :param text:
+        :param messages:
+        :return: None if the group doesn't match similar prompts, or the prompt has non-text content.
+        """
+        if self.similarity_threshold(group) is None:
+            return None
+        flat = prompt_text(text, messages)
+        return signature_of(flat) if flat is not None else None
+
+    async def get(self, key: str, group: Optional[str] = None, signature: Optional[int] = None) -> tuple[bool, Any]:
+        """
+        :param key:
+        :param group:
+        :param signature: if specified, a miss falls back to the most similar prompt of the group.
+        :return: whether the key or a similar prompt is found, and the response.
+        """
+        found, response = await self._get(key)
+        if not found and signature is not None and group in self.near_duplicates:
+            similar = self.near_duplicates[group].lookup(signature, max_distance(self.similarity_threshold(group)))
+            if similar is not None and similar != key:
+                found, response = await self._get(similar)
+                self.similar_hits += found
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found, response
+
+    async def _get(self, key: str) -> tuple[bool, Any]:
+        payload = await self.cache.async_get_value(self._build_cache_key(key))
+        if payload is None:
+            self._forget(key)
+            return False, None
+        try:
+            response = self._decode(payload)
+        except Exception as e:
+            self.logger.warning(f"Response of {key} can't be decoded: {e}")
+            self._forget(key)
+            return False, None
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        return True, response
+
+    async def set(self, key: str, response: Any, group: Optional[str] = None, signature: Optional[int] = None):
+        try:
+            payload = self._encode(response)
+        except Exception as e:
+            self.logger.warning(f"Response of {key} is not cacheable: {e}")
+            return
+        if len(payload) > self.config.max_bytes:
+            self.logger.debug(f"Response of {key} is larger than the cache")
+            return
+        await self.cache.async_set_value(self._build_cache_key(key), payload, ttl=self.config.ttl_seconds)
+        self._forget(key)
+        expires_at = time.time() + self.config.ttl_seconds
+        self.entries[key] = (len(payload), expires_at, group)
+        self.expiries[key] = expires_at
+        self.total_bytes += len(payload)
+        if signature is not None:
+            index = self.near_duplicates.get(group)
+            if index is None:
+                index = self.near_duplicates[group] = NearDuplicateIndex(self.config.max_similar_entries)
+            index.add(signature, key)
+        await self._evict()
+
+    async def _evict(self):
+        now = time.time()
+        while self.expiries:
+            key, expires_at = next(iter(self.expiries.items()))
+            if expires_at > now:
+                break
+            self._forget(key)
+        while self.total_bytes > self.config.max_bytes and self.entries:
+            key = next(iter(self.entries))
+            self._forget(key)
+            await self.cache.async_delete_value(self._build_cache_key(key))
+            self.logger.debug(f"Response of {key} is evicted")
+
+    def _forget(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        size, _, group = entry
+        self.total_bytes -= size
+        del self.expiries[key]
+        index = self.near_duplicates.get(group)
+        if index is not None:
+            index.remove(key)
+
+    def _encode(self, response: Any) -> bytes:
+        data = json.dumps(response, default=_encode_model, ensure_ascii=False, separators=(",", ":")).encode()
+        if self.config.compress_min_bytes is not None and len(data) >= self.config.compress_min_bytes:
+            return _COMPRESSED + zlib.compress(data)
+        return _RAW + data
+
+    @staticmethod
+    def _decode(payload: bytes) -> Any:
+        data = payload[1:]
+        if payload[:1] == _COMPRESSED:
+            data = zlib.decompress(data)
+        return json.loads(data, object_hook=_decode_model)
+
+    @staticmethod
+    def _build_cache_key(key: str) -> str:
+        return f"response:{key}"
+
+
+def _encode_model(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        cls = type(obj)
+        return {_MODEL: f"{cls.__module__}:{cls.__qualname__}", "data": obj.model_dump(mode="json")}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _decode_model(obj: dict[str, Any]) -> Any:
+    if _MODEL not in obj:
+        return obj
+    module, _, name = obj[_MODEL].partition(":")
+    # The class is looked up among the imported modules, the payload must not import a module.
+    cls = sys.modules.get(module)
+    for attr in name.split("."):
+        cls = getattr(cls, attr, None)
+    if not (isinstance(cls, type) and issubclass(cls, BaseModel)):
+        raise ValueError(f"Unknown model {obj[_MODEL]}")
+    return cls.model_validate(obj["data"])
@@ -1,15 +1,33 @@
 from src.config.log import LogConfiguration
 from src.config.retry import RetryConfig, RetryPolicy, RetryStrategy
+from src.config.gateway import GatewayConfig
+from src.config.hedging import HedgingConfig
+from src.config.metrics import MetricsConfig
 from src.config.cooldown import CooldownConfig, AllowedFailsPolicy
-from src.config.fallback import FallbackConfig
+from src.config.fallback import FallbackMode, FallbackConfig
+from src.config.embedding import EmbeddingBatchConfig
+from src.config.tokenizer import TokenizerSpec, TokenizerConfig
+from src.config.health_check import HealthCheckConfig
 from src.config.load_balancer import LoadBalancerConfig, LoadBalancerStrategy
+from src.config.response_cache import ResponseCacheConfig
+from src.config.outlier_detection import OutlierDetectionConfig
 
 __all__ = [
     "CooldownConfig",
     "AllowedFailsPolicy",
     "LoadBalancerStrategy",
     "FallbackConfig",
+    "FallbackMode",
+    "EmbeddingBatchConfig",
+    "GatewayConfig",
+    "MetricsConfig",
+    "TokenizerConfig",
+    "TokenizerSpec",
+    "HedgingConfig",
+    "HealthCheckConfig",
     "LoadBalancerConfig",
+    "OutlierDetectionConfig",
+    "ResponseCacheConfig",
     "LogConfiguration",
     "RetryConfig",
     "RetryStrategy",
@@ -7,11 +7,18 @@ from dataclasses import field, asdict, dataclass
 from src.config.log import LogConfiguration
 from src.utils.hash import generate_unique_id
 from src.config.retry import RetryConfig
+from src.config.hedging import HedgingConfig
+from src.config.metrics import MetricsConfig
 from src.config.cooldown import CooldownConfig
 from src.config.fallback import FallbackConfig
 from src.utils.validator import validate_integer
+from src.config.embedding import EmbeddingBatchConfig
+from src.config.tokenizer import TokenizerConfig
+from src.config.health_check import HealthCheckConfig
 from src.config.load_balancer import LoadBalancerConfig, LoadBalancerStrategy
 from src.router.base_provider import BaseLLMProvider
+from src.config.response_cache import ResponseCacheConfig
+from src.config.outlier_detection import OutlierDetectionConfig
 
 
 @dataclass
@@ -19,9 +26,18 @@ class LLMProviderConfig:
     id: str = field(init=False)  # We generate a unique id for each provider, and it's used to identify the provider.
     model_id: str  # e.g. qwen2.5:14b-instruct / gpt-4o-2024-11-20
     impl: BaseLLMProvider
+    # The limits are not part of the identity of the provider, so changing them on a reload keeps its state.
     rpm: Optional[int] = None
     tpm: Optional[int] = None
     weight: Optional[int] = None
+    # Cost per 1K tokens, used by the cost based balancer. It's not part of the identity of the provider.
+    cost: Optional[float] = None
+    # The limits of an embedding call, the batches are split to fit every provider of the group.
+    max_batch_size: Optional[int] = None
+    max_batch_tokens: Optional[int] = None
+    # Part of the identity, it tells apart the deployments of a model with the same implementation class,
+    # e.g. two endpoints or API keys, whose implementations have the same repr.
+    name: Optional[str] = None
 
     def __post_init__(self):
         # The provider can not be same.
@@ -29,17 +45,16 @@ class LLMProviderConfig:
 
     def serialize(self, indent: Optional[int] = None):
         """
-        Convert the object to a compact JSON string ordered by keys.
+        Convert the identity of the provider to a compact JSON string ordered by keys.
         :param indent:
         :return:
         """
+        identity = {"model_id": self.model_id, "impl": self.impl.__repr__()}
+        # The ids of the providers without a name are unchanged.
+        if self.name is not None:
+            identity["name"] = self.name
         return json.dumps(
-            {
-                "model_id": self.model_id,
-                "impl": self.impl.__repr__(),
-                "rpm": self.rpm,
-                "tpm": self.tpm,
-            },
+            identity,
             default=str,
             indent=indent,
             separators=(",", ":"),
@@ -52,10 +67,21 @@ class RouterConfig:
     llm_provider_group: dict[str, list[LLMProviderConfig]]
     log_config: LogConfiguration = field(default_factory=LogConfiguration)
     load_balancer_config: LoadBalancerConfig = field(default_factory=LoadBalancerConfig)
+    # Override the load balancer config of a model group, e.g. {"chat": LoadBalancerConfig(strategy=LATENCY...)}
+    group_load_balancer_config: dict[str, LoadBalancerConfig] = field(default_factory=dict)
     retry_config: RetryConfig = field(default_factory=RetryConfig)
     fallback_config: FallbackConfig = field(default_factory=FallbackConfig)
     cooldown_config: CooldownConfig = field(default_factory=CooldownConfig)
+    hedging_config: HedgingConfig = field(default_factory=HedgingConfig)
+    health_check_config: HealthCheckConfig = field(default_factory=HealthCheckConfig)
+    outlier_detection_config: OutlierDetectionConfig = field(default_factory=OutlierDetectionConfig)
+    response_cache_config: ResponseCacheConfig = field(default_factory=ResponseCacheConfig)
+    embedding_batch_config: EmbeddingBatchConfig = field(default_factory=EmbeddingBatchConfig)
+    metrics_config: MetricsConfig = field(default_factory=MetricsConfig)
+    tokenizer_config: TokenizerConfig = field(default_factory=TokenizerConfig)
     timeout_seconds: int = 30
+    # Coalesce the concurrent identical requests into one provider call.
+    single_flight_enabled: bool = False
 
     def serialize(self, indent: Optional[int] = None):
         """
@@ -71,11 +97,39 @@ class RouterConfig:
             raise ValueError("No provider group is specified.")
         for i in ["timeout_seconds"]:
             validate_integer(self, i)
-        if self.load_balancer_config.strategy == LoadBalancerStrategy.CAPACITY_BASED_BALANCER:
-            dimension = self.load_balancer_config.capacity_dimension
+        self._validate_provider_ids()
+        for group in self.group_load_balancer_config:
+            if group not in self.llm_provider_group:
+                raise ValueError(f"Load balancer config is specified for unknown group {group}.")
+        for group, providers in self.llm_provider_group.items():
+            lb_config = self.get_load_balancer_config(group)
+            if lb_config.strategy != LoadBalancerStrategy.CAPACITY_BASED_BALANCER:
+                continue
+            dimension = lb_config.capacity_dimension
             if dimension is None:
                 raise ValueError("Capacity dimension is required for capacity based balancer.")
-            for providers in self.llm_provider_group.values():
-                for p in providers:
-                    if not hasattr(p, dimension) or getattr(p, dimension) is None:
-                        raise ValueError(f"Capacity dimension {dimension} is not found.")
+            for p in providers:
+                if not hasattr(p, dimension) or getattr(p, dimension) is None:
+                    raise ValueError(f"Capacity dimension {dimension} is not found.")
+
+    def _validate_provider_ids(self):
+        """
+        The usage, circuit, latency and cache of a provider are keyed by its id. A provider may be shared by several
+        groups, but two deployments with the same id would share their state, they need distinct names.
+        :return:
+        """
+        seen: dict[str, LLMProviderConfig] = {}
+        for group, providers in self.llm_provider_group.items():
+            ids = set()
+            for p in providers:
+                if p.id in ids:
+                    raise ValueError(f"Provider {p.model_id} is specified twice in group {group}, set distinct names.")
+                ids.add(p.id)
+                other = seen.setdefault(p.id, p)
+                if other.impl is not p.impl:
+                    raise ValueError(
+                        f"Providers {p.model_id} have the same id but different implementations, set distinct names."
+                    )
+
+    def get_load_balancer_config(self, group: str) -> LoadBalancerConfig:
+        return self.group_load_balancer_config.get(group, self.load_balancer_config)
@@ -2,6 +2,7 @@ import json
 from typing import Optional
 from dataclasses import field, asdict, dataclass
 
+from src.cache.base import BaseCache
 from src.utils.validator import validate_integer
 
 
@@ -27,12 +28,49 @@ class AllowedFailsPolicy:
 class CooldownConfig:
     """
     The cooldown duration (in seconds) for the provider if num_fails exceeds `allowed_fails`. Default is 60.
+    The cooldown is a circuit breaker per provider:
+    - CLOSED: the provider is available, the successes and failures are counted.
+    - OPEN: the provider is in cooldown for `cooldown_seconds`, multiplied by `cooldown_multiplier` for each time
+      it's opened again before it recovers, up to `max_cooldown_seconds`.
+    - HALF_OPEN: after the cooldown, at most `half_open_max_probes` requests are sent to the provider,
+      a success closes the circuit, a failure opens it again.
+    If `shared_cache` is specified, e.g. a Redis cache shared by the routers, the circuits opened by a router are
+    written to it, and each router adopts the circuits opened by the others every `shared_sync_seconds`.
+    The successes and failures are counted over the last `window_seconds`, split into `num_buckets` sub-windows.
+    A provider is put in cooldown if the failures in the window exceed the allowed fails, the failure rate is at least
+    `failure_rate_threshold`, and there are at least `min_request_volume` calls in the window.
+    Only an authentication error, or a rate limit with a Retry-After header, puts the provider in cooldown at once.
     """
 
     cooldown_seconds: int = 60
     general_allowed_fails: int = 3
     allowed_fails_policy: AllowedFailsPolicy = field(default_factory=AllowedFailsPolicy)
+    half_open_max_probes: int = 1
+    cooldown_multiplier: float = 2
+    max_cooldown_seconds: int = 600
+    shared_cache: Optional[BaseCache] = None
+    shared_sync_seconds: float = 1
+    failure_rate_threshold: float = 0.5
+    min_request_volume: int = 5
+    window_seconds: int = 60
+    num_buckets: int = 6
 
     def __post_init__(self):
-        for i in ["cooldown_seconds", "general_allowed_fails"]:
+        for i in [
+            "cooldown_seconds",
+            "general_allowed_fails",
+            "half_open_max_probes",
+            "max_cooldown_seconds",
+            "min_request_volume",
+            "window_seconds",
+            "num_buckets",
+        ]:
             validate_integer(self, i)
+        if not 0 <= self.failure_rate_threshold <= 1:
+            raise ValueError(f"Invalid failure_rate_threshold value: {self.failure_rate_threshold}")
+        if self.window_seconds == 0 or self.num_buckets == 0:
+            raise ValueError(f"Invalid failure rate window: {self.window_seconds} {self.num_buckets}")
+        if self.shared_sync_seconds <= 0:
+            raise ValueError(f"Invalid shared_sync_seconds value: {self.shared_sync_seconds}")
+        if self.cooldown_multiplier < 1:
+            raise ValueError(f"Invalid cooldown_multiplier value: {self.cooldown_multiplier}")
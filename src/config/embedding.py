@@ -0,0 +1,25 @@
+from typing import Optional
+from dataclasses import dataclass
+
+
+@dataclass
+class EmbeddingBatchConfig:
+    """
+    The texts of the embedding requests are sent in batches, a batch holds at most `max_batch_size` texts and
+    `max_batch_tokens` tokens, or the lower limits of the providers of the group.
+    If enabled, the concurrent requests of a group are merged: a batch is sent when it's full, or `linger_seconds`
+    after its first text. The merged batches use the retry, fallback and timeout of the router.
+    """
+
+    enabled: bool = False
+    linger_seconds: float = 0.005
+    max_batch_size: int = 256
+    max_batch_tokens: Optional[int] = None
+
+    def __post_init__(self):
+        if self.max_batch_size <= 0:
+            raise ValueError(f"Invalid max_batch_size value: {self.max_batch_size}")
+        if self.max_batch_tokens is not None and self.max_batch_tokens <= 0:
+            raise ValueError(f"Invalid max_batch_tokens value: {self.max_batch_tokens}")
+        if self.linger_seconds < 0:
+            raise ValueError(f"Invalid linger_seconds value: {self.linger_seconds}")
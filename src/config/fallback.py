@@ -1,9 +1,58 @@
+from enum import Enum
 from typing import Optional
 from dataclasses import field, dataclass
 
 
+class FallbackMode(Enum):
+    # Try the next group when the previous one failed.
+    SEQUENTIAL = "sequential"
+    # Start the next group when the previous one failed or is slower than `stagger_seconds`.
+    STAGGERED = "staggered"
+    # Start all the groups at once.
+    RACE = "race"
+
+
 @dataclass
 class FallbackConfig:
+    """
+    The fallback chain of a group is its fallback groups in order, the fallback groups don't fall back themselves,
+    e.g. {"GPT-4": ["GPT-3.5"], "GPT-3.5": ["GPT-3"]} falls back from GPT-4 to GPT-3.5 only.
+    A group falling back to itself, or a cycle such as {"a": ["b"], "b": ["a"]}, is rejected as a config error.
+    In the racing modes, the first successful group wins and the other calls are cancelled.
+    """
+
     # fallback model group to another, {"GPT-4": ["GPT-3.5"]}
     degraded_map: dict[str, list[str]] = field(default_factory=dict)
     allow_fallback: Optional[bool] = None
+    mode: FallbackMode = FallbackMode.SEQUENTIAL
+    stagger_seconds: float = 0.5
+    chains: dict[str, tuple[str, ...]] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        if self.stagger_seconds < 0:
+            raise ValueError(f"Invalid stagger_seconds value: {self.stagger_seconds}")
+        self.chains = compile_chains(self.degraded_map)
+
+
+def compile_chains(degraded_map: dict[str, list[str]]) -> dict[str, tuple[str, ...]]:
+    """
+    The fallback groups of each group in order, without duplicates.
+    :param degraded_map:
+    :return:
+    """
+    # The groups whose fallback groups are checked, and those on the current path.
+    done: set[str] = set()
+
+    def visit(group: str, path: list[str]):
+        if group in path:
+            cycle = " -> ".join(path[path.index(group) :] + [group])
+            raise ValueError(f"Fallback cycle is found: {cycle}")
+        if group in done:
+            return
+        for fallback_group in degraded_map.get(group, []):
+            visit(fallback_group, path + [group])
+        done.add(group)
+
+    for g in degraded_map:
+        visit(g, [])
+    return {group: tuple(dict.fromkeys(fallback_groups)) for group, fallback_groups in degraded_map.items()}
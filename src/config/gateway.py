@@ -0,0 +1,22 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class GatewayConfig:
+    """
+    The HTTP gateway admits at most `max_in_flight` requests, a request beyond it is rejected at once with 503 and
+    `Retry-After: retry_after_seconds`, before its body is read, so an overloaded gateway sheds load cheaply instead
+    of queueing requests which will miss their deadline. A streaming request is in flight until its stream ends.
+    """
+
+    max_in_flight: int = 512
+    max_body_bytes: int = 16 * 1024 * 1024
+    retry_after_seconds: int = 1
+
+    def __post_init__(self):
+        if self.max_in_flight <= 0:
+            raise ValueError(f"Invalid max_in_flight value: {self.max_in_flight}")
+        if self.max_body_bytes <= 0:
+            raise ValueError(f"Invalid max_body_bytes value: {self.max_body_bytes}")
+        if self.retry_after_seconds < 0:
+            raise ValueError(f"Invalid retry_after_seconds value: {self.retry_after_seconds}")
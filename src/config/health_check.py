@@ -0,0 +1,32 @@
+from dataclasses import dataclass
+
+from src.utils.validator import validate_integer
+
+
+@dataclass
+class HealthCheckConfig:
+    """
+    Probe the providers in the background with `BaseLLMProvider.health_check`.
+    A provider is probed every `interval_seconds`, the interval is multiplied by `backoff_multiplier` after each
+    healthy probe up to `max_interval_seconds`, and reset after an unhealthy probe.
+    Each interval is randomized by +/- `jitter`, at most `max_concurrency` probes are in flight.
+    """
+
+    enabled: bool = False
+    interval_seconds: float = 10
+    max_interval_seconds: float = 300
+    backoff_multiplier: float = 2
+    jitter: float = 0.1
+    max_concurrency: int = 4
+    timeout_seconds: float = 5
+
+    def __post_init__(self):
+        validate_integer(self, "max_concurrency")
+        if self.interval_seconds <= 0 or self.max_interval_seconds < self.interval_seconds:
+            raise ValueError(f"Invalid interval: {self.interval_seconds} {self.max_interval_seconds}")
+        if self.backoff_multiplier < 1:
+            raise ValueError(f"Invalid backoff_multiplier value: {self.backoff_multiplier}")
+        if not 0 <= self.jitter < 1:
+            raise ValueError(f"Invalid jitter value: {self.jitter}")
+        if self.max_concurrency == 0:
+            raise ValueError("Invalid max_concurrency value: 0")
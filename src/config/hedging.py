@@ -0,0 +1,33 @@
+from typing import Optional
+from dataclasses import dataclass
+
+
+@dataclass
+class HedgingConfig:
+    """
+    If the first provider has not responded within the hedging threshold, the same request is sent to another
+    provider of the group, the first successful response wins and the other call is cancelled.
+    The threshold is `delay_seconds` if specified, otherwise the `percentile` of the recent latencies of the group,
+    no request is hedged until the group has `min_samples` latencies.
+    Every request earns `budget_ratio` hedging token, a hedged request costs one token, so at most `budget_ratio`
+    extra requests are sent in the long run, and at most `max_budget` hedged requests in a burst.
+    """
+
+    enabled: bool = False
+    delay_seconds: Optional[float] = None
+    percentile: float = 0.95
+    min_samples: int = 20
+    budget_ratio: float = 0.05
+    max_budget: float = 10
+
+    def __post_init__(self):
+        if self.delay_seconds is not None and self.delay_seconds < 0:
+            raise ValueError(f"Invalid delay_seconds value: {self.delay_seconds}")
+        if not 0 < self.percentile <= 1:
+            raise ValueError(f"Invalid percentile value: {self.percentile}")
+        if not 0 <= self.budget_ratio <= 1:
+            raise ValueError(f"Invalid budget_ratio value: {self.budget_ratio}")
+        if self.min_samples < 0:
+            raise ValueError(f"Invalid min_samples value: {self.min_samples}")
+        if self.max_budget < 1:
+            raise ValueError(f"Invalid max_budget value: {self.max_budget}")
@@ -2,6 +2,8 @@ from enum import Enum
 from typing import Literal, Optional
 from dataclasses import dataclass
 
+from src.utils.validator import validate_integer
+
 
 class LoadBalancerStrategy(Enum):
     CAPACITY_BASED_BALANCER = "capacity-based-balancer"
@@ -15,8 +17,16 @@ class LoadBalancerStrategy(Enum):
 class LoadBalancerConfig:
     strategy: LoadBalancerStrategy = LoadBalancerStrategy.CAPACITY_BASED_BALANCER
     capacity_dimension: Optional[Literal["rpm", "tpm", "weight"]] = None
+    # If enabled, the eligible providers of each group are precompiled into a routing table by a background task,
+    # and the scheduling on the hot path is a pick from that snapshot plus a cheap validation against the limits.
+    routing_table_enabled: bool = False
+    # How often the routing table is recomputed, cooldown events trigger an earlier refresh.
+    routing_table_refresh_ms: int = 1000
 
     def __post_init__(self):
         if self.strategy == LoadBalancerStrategy.CAPACITY_BASED_BALANCER:
             if self.capacity_dimension not in ["rpm", "tpm", "weight"]:
                 raise ValueError(f"Invalid capacity dimension: {self.capacity_dimension}")
+        validate_integer(self, "routing_table_refresh_ms")
+        if self.routing_table_refresh_ms == 0:
+            raise ValueError("Invalid routing_table_refresh_ms value: 0")
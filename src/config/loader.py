@@ -0,0 +1,121 @@
+import json
+import types
+import importlib
+from enum import Enum
+from typing import Any, Union, Literal, get_args, get_origin, get_type_hints
+from pathlib import Path
+from dataclasses import fields, is_dataclass
+
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.base_provider import BaseLLMProvider
+
+
+def read_config_file(path: Union[str, Path]) -> dict[str, Any]:
+    """
+    Read a JSON or YAML config file, YAML requires PyYAML.
+    :param path:
+    :return:
+    """
+    path = Path(path)
+    if path.suffix not in (".json", ".yaml", ".yml"):
+        raise ValueError(f"Unsupported config file type: {path.suffix}, expected .json, .yaml or .yml")
+    text = path.read_text(encoding="utf-8")
+    if path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError as e:
+            raise ImportError("Loading a YAML config requires PyYAML: pip install pyyaml") from e
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError(f"Invalid config file {path}: the top level must be a mapping")
+    return data
+
+
+class ConfigLoader:
+    def __init__(self):
+        """
+        Build a `RouterConfig` from the data of a config file. The fields are those of the config dataclasses, the
+        enums are given by value or name, and a provider is built from its implementation class and parameters:
+
+            llm_provider_group:
+              chat:
+                - model_id: gpt-4o
+                  impl: my_service.providers:OpenAIProvider
+                  params: {base_url: "https://api.openai.com/v1"}
+                  rpm: 500
+
+        The id of a provider is derived from the repr of its implementation, so the loader reuses the implementation
+        of the same class and parameters across loads, and an unchanged provider keeps its id, usage and cooldown
+        when the config is reloaded.
+        """
+        self._impls: dict[tuple[str, str], BaseLLMProvider] = {}
+
+    def load(self, path: Union[str, Path]) -> RouterConfig:
+        return self.build(read_config_file(path))
+
+    def build(self, data: dict[str, Any]) -> RouterConfig:
+        data = dict(data)
+        groups = data.pop("llm_provider_group", None)
+        if not isinstance(groups, dict):
+            raise ValueError("'llm_provider_group' must be a mapping of group to providers")
+        provider_groups = {group: [self._build_provider(p) for p in providers] for group, providers in groups.items()}
+        return RouterConfig(llm_provider_group=provider_groups, **_build_kwargs(RouterConfig, data))
+
+    def _build_provider(self, data: dict[str, Any]) -> LLMProviderConfig:
+        data = dict(data)
+        spec = data.pop("impl", None)
+        if not isinstance(spec, str):
+            raise ValueError(f"Provider {data.get('model_id')} requires 'impl' as 'module:Class'")
+        params = data.pop("params", None) or {}
+        return LLMProviderConfig(impl=self._get_impl(spec, params), **_build_kwargs(LLMProviderConfig, data))
+
+    def _get_impl(self, spec: str, params: dict[str, Any]) -> BaseLLMProvider:
+        key = (spec, json.dumps(params, sort_keys=True, default=str))
+        impl = self._impls.get(key)
+        if impl is None:
+            module, _, name = spec.partition(":")
+            if not module or not name:
+                raise ValueError(f"Invalid impl {spec!r}, expected 'module:Class'")
+            impl = getattr(importlib.import_module(module), name)(**params)
+            if not isinstance(impl, BaseLLMProvider):
+                raise ValueError(f"{spec} is not a BaseLLMProvider")
+            self._impls[key] = impl
+        return impl
+
+
+def _build_kwargs(cls: type, data: dict[str, Any]) -> dict[str, Any]:
+    hints = get_type_hints(cls)
+    names = {f.name for f in fields(cls) if f.init}
+    kwargs = {}
+    for key, value in data.items():
+        if key not in names:
+            raise ValueError(f"Unknown field {key!r} of {cls.__name__}")
+        kwargs[key] = _convert(hints[key], value)
+    return kwargs
+
+
+def _convert(tp: Any, value: Any) -> Any:
+    if value is None:
+        return None
+    origin = get_origin(tp)
+    if origin in (Union, types.UnionType):
+        args = [arg for arg in get_args(tp) if arg is not type(None)]
+        return _convert(args[0], value) if len(args) == 1 else value
+    if origin is dict:
+        _, value_type = get_args(tp)
+        return {k: _convert(value_type, v) for k, v in value.items()}
+    if origin is list:
+        (item_type,) = get_args(tp)
+        return [_convert(item_type, v) for v in value]
+    if origin is Literal or not isinstance(tp, type):
+        return value
+    if is_dataclass(tp):
+        return tp(**_build_kwargs(tp, value))
+    if issubclass(tp, Enum) and not isinstance(value, tp):
+        try:
+            return tp(value)
+        except ValueError:
+            return tp[value]
+    return value
@@ -0,0 +1,24 @@
+from dataclasses import field, dataclass
+
+# Seconds, from the overhead of the router to the latency of the providers.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+@dataclass
+class MetricsConfig:
+    """
+    If enabled, the stages of each request are timed into histograms labeled by stage, group and provider:
+    `token_counter`, `get_available_providers`, `schedule_provider`, `usage_accounting`, `provider_call`,
+    `retry_wait` and the whole `request`. If `tracing_enabled`, each stage is also an OpenTelemetry span, which
+    requires opentelemetry-api, the spans are exported by the SDK configured by the application.
+    The gauges of the RPM/TPM usage, cooldown and queues are collected when the metrics are read.
+    """
+
+    enabled: bool = False
+    tracing_enabled: bool = False
+    buckets: tuple[float, ...] = field(default=DEFAULT_BUCKETS)
+
+    def __post_init__(self):
+        self.buckets = tuple(self.buckets)
+        if not self.buckets or any(b <= 0 for b in self.buckets) or list(self.buckets) != sorted(set(self.buckets)):
+            raise ValueError(f"Invalid buckets value: {self.buckets}")
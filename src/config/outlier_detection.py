@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class OutlierDetectionConfig:
+    """
+    Eject the providers which are much slower than the rest of their group, similar to the outlier detection of Envoy.
+    Every `interval_seconds`, the `percentile` latency of each provider with at least `min_samples` latencies is
+    compared with the median of the same percentile of the other providers in the group, a provider is ejected if
+    it is more than `threshold_multiplier` times slower.
+    An ejected provider is unavailable for `base_ejection_seconds` multiplied by the number of times it was ejected,
+    up to `max_ejection_seconds`. At most `max_ejection_percent` of a group is ejected at the same time.
+    """
+
+    enabled: bool = False
+    interval_seconds: float = 10
+    percentile: float = 0.9
+    threshold_multiplier: float = 3
+    min_samples: int = 20
+    base_ejection_seconds: float = 30
+    max_ejection_seconds: float = 300
+    max_ejection_percent: float = 50
+
+    def __post_init__(self):
+        if self.interval_seconds <= 0:
+            raise ValueError(f"Invalid interval_seconds value: {self.interval_seconds}")
+        if not 0 < self.percentile <= 1:
+            raise ValueError(f"Invalid percentile value: {self.percentile}")
+        if self.threshold_multiplier <= 1:
+            raise ValueError(f"Invalid threshold_multiplier value: {self.threshold_multiplier}")
+        if self.min_samples < 1:
+            raise ValueError(f"Invalid min_samples value: {self.min_samples}")
+        if self.base_ejection_seconds <= 0 or self.max_ejection_seconds < self.base_ejection_seconds:
+            raise ValueError(f"Invalid ejection seconds: {self.base_ejection_seconds} {self.max_ejection_seconds}")
+        if not 0 <= self.max_ejection_percent <= 100:
+            raise ValueError(f"Invalid max_ejection_percent value: {self.max_ejection_percent}")
@@ -0,0 +1,45 @@
+from typing import Optional
+from dataclasses import field, dataclass
+
+from src.cache.base import BaseCache
+
+
+@dataclass
+class ResponseCacheConfig:
+    """
+    Cache the responses of the successful completions by the canonical hash of the request, see
+    `RouterParams.request_key`. A cache hit skips the token counting, scheduling and RPM/TPM accounting.
+    The entries expire after `ttl_seconds`, and the least recently used entries are evicted once their total size
+    exceeds `max_bytes`. The payloads larger than `compress_min_bytes` are compressed, None disables compression.
+    The entries are stored in `backend` if specified, e.g. a shared cache, otherwise in a dedicated memory cache.
+    A result reached through fallback is cached under the key of the request to the fallback group.
+    If `similarity_threshold` is specified, a miss falls back to the most similar cached prompt of the same group,
+    compared by the SimHash of the normalized text, the threshold is the fraction of equal signature bits and can be
+    overridden per group by `group_similarity_threshold`. Each group indexes the prompts of the cached responses, in
+    this process only, and up to twice `max_similar_entries` of them.
+    """
+
+    enabled: bool = False
+    ttl_seconds: int = 300
+    max_bytes: int = 64 * 1024 * 1024
+    compress_min_bytes: Optional[int] = 1024
+    backend: Optional[BaseCache] = None
+    similarity_threshold: Optional[float] = None
+    group_similarity_threshold: dict[str, float] = field(default_factory=dict)
+    max_similar_entries: int = 50_000
+
+    def __post_init__(self):
+        if self.ttl_seconds <= 0:
+            raise ValueError(f"Invalid ttl_seconds value: {self.ttl_seconds}")
+        if self.max_bytes <= 0:
+            raise ValueError(f"Invalid max_bytes value: {self.max_bytes}")
+        if self.compress_min_bytes is not None and self.compress_min_bytes < 0:
+            raise ValueError(f"Invalid compress_min_bytes value: {self.compress_min_bytes}")
+        thresholds = list(self.group_similarity_threshold.values())
+        if self.similarity_threshold is not None:
+            thresholds.append(self.similarity_threshold)
+        for threshold in thresholds:
+            if not 0 < threshold <= 1:
+                raise ValueError(f"Invalid similarity threshold value: {threshold}")
+        if self.max_similar_entries <= 0:
+            raise ValueError(f"Invalid max_similar_entries value: {self.max_similar_entries}")
@@ -0,0 +1,40 @@
+from typing import Optional
+from dataclasses import field, dataclass
+
+
+@dataclass
+class TokenizerSpec:
+    """
+    The tokenizer of the models whose id matches `pattern`, a case-insensitive glob, e.g. "llama-3*".
+    The tokenizer is either a tiktoken encoding, e.g. "o200k_base", or a local `tokenizer.json` of Hugging Face
+    tokenizers, so it's loaded without the Hub.
+    """
+
+    pattern: str
+    encoding: Optional[str] = None
+    path: Optional[str] = None
+
+    def __post_init__(self):
+        if not self.pattern:
+            raise ValueError(f"Invalid pattern value: {self.pattern!r}")
+        if (self.encoding is None) == (self.path is None):
+            raise ValueError(f"Tokenizer of {self.pattern} requires exactly one of encoding and path")
+
+
+@dataclass
+class TokenizerConfig:
+    """
+    The tokenizers are matched in order against the model id of a request, or the model id of the first provider
+    of its group, the first match wins. A model without a match uses tiktoken's encoding of the model, or
+    `default_encoding` if tiktoken doesn't know the model.
+    If `allow_download` is disabled, e.g. on air-gapped nodes, the Llama 3 models without a match use the default
+    encoding instead of downloading their tokenizer from the Hugging Face Hub.
+    tiktoken downloads its encodings unless they are in its cache, `tiktoken_cache_dir` is a directory of pre-fetched
+    encodings. tiktoken only reads it from `TIKTOKEN_CACHE_DIR`, so the variable is set while the router loads an
+    encoding and restored afterwards, the other users of tiktoken in the process keep their own cache directory.
+    """
+
+    tokenizers: list[TokenizerSpec] = field(default_factory=list)
+    default_encoding: str = "cl100k_base"
+    allow_download: bool = True
+    tiktoken_cache_dir: Optional[str] = None
@@ -1,6 +1,7 @@
-from typing import Any, Literal, Optional
+from typing import TYPE_CHECKING, Any, Literal, Optional
 
-import httpx
+if TYPE_CHECKING:
+    import httpx
 
 
 class RetryMixin:
@@ -31,12 +32,18 @@ class NoProviderAvailableError(RouterError):
     fallback = True
 
 
+class DeadlineExceededError(RouterError):
+    """
+    The deadline of the request is reached, it's neither retried nor falls back.
+    """
+
+
 class APIError(RouterError):
     message: str
-    request: httpx.Request
+    request: "httpx.Request"
     body: Optional[object]
 
-    def __init__(self, message: str, request: httpx.Request, *, body: Optional[object] = None) -> None:
+    def __init__(self, message: str, request: "httpx.Request", *, body: Optional[object] = None) -> None:
         super().__init__(message)
         self.request = request
         self.message = message
@@ -49,30 +56,30 @@ class APIError(RouterError):
 class APIConnectionError(APIError):
     retryable = True
 
-    def __init__(self, message: str = "Connection error", *, request: httpx.Request) -> None:
+    def __init__(self, message: str = "Connection error", *, request: "httpx.Request") -> None:
         super().__init__(message, request, body=None)
 
 
 class APINetworkUnreachableError(APIConnectionError):
-    def __init__(self, request: httpx.Request) -> None:
+    def __init__(self, request: "httpx.Request") -> None:
         message = "Network is unreachable"
         super().__init__(message, request=request)
 
 
 class APIConnectionResetError(APIConnectionError):
-    def __init__(self, request: httpx.Request) -> None:
+    def __init__(self, request: "httpx.Request") -> None:
         message = "Connection reset by peer"
         super().__init__(message, request=request)
 
 
 class APIConnectionRefusedError(APIConnectionError):
-    def __init__(self, *, request: httpx.Request) -> None:
+    def __init__(self, *, request: "httpx.Request") -> None:
         message = f"Connection refused by {request.url}"
         super().__init__(message, request=request)
 
 
 class APIStatusError(APIError):
-    response: httpx.Response
+    response: "httpx.Response"
     status_code: int
     request_id: str | None
     router_request: Optional[Any]  # Unused
@@ -82,7 +89,7 @@ class APIStatusError(APIError):
         message: str,
         *,
         router_request: Optional[Any] = None,
-        response: Optional[httpx.Response] = None,
+        response: Optional["httpx.Response"] = None,
         body: Optional[object] = None,
     ) -> None:
         self.router_request = router_request
@@ -92,7 +99,10 @@ class APIStatusError(APIError):
         self.request_id = self.response.headers.get("x-request-id")
         super().__init__(message, self.response.request, body=body)
 
-    def _create_default_response(self) -> httpx.Response:
+    def _create_default_response(self) -> "httpx.Response":
+        # httpx is imported by the first error, not by the router.
+        import httpx
+
         return httpx.Response(
             status_code=self.status_code,
             request=httpx.Request(method="GET", url=""),
@@ -154,7 +164,7 @@ class RetryExhaustedError(BadRequestError):
         attempt_number: int = 0,
         *,
         router_request: Optional[Any] = None,
-        response: Optional[httpx.Response] = None,
+        response: Optional["httpx.Response"] = None,
         body: Optional[object] = None,
     ):
         super().__init__(message, router_request=router_request, response=response, body=body)
@@ -177,5 +187,5 @@ SHOULD_FALLBACK_EXCEPTIONS = (
     ModelGroupNotFound,
     RetryExhaustedError,
 )
-CRITICAL_EXCEPTIONS = (RateLimitError, AuthenticationError)
-TEMPORARY_EXCEPTIONS = (RequestTimeoutError,)
+# Put the provider in cooldown without waiting for the failure rate, see also a RateLimitError with Retry-After.
+CRITICAL_EXCEPTIONS = (AuthenticationError,)
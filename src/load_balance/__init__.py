@@ -1,11 +1,15 @@
 from src.load_balance.random import RandomBalancer
+from src.load_balance.cost_based import CostBasedBalancer
 from src.load_balance.lowest_tpm import LowestTPMBalancer
+from src.load_balance.latency_based import LatencyBasedBalancer
 from src.load_balance.capacity_based import CapacityBasedBalancer
 from src.load_balance.provider_manager import ProviderStatusManager
 
 __all__ = [
     "LowestTPMBalancer",
     "CapacityBasedBalancer",
+    "LatencyBasedBalancer",
+    "CostBasedBalancer",
     "RandomBalancer",
     "ProviderStatusManager",
 ]
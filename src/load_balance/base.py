@@ -1,3 +1,4 @@
+import math
 from abc import ABC, abstractmethod
 from typing import Optional
 
@@ -41,3 +42,19 @@ class BaseLoadBalancer(ABC):
         :return: If a provider is selected, return the provider, otherwise return None.
         """
         raise NotImplementedError
+
+    async def _is_within_limits(self, group: str, provider: LLMProviderConfig, input_tokens: int) -> bool:
+        """
+        Check if the provider can take the request without exceeding its RPM/TPM limits.
+        If user does not have a tpm or rpm limit, we assume it is infinity.
+        :param group:
+        :param provider:
+        :param input_tokens:
+        :return:
+        """
+        if provider.rpm and await self.rpm_tpm_manager.rpm_usage_at_minute(group, provider.id) + 1 > provider.rpm:
+            return False
+        max_tpm = provider.tpm or math.inf
+        if await self.rpm_tpm_manager.tpm_usage_at_minute(group, provider.id) + input_tokens > max_tpm:
+            return False
+        return True
@@ -0,0 +1,221 @@
+import json
+import time
+from enum import Enum
+from typing import Iterable
+from dataclasses import asdict, dataclass
+
+from src.config import CooldownConfig, LogConfiguration
+from src.router.log import get_logger
+from src.config.config import LLMProviderConfig
+
+DEFAULT_CACHE_EXPIRED_SECONDS = 60 * 60
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+@dataclass
+class CooldownState:
+    """
+    The record of an open circuit which is shared with the other routers.
+    """
+
+    exception: str
+    timestamp: float
+    cooldown_seconds: float
+
+    def is_expired(self) -> bool:
+        return time.time() > self.timestamp + self.cooldown_seconds
+
+    def serialize(self):
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def deserialize(cls, data):
+        return cls(**json.loads(data))
+
+
+class Circuit:
+    __slots__ = ("state", "opened_at", "cooldown_seconds", "open_count", "closed_at", "probes", "exception")
+
+    def __init__(self):
+        self.state = CircuitState.CLOSED
+        self.opened_at = 0.0
+        self.cooldown_seconds = 0.0
+        # How many times the circuit is opened again before it recovers, used to grow the cooldown.
+        self.open_count = 0
+        self.closed_at = 0.0
+        self.probes = 0
+        self.exception = ""
+
+
+class CircuitBreaker:
+    def __init__(self, log_cfg: LogConfiguration, cooldown_config: CooldownConfig):
+        """
+        The circuits of all providers are held in memory. Only the ids of the providers whose circuit is not closed
+        are kept in `tripped`, so checking a whole group is a set lookup per provider in the common case.
+        If the config has a `shared_cache`, the open circuits are written to it, and `sync_from_cache` adopts those of
+        the other routers, the availability checks never wait for the cache.
+        :param log_cfg:
+        :param cooldown_config:
+        """
+        self.logger = get_logger(__name__, log_cfg)
+        self.cooldown_config = cooldown_config
+        self.cache = cooldown_config.shared_cache
+        self.circuits: dict[str, Circuit] = {}
+        self.tripped: set[str] = set()
+
+    def _circuit(self, provider_id: str) -> Circuit:
+        circuit = self.circuits.get(provider_id)
+        if circuit is None:
+            circuit = self.circuits[provider_id] = Circuit()
+        return circuit
+
+    def state(self, provider_id: str) -> CircuitState:
+        circuit = self.circuits.get(provider_id)
+        if circuit is None:
+            return CircuitState.CLOSED
+        self._try_half_open(circuit)
+        return circuit.state
+
+    def filter_available(self, providers: list[LLMProviderConfig]) -> list[LLMProviderConfig]:
+        """
+        Filter out the providers whose circuit is open, or half-open without a free probe slot.
+        :param providers:
+        :return:
+        """
+        if not self.tripped:
+            return providers
+        return [p for p in providers if p.id not in self.tripped or self.is_available(p.id)]
+
+    def is_available(self, provider_id: str) -> bool:
+        circuit = self.circuits.get(provider_id)
+        if circuit is None:
+            return True
+        self._try_half_open(circuit)
+        if circuit.state == CircuitState.OPEN:
+            return False
+        if circuit.state == CircuitState.HALF_OPEN:
+            return circuit.probes < self.cooldown_config.half_open_max_probes
+        return True
+
+    def acquire(self, provider_id: str):
+        """
+        A request is sent to the provider, if the circuit is half-open, the request takes a probe slot.
+        :param provider_id:
+        :return:
+        """
+        if provider_id not in self.tripped:
+            return
+        circuit = self._circuit(provider_id)
+        self._try_half_open(circuit)
+        if circuit.state == CircuitState.HALF_OPEN:
+            circuit.probes += 1
+
+    def is_half_open(self, provider_id: str) -> bool:
+        return self.state(provider_id) == CircuitState.HALF_OPEN
+
+    async def open(self, provider_id: str, exception: str) -> bool:
+        """
+        Open the circuit of the provider. The cooldown grows exponentially if the provider is opened again
+        before it stays closed for `max_cooldown_seconds`.
+        The failures of the requests in flight when the circuit opened don't extend the cooldown, only a failed
+        probe of a half-open circuit opens it again.
+        :param provider_id:
+        :param exception:
+        :return: False if the circuit is already open.
+        """
+        circuit = self._circuit(provider_id)
+        self._try_half_open(circuit)
+        if circuit.state == CircuitState.OPEN:
+            circuit.exception = exception
+            return False
+        now = time.time()
+        if circuit.state == CircuitState.CLOSED and now - circuit.closed_at > self.cooldown_config.max_cooldown_seconds:
+            circuit.open_count = 0
+        circuit.cooldown_seconds = min(
+            self.cooldown_config.cooldown_seconds * self.cooldown_config.cooldown_multiplier**circuit.open_count,
+            self.cooldown_config.max_cooldown_seconds,
+        )
+        circuit.open_count += 1
+        circuit.state = CircuitState.OPEN
+        circuit.opened_at = now
+        circuit.probes = 0
+        circuit.exception = exception
+        self.tripped.add(provider_id)
+        self.logger.info(
+            f"Circuit of provider {provider_id} is open for {circuit.cooldown_seconds}s due to {exception}"
+        )
+        if self.cache:
+            state = CooldownState(exception=exception, timestamp=now, cooldown_seconds=circuit.cooldown_seconds)
+            await self.cache.async_set_value(
+                self._build_cache_key(provider_id), state.serialize(), ttl=DEFAULT_CACHE_EXPIRED_SECONDS
+            )
+        return True
+
+    async def record_success(self, provider_id: str):
+        """
+        A successful call closes a half-open circuit.
+        :param provider_id:
+        :return:
+        """
+        circuit = self.circuits.get(provider_id)
+        if circuit is None:
+            return
+        self._try_half_open(circuit)
+        if circuit.state == CircuitState.HALF_OPEN:
+            circuit.state = CircuitState.CLOSED
+            circuit.closed_at = time.time()
+            circuit.probes = 0
+            self.tripped.discard(provider_id)
+            self.logger.info(f"Circuit of provider {provider_id} is closed")
+            if self.cache:
+                await self.cache.async_set_value(self._build_cache_key(provider_id), None, ttl=0)
+
+    async def sync_from_cache(self, provider_ids: Iterable[str]) -> list[str]:
+        """
+        Adopt the open circuits written to the shared cache by other routers.
+        :param provider_ids:
+        :return: the providers whose circuit is adopted.
+        """
+        if not self.cache:
+            return []
+        adopted = []
+        for provider_id in provider_ids:
+            data = await self.cache.async_get_value(self._build_cache_key(provider_id))
+            if not data:
+                continue
+            state = CooldownState.deserialize(data)
+            circuit = self.circuits.get(provider_id)
+            if state.is_expired() or (circuit is not None and circuit.opened_at >= state.timestamp):
+                continue
+            circuit = self._circuit(provider_id)
+            circuit.state = CircuitState.OPEN
+            circuit.opened_at = state.timestamp
+            circuit.cooldown_seconds = state.cooldown_seconds
+            circuit.exception = state.exception
+            circuit.probes = 0
+            self.tripped.add(provider_id)
+            adopted.append(provider_id)
+            self.logger.info(f"Circuit of provider {provider_id} is opened by another router due to {state.exception}")
+        return adopted
+
+    @staticmethod
+    def _try_half_open(circuit: Circuit):
+        now = time.time()
+        if circuit.state == CircuitState.OPEN and now > circuit.opened_at + circuit.cooldown_seconds:
+            circuit.state = CircuitState.HALF_OPEN
+            circuit.probes = 0
+            # Reuse `opened_at` as the start of the half-open state.
+            circuit.opened_at = now
+        elif circuit.state == CircuitState.HALF_OPEN and now > circuit.opened_at + circuit.cooldown_seconds:
+            # The probes never reported back, e.g. the provider was listed but not selected, release the slots.
+            circuit.probes = 0
+            circuit.opened_at = now
+
+    @staticmethod
+    def _build_cache_key(provider_id: str) -> str:
+        return f"cooldown:{provider_id}"
@@ -0,0 +1,51 @@
+import math
+import random
+from typing import Optional
+
+from src.model import ChatMessageValues
+from src.config import LogConfiguration, LoadBalancerConfig
+from src.cache.base import BaseCache
+from src.config.config import LLMProviderConfig
+from src.utils.context import RouterContext, router_context
+from src.load_balance.base import BaseLoadBalancer
+from src.load_balance.rpm_tpm_manager import RpmTpmManager
+
+
+class CostBasedBalancer(BaseLoadBalancer):
+    def __init__(
+        self,
+        lb_cache: BaseCache,
+        log_cfg: LogConfiguration,
+        load_balancer_config: LoadBalancerConfig,
+        rpm_tpm_manager: RpmTpmManager,
+    ):
+        """
+        Load balancer that selects the cheapest provider among the providers within RPM/TPM limits.
+        Providers without a cost are considered the most expensive, ties are broken randomly.
+        :param lb_cache:
+        :param log_cfg:
+        """
+        super().__init__(lb_cache, __name__, log_cfg, load_balancer_config, rpm_tpm_manager)
+
+    async def schedule_provider(
+        self,
+        group: str,
+        healthy_providers: list[LLMProviderConfig],
+        _text: Optional[str] = None,
+        _messages: list[ChatMessageValues] = None,
+    ) -> Optional[LLMProviderConfig]:
+        ctx: RouterContext = router_context.get()
+        candidates = []
+        lowest_cost = math.inf
+        for p in healthy_providers:
+            if not await self._is_within_limits(group, p, ctx.token_count):
+                self.logger.debug(f"Skipping provider {p.model_id} as it is not available")
+                continue
+            cost = p.cost if p.cost is not None else math.inf
+            if not candidates or cost < lowest_cost:
+                lowest_cost, candidates = cost, [p]
+            elif cost == lowest_cost:
+                candidates.append(p)
+        if not candidates:
+            return None
+        return random.choice(candidates)
@@ -0,0 +1,76 @@
+import time
+from array import array
+from typing import Optional
+
+
+class _Buckets:
+    __slots__ = ("successes", "failures", "epochs")
+
+    def __init__(self, size: int):
+        self.successes = array("q", bytes(8 * size))
+        self.failures = array("q", bytes(8 * size))
+        # The bucket epoch each slot belongs to, a slot of an older epoch is stale.
+        self.epochs = array("q", [-1] * size)
+
+
+class FailureRateTracker:
+    def __init__(self, window_seconds: float = 60, num_buckets: int = 6):
+        """
+        Count the successes and failures of each provider over a sliding window, which is split into
+        `num_buckets` sub-windows kept in a ring buffer. The memory of each provider is fixed, a record is O(1),
+        and the stats are O(num_buckets).
+        :param window_seconds:
+        :param num_buckets:
+        """
+        if window_seconds <= 0 or num_buckets <= 0:
+            raise ValueError(f"Invalid failure rate window: {window_seconds} {num_buckets}")
+        self.num_buckets = num_buckets
+        self.bucket_seconds = window_seconds / num_buckets
+        self._buckets: dict[str, _Buckets] = {}
+
+    def record_success(self, key: str, now: Optional[float] = None):
+        buckets, index = self._current(key, now)
+        buckets.successes[index] += 1
+
+    def record_failure(self, key: str, now: Optional[float] = None):
+        buckets, index = self._current(key, now)
+        buckets.failures[index] += 1
+
+    def stats(self, key: str, now: Optional[float] = None) -> tuple[int, int]:
+        """
+        :param key:
+        :param now: monotonic time, default is the current time.
+        :return: the number of failures and the number of calls in the window.
+        """
+        buckets = self._buckets.get(key)
+        if buckets is None:
+            return 0, 0
+        oldest = self._epoch(now) - self.num_buckets
+        failures = total = 0
+        for i in range(self.num_buckets):
+            if buckets.epochs[i] > oldest:
+                failures += buckets.failures[i]
+                total += buckets.failures[i] + buckets.successes[i]
+        return failures, total
+
+    def failure_rate(self, key: str, now: Optional[float] = None) -> float:
+        failures, total = self.stats(key, now)
+        return failures / total if total else 0.0
+
+    def reset(self, key: str):
+        self._buckets.pop(key, None)
+
+    def _epoch(self, now: Optional[float]) -> int:
+        return int((time.monotonic() if now is None else now) // self.bucket_seconds)
+
+    def _current(self, key: str, now: Optional[float]) -> tuple[_Buckets, int]:
+        buckets = self._buckets.get(key)
+        if buckets is None:
+            buckets = self._buckets[key] = _Buckets(self.num_buckets)
+        epoch = self._epoch(now)
+        index = epoch % self.num_buckets
+        if buckets.epochs[index] != epoch:
+            buckets.epochs[index] = epoch
+            buckets.successes[index] = 0
+            buckets.failures[index] = 0
+        return buckets, index
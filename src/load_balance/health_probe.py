@@ -0,0 +1,105 @@
+import random
+import asyncio
+from typing import Optional
+
+from src.config import LogConfiguration, HealthCheckConfig
+from src.router.log import get_logger
+from src.config.config import LLMProviderConfig
+from src.load_balance.provider_manager import ProviderStatusManager
+
+
+class HealthProbeScheduler:
+    def __init__(
+        self,
+        log_cfg: LogConfiguration,
+        health_check_config: HealthCheckConfig,
+        provider_status_manager: ProviderStatusManager,
+    ):
+        """
+        Probe each provider in the background with its `health_check` hook, and mark it as unhealthy or healthy
+        in the provider status manager, so the users don't pay for the failures of a broken provider.
+        Each provider is probed by its own loop, the probes share a semaphore to bound the concurrency.
+        The providers which don't support probing are probed once and then skipped.
+        :param log_cfg:
+        :param health_check_config:
+        :param provider_status_manager:
+        """
+        self.logger = get_logger(__name__, log_cfg)
+        self.health_check_config = health_check_config
+        self.provider_status_manager = provider_status_manager
+        # A provider may be shared by several groups, probe it only once.
+        self.providers: dict[str, LLMProviderConfig] = {
+            p.id: p for providers in provider_status_manager.provider_groups.values() for p in providers
+        }
+        self.intervals: dict[str, float] = {}
+        self.probe_tasks: list[asyncio.Task] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def start_probe_task(self):
+        if not self.probe_tasks:
+            self._semaphore = asyncio.Semaphore(self.health_check_config.max_concurrency)
+            self.probe_tasks = [asyncio.create_task(self._probe_loop(p)) for p in self.providers.values()]
+
+    async def stop_probe_task(self):
+        for task in self.probe_tasks:
+            task.cancel()
+        if self.probe_tasks:
+            await asyncio.gather(*self.probe_tasks, return_exceptions=True)
+            self.logger.warning("Health probe tasks were cancelled")
+        self.probe_tasks = []
+
+    async def update_providers(self, provider_groups: dict[str, list[LLMProviderConfig]]):
+        """
+        Probe the providers of the new groups, the probe intervals of the unchanged providers are kept.
+        :param provider_groups:
+        :return:
+        """
+        running = bool(self.probe_tasks)
+        await self.stop_probe_task()
+        self.providers = {p.id: p for providers in provider_groups.values() for p in providers}
+        self.intervals = {pid: interval for pid, interval in self.intervals.items() if pid in self.providers}
+        if running:
+            await self.start_probe_task()
+
+    async def probe(self, provider: LLMProviderConfig) -> Optional[bool]:
+        """
+        Probe the provider once and update its health and probe interval.
+        :param provider:
+        :return: the result of the probe, None if the provider does not support probing.
+        """
+        semaphore = self._semaphore or asyncio.Semaphore(self.health_check_config.max_concurrency)
+        async with semaphore:
+            try:
+                healthy = await asyncio.wait_for(
+                    provider.impl.health_check(), timeout=self.health_check_config.timeout_seconds
+                )
+            except Exception as e:
+                self.logger.warning(f"Health probe of provider {provider.id} failed: {e!r}")
+                healthy = False
+        if healthy is None:
+            return None
+        interval = self.intervals.get(provider.id, self.health_check_config.interval_seconds)
+        if healthy:
+            self.provider_status_manager.mark_healthy(provider.id)
+            interval = min(
+                interval * self.health_check_config.backoff_multiplier, self.health_check_config.max_interval_seconds
+            )
+        else:
+            self.provider_status_manager.mark_unhealthy(provider.id)
+            interval = self.health_check_config.interval_seconds
+        self.intervals[provider.id] = interval
+        return bool(healthy)
+
+    def next_delay(self, provider_id: str) -> float:
+        interval = self.intervals.get(provider_id, self.health_check_config.interval_seconds)
+        jitter = self.health_check_config.jitter
+        return interval * random.uniform(1 - jitter, 1 + jitter)
+
+    async def _probe_loop(self, provider: LLMProviderConfig):
+        # Spread the first probes over an interval, so the providers are not probed at the same time.
+        await asyncio.sleep(random.uniform(0, self.health_check_config.interval_seconds))
+        while True:
+            if await self.probe(provider) is None:
+                self.logger.debug(f"Provider {provider.id} does not support health check")
+                return
+            await asyncio.sleep(self.next_delay(provider.id))
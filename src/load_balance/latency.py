@@ -0,0 +1,99 @@
+import math
+from array import array
+from typing import Iterable, Optional
+
+
+class _Window:
+    __slots__ = ("values", "index", "count", "total")
+
+    def __init__(self, size: int):
+        self.values = array("d", bytes(8 * size))
+        self.index = 0
+        self.count = 0
+        # The number of latencies ever recorded, including the ones overwritten.
+        self.total = 0
+
+
+class LatencyTracker:
+    def __init__(self, window_size: int = 128):
+        """
+        Keep the most recent `window_size` latencies (in seconds) of each provider in a fixed-size ring buffer,
+        so the memory is bounded, and recording a latency is O(1).
+        :param window_size:
+        """
+        if window_size <= 0:
+            raise ValueError(f"Invalid window_size value: {window_size}")
+        self.window_size = window_size
+        self._windows: dict[str, _Window] = {}
+
+    def record(self, key: str, seconds: float):
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = _Window(self.window_size)
+        window.values[window.index] = seconds
+        window.index = (window.index + 1) % self.window_size
+        window.count = min(window.count + 1, self.window_size)
+        window.total += 1
+
+    def count(self, key: str) -> int:
+        window = self._windows.get(key)
+        return window.count if window else 0
+
+    def recorded(self, key: str) -> int:
+        """
+        The number of latencies ever recorded for the key, it only grows, unlike `count`.
+        :param key:
+        :return:
+        """
+        window = self._windows.get(key)
+        return window.total if window else 0
+
+    def samples(self, key: str, last: Optional[int] = None) -> list[float]:
+        """
+        The recent latencies of a provider, in no particular order.
+        :param key:
+        :param last: only the `last` recorded latencies.
+        :return:
+        """
+        window = self._windows.get(key)
+        if window is None:
+            return []
+        if last is None or last >= window.count:
+            return window.values[: window.count].tolist()
+        start = window.index - last
+        if start >= 0:
+            return window.values[start : window.index].tolist()
+        return window.values[start:].tolist() + window.values[: window.index].tolist()
+
+    def percentile(self, key: str, q: float, last: Optional[int] = None) -> Optional[float]:
+        """
+        Nearest-rank percentile of the recent latencies of a provider.
+        :param key:
+        :param q: in [0, 1]
+        :param last: only the `last` recorded latencies.
+        :return: None if there is no sample.
+        """
+        return self._percentile(self.samples(key, last), q)
+
+    def group_percentile(self, keys: Iterable[str], q: float) -> Optional[float]:
+        """
+        Nearest-rank percentile of the recent latencies of several providers, e.g. all providers of a model group.
+        :param keys:
+        :param q: in [0, 1]
+        :return: None if there is no sample.
+        """
+        values = []
+        for key in keys:
+            values.extend(self.samples(key))
+        return self._percentile(values, q)
+
+    def remove(self, key: str):
+        self._windows.pop(key, None)
+
+    @staticmethod
+    def _percentile(values: list[float], q: float) -> Optional[float]:
+        if not values:
+            return None
+        values.sort()
+        rank = max(math.ceil(q * len(values)), 1)
+        return values[min(rank, len(values)) - 1]
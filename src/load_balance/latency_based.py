@@ -0,0 +1,54 @@
+import random
+from typing import Optional
+
+from src.model import ChatMessageValues
+from src.config import LogConfiguration, LoadBalancerConfig
+from src.cache.base import BaseCache
+from src.config.config import LLMProviderConfig
+from src.utils.context import RouterContext, router_context
+from src.load_balance.base import BaseLoadBalancer
+from src.load_balance.latency import LatencyTracker
+from src.load_balance.rpm_tpm_manager import RpmTpmManager
+
+
+class LatencyBasedBalancer(BaseLoadBalancer):
+    def __init__(
+        self,
+        lb_cache: BaseCache,
+        log_cfg: LogConfiguration,
+        load_balancer_config: LoadBalancerConfig,
+        rpm_tpm_manager: RpmTpmManager,
+        latency_tracker: LatencyTracker,
+    ):
+        """
+        Load balancer that selects the provider with the lowest median latency among the providers within RPM/TPM limits.
+        Providers without any latency sample are preferred, so that every provider gets measured.
+        :param lb_cache:
+        :param log_cfg:
+        :param latency_tracker:
+        """
+        super().__init__(lb_cache, __name__, log_cfg, load_balancer_config, rpm_tpm_manager)
+        self.latency_tracker = latency_tracker
+
+    async def schedule_provider(
+        self,
+        group: str,
+        healthy_providers: list[LLMProviderConfig],
+        _text: Optional[str] = None,
+        _messages: list[ChatMessageValues] = None,
+    ) -> Optional[LLMProviderConfig]:
+        ctx: RouterContext = router_context.get()
+        candidates = []
+        lowest_latency = None
+        for p in healthy_providers:
+            if not await self._is_within_limits(group, p, ctx.token_count):
+                self.logger.debug(f"Skipping provider {p.model_id} as it is not available")
+                continue
+            latency = self.latency_tracker.percentile(p.id, 0.5) or 0.0
+            if lowest_latency is None or latency < lowest_latency:
+                lowest_latency, candidates = latency, [p]
+            elif latency == lowest_latency:
+                candidates.append(p)
+        if not candidates:
+            return None
+        return random.choice(candidates)
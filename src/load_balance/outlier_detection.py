@@ -0,0 +1,107 @@
+import time
+import statistics
+
+from src.config import LogConfiguration, OutlierDetectionConfig
+from src.router.log import get_logger
+from src.config.config import LLMProviderConfig
+from src.load_balance.latency import LatencyTracker
+
+
+class OutlierDetector:
+    def __init__(
+        self,
+        log_cfg: LogConfiguration,
+        outlier_detection_config: OutlierDetectionConfig,
+        latency_tracker: LatencyTracker,
+    ):
+        """
+        Eject the slow providers of a group based on the latencies in the latency tracker.
+        The ejections of a group are evaluated lazily when its providers are filtered, at most once per interval,
+        so the hot path is a dict lookup per provider.
+        The latencies of an ejected provider are kept in the tracker shared with the balancers, so it keeps its rank
+        when it's back, but the ejection is only evaluated again on the latencies recorded after it.
+        :param log_cfg:
+        :param outlier_detection_config:
+        :param latency_tracker:
+        """
+        self.logger = get_logger(__name__, log_cfg)
+        self.config = outlier_detection_config
+        self.latency_tracker = latency_tracker
+        # provider id -> the time the ejection ends.
+        self.ejected: dict[str, float] = {}
+        self.ejection_counts: dict[str, int] = {}
+        self._evaluated_at: dict[str, float] = {}
+        # provider id -> the number of latencies recorded when it was last ejected.
+        self._recorded_at_ejection: dict[str, int] = {}
+
+    def filter(self, group: str, providers: list[LLMProviderConfig]) -> list[LLMProviderConfig]:
+        """
+        Filter out the ejected providers of the group.
+        :param group:
+        :param providers:
+        :return:
+        """
+        now = time.monotonic()
+        if now - self._evaluated_at.get(group, float("-inf")) >= self.config.interval_seconds:
+            self._evaluated_at[group] = now
+            self.evaluate(providers, now)
+        if not self.ejected:
+            return providers
+        return [p for p in providers if self.ejected.get(p.id, 0) <= now]
+
+    def is_ejected(self, provider_id: str) -> bool:
+        return self.ejected.get(provider_id, 0) > time.monotonic()
+
+    def evaluate(self, providers: list[LLMProviderConfig], now: float):
+        """
+        Release the expired ejections and eject the outliers among the providers.
+        :param providers: providers of a group.
+        :param now: monotonic time.
+        :return:
+        """
+        for provider in providers:
+            until = self.ejected.get(provider.id)
+            if until is not None and until <= now:
+                del self.ejected[provider.id]
+                self.logger.info(f"Provider {provider.id} is no longer ejected")
+
+        latencies = {}
+        for provider in providers:
+            if provider.id in self.ejected:
+                continue
+            count = self.latency_tracker.count(provider.id)
+            if provider.id in self._recorded_at_ejection:
+                count = min(count, self.latency_tracker.recorded(provider.id) - self._recorded_at_ejection[provider.id])
+                if count >= self.latency_tracker.window_size:
+                    del self._recorded_at_ejection[provider.id]
+            if count >= self.config.min_samples:
+                latencies[provider.id] = self.latency_tracker.percentile(provider.id, self.config.percentile, count)
+        if len(latencies) < 2:
+            return
+
+        ejected = sum(1 for p in providers if p.id in self.ejected)
+        max_ejected = int(len(providers) * self.config.max_ejection_percent / 100)
+        # Eject the slowest providers first, in case the cap is reached.
+        for provider_id, latency in sorted(latencies.items(), key=lambda x: x[1], reverse=True):
+            median = statistics.median(v for k, v in latencies.items() if k != provider_id)
+            if latency <= self.config.threshold_multiplier * median:
+                # Like Envoy, the ejection multiplier decays while the provider behaves.
+                if self.ejection_counts.get(provider_id):
+                    self.ejection_counts[provider_id] -= 1
+                continue
+            if ejected >= max_ejected:
+                continue
+            self._eject(provider_id, latency, median, now)
+            ejected += 1
+
+    def _eject(self, provider_id: str, latency: float, median: float, now: float):
+        count = self.ejection_counts.get(provider_id, 0) + 1
+        self.ejection_counts[provider_id] = count
+        duration = min(self.config.base_ejection_seconds * count, self.config.max_ejection_seconds)
+        self.ejected[provider_id] = now + duration
+        # The provider is judged by new latencies when it's back.
+        self._recorded_at_ejection[provider_id] = self.latency_tracker.recorded(provider_id)
+        self.logger.warning(
+            f"Provider {provider_id} is ejected for {duration}s, "
+            f"p{self.config.percentile * 100:g} {latency:.3f}s vs group median {median:.3f}s"
+        )
@@ -1,16 +1,15 @@
-import json
-import time
 import asyncio
-from datetime import datetime
-from dataclasses import asdict, dataclass
+from typing import Callable, Optional
+from dataclasses import dataclass
 
-from src.config import CooldownConfig, LogConfiguration
+from src.config import CooldownConfig, LogConfiguration, OutlierDetectionConfig
 from src.cache.base import BaseCache
 from src.router.log import get_logger
 from src.config.config import LLMProviderConfig
+from src.load_balance.latency import LatencyTracker
 from src.exceptions.exceptions import (
     CRITICAL_EXCEPTIONS,
-    TEMPORARY_EXCEPTIONS,
+    APIError,
     APIStatusError,
     RateLimitError,
     ModelGroupNotFound,
@@ -18,27 +17,18 @@ from src.exceptions.exceptions import (
     RequestTimeoutError,
     ContentPolicyViolationError,
 )
+from src.load_balance.failure_rate import FailureRateTracker
+from src.load_balance.circuit_breaker import CircuitBreaker
+from src.load_balance.outlier_detection import OutlierDetector
 
-DEFAULT_CACHE_EXPIRED_SECONDS = 60 * 60
-CLIENT_ERROR_MIN_STATUS = 400
-CLIENT_ERROR_MAX_STATUS = 500
+FEEDBACK_QUEUE_SIZE = 10_000
 
 
 @dataclass
-class CooldownState:
-    exception: str
-    timestamp: float
-    cooldown_seconds: float
-
-    def is_expired(self) -> bool:
-        return time.time() > self.timestamp + self.cooldown_seconds
-
-    def serialize(self):
-        return json.dumps(asdict(self))
-
-    @classmethod
-    def deserialize(cls, data):
-        return cls(**json.loads(data))
+class ProviderFeedback:
+    provider_id: str
+    exception: Optional[BaseException]
+    latency: Optional[float]
 
 
 class ProviderStatusManager:
@@ -48,93 +38,266 @@ class ProviderStatusManager:
         provider_groups: dict[str, list[LLMProviderConfig]],
         cooldown_config: CooldownConfig,
         cache: BaseCache,
+        latency_tracker: Optional[LatencyTracker] = None,
+        outlier_detection_config: Optional[OutlierDetectionConfig] = None,
     ):
+        """
+        :param log_cfg:
+        :param provider_groups:
+        :param cooldown_config:
+        :param cache:
+        :param latency_tracker: if specified, the latencies of the successful calls are recorded from the feedback.
+        :param outlier_detection_config: if enabled, the slow providers are ejected based on the recorded latencies.
+        """
         self.cache = cache
         self.logger = get_logger(__name__, log_cfg)
         self.provider_groups = provider_groups
         self.allowed_fails_policy = cooldown_config.allowed_fails_policy
         self.general_allowed_fails = cooldown_config.general_allowed_fails
         self.cooldown_seconds = cooldown_config.cooldown_seconds
-        self._locks: dict[str, asyncio.Lock] = {}
+        self.failure_rate_threshold = cooldown_config.failure_rate_threshold
+        self.min_request_volume = cooldown_config.min_request_volume
+        self.failure_rate_tracker = FailureRateTracker(cooldown_config.window_seconds, cooldown_config.num_buckets)
+        self.circuit_breaker = CircuitBreaker(log_cfg, cooldown_config)
+        self.shared_sync_seconds = cooldown_config.shared_sync_seconds
+        self.sync_task: Optional[asyncio.Task] = None
+        self._cooldown_listeners: list[Callable[[str], None]] = []
+        self.latency_tracker = latency_tracker
+        self.outlier_detector = (
+            OutlierDetector(log_cfg, outlier_detection_config, latency_tracker)
+            if latency_tracker and outlier_detection_config and outlier_detection_config.enabled
+            else None
+        )
+        self.feedback_queue: Optional[asyncio.Queue] = None
+        self.feedback_task: Optional[asyncio.Task] = None
+        # The providers which failed the last health probe.
+        self.unhealthy: set[str] = set()
+
+    async def start_feedback_task(self):
+        if not self.feedback_task:
+            self.feedback_queue = asyncio.Queue(maxsize=FEEDBACK_QUEUE_SIZE)
+            self.feedback_task = asyncio.create_task(self._drain_feedback())
+
+    async def stop_feedback_task(self):
+        if self.feedback_task:
+            self.feedback_task.cancel()
+            try:
+                await self.feedback_task
+            except asyncio.CancelledError:
+                self.logger.warning("Feedback task was cancelled")
+            self.feedback_task = None
+            self.feedback_queue = None
+
+    async def stop_sync_task(self):
+        if self.sync_task:
+            self.sync_task.cancel()
+            try:
+                await self.sync_task
+            except asyncio.CancelledError:
+                self.logger.warning("Cooldown sync task was cancelled")
+            self.sync_task = None
+
+    def _ensure_sync_task(self):
+        """
+        Start adopting the circuits opened by the other routers, if the circuits are shared.
+        :return:
+        """
+        if self.circuit_breaker.cache is None:
+            return
+        loop = asyncio.get_running_loop()
+        # The task is bound to the loop which started it, restart it if the router is used from another loop.
+        if not self.sync_task or self.sync_task.get_loop() is not loop:
+            self.sync_task = loop.create_task(self._sync_shared_circuits())
+
+    async def _sync_shared_circuits(self):
+        while True:
+            ids = {p.id for providers in self.provider_groups.values() for p in providers}
+            try:
+                for provider_id in await self.circuit_breaker.sync_from_cache(ids):
+                    self.failure_rate_tracker.reset(provider_id)
+                    self._notify_listeners(provider_id)
+            except Exception as e:
+                self.logger.error(f"Failed to sync the shared circuits: {e}")
+            await asyncio.sleep(self.shared_sync_seconds)
+
+    def report(self, provider_id: str, exception: Optional[BaseException], latency: Optional[float]):
+        """
+        Report the outcome of a provider call without blocking the request path, the feedback is queued and
+        handled by a background task. If the queue is full, the feedback is dropped.
+        :param provider_id:
+        :param exception: None if the call succeeded.
+        :param latency: in seconds, None if the latency is not comparable with the other calls, e.g. a stream.
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        # The task is bound to the loop which started it, restart it if the router is used from another loop.
+        if not self.feedback_task or self.feedback_task.get_loop() is not loop:
+            self.feedback_queue = asyncio.Queue(maxsize=FEEDBACK_QUEUE_SIZE)
+            self.feedback_task = loop.create_task(self._drain_feedback())
+        try:
+            self.feedback_queue.put_nowait(ProviderFeedback(provider_id, exception, latency))
+        except asyncio.QueueFull:
+            self.logger.warning(f"Feedback queue is full, drop feedback of provider {provider_id}")
+
+    async def flush_feedback(self):
+        """
+        Wait until all the queued feedback is handled.
+        :return:
+        """
+        if self.feedback_queue is not None:
+            await self.feedback_queue.join()
+
+    async def _drain_feedback(self):
+        while True:
+            feedback = await self.feedback_queue.get()
+            try:
+                await self._handle_feedback(feedback)
+            except Exception as e:
+                self.logger.error(f"Failed to handle feedback of provider {feedback.provider_id}: {e}")
+            finally:
+                self.feedback_queue.task_done()
+
+    async def _handle_feedback(self, feedback: ProviderFeedback):
+        if feedback.exception is None:
+            if self.latency_tracker and feedback.latency is not None:
+                self.latency_tracker.record(feedback.provider_id, feedback.latency)
+            await self.record_success(feedback.provider_id)
+        elif isinstance(feedback.exception, APIError):
+            self.logger.debug(f"Provider {feedback.provider_id} failed in {feedback.latency}s")
+            await self.try_add_cooldown(feedback.provider_id, feedback.exception)
+
+    def update_provider_groups(self, provider_groups: dict[str, list[LLMProviderConfig]]):
+        """
+        Replace the provider groups, e.g. on a config reload. The cooldown, failure rate and latency of the
+        providers are keyed by the provider id, so they carry over to the unchanged providers.
+        :param provider_groups:
+        :return:
+        """
+        self.provider_groups = provider_groups
+        ids = {p.id for providers in provider_groups.values() for p in providers}
+        self.unhealthy &= ids
 
-    async def get_available_providers(self, model_group):
+    async def get_available_providers(self, model_group, providers: Optional[list[LLMProviderConfig]] = None):
         """
         Get the available providers for the model group:
-        1. Get the healthy providers in the model group
-        2. Filter out the providers that are in cooldown
+        1. Get the healthy providers in the model group, i.e. not marked as unhealthy by the health probes.
+        2. Filter out the providers that are ejected as latency outliers, if outlier detection is enabled.
+        3. Filter out the providers that are in cooldown, the circuits are checked in memory, those shared by the other
+           routers are synced in the background.
         :param model_group:
+        :param providers: the providers of the group in the routing state of the request, default is the current ones.
+        :return:
+        """
+        self._ensure_sync_task()
+        healthy_providers = self._get_healthy_providers(model_group, providers)
+        if self.outlier_detector:
+            healthy_providers = self.outlier_detector.filter(model_group, healthy_providers)
+        return self.circuit_breaker.filter_available(healthy_providers)
+
+    def on_provider_selected(self, provider_id: str):
+        """
+        Called when a request is sent to the provider, it takes a probe slot if the provider is half-open.
+        :param provider_id:
         :return:
         """
-        healthy_providers = self._get_healthy_providers(model_group)
-        r = []
-        for p in healthy_providers:
-            if not await self._is_in_cooldown(p.id):
-                r.append(p)
-        return r
+        self.circuit_breaker.acquire(provider_id)
 
-    async def try_add_cooldown(self, provider_id: str, exception: APIStatusError):
+    async def record_success(self, provider_id: str):
+        """
+        Report a successful call, it's counted in the failure rate and recovers a half-open provider.
+        :param provider_id:
+        :return:
+        """
+        self.failure_rate_tracker.record_success(provider_id)
+        await self.circuit_breaker.record_success(provider_id)
+
+    async def try_add_cooldown(self, provider_id: str, exception: APIError):
         """
         Try to add a provider to the cooldown list based on the exception type and the allowed fails policy.
+        A failure of a half-open provider puts it back in cooldown immediately.
         :param provider_id:
         :param exception:
         :return:
         """
-        if await self._should_cooldown(provider_id, exception):
+        if self.circuit_breaker.is_half_open(provider_id) or await self._should_cooldown(provider_id, exception):
             await self._add_cooldown(exception=exception.__class__.__name__, provider_id=provider_id)
 
-    def _get_healthy_providers(self, model_group: str):
+    def mark_unhealthy(self, provider_id: str):
         """
-        Maybe we need to add automatically health check.
+        Mark the provider as unhealthy, it's excluded from the available providers until it's marked healthy.
+        :param provider_id:
+        :return:
+        """
+        if provider_id in self.unhealthy:
+            return
+        self.unhealthy.add(provider_id)
+        self.logger.warning(f"Provider {provider_id} is marked as unhealthy")
+        self._notify_listeners(provider_id)
+
+    def mark_healthy(self, provider_id: str):
+        if provider_id not in self.unhealthy:
+            return
+        self.unhealthy.discard(provider_id)
+        self.logger.info(f"Provider {provider_id} is marked as healthy")
+        self._notify_listeners(provider_id)
+
+    def add_cooldown_listener(self, listener: Callable[[str], None]):
+        """
+        Register a callback which is invoked with the provider id whenever a provider is put in cooldown,
+        or its health changes.
+        The callback must not block, e.g. the routing table only marks itself as dirty.
+        :param listener:
+        :return:
+        """
+        self._cooldown_listeners.append(listener)
+
+    def _get_healthy_providers(self, model_group: str, providers: Optional[list[LLMProviderConfig]] = None):
+        """
+        Get the providers of the group which are not marked as unhealthy by the health probes.
         :param model_group:
+        :param providers:
         :return:
         """
-        healthy = self.provider_groups.get(model_group)
-        if not healthy:
+        if providers is None:
+            providers = self.provider_groups.get(model_group)
+        if not providers:
             raise ModelGroupNotFound("Model group not found")
+        healthy = [p for p in providers if p.id not in self.unhealthy] if self.unhealthy else providers
         self.logger.info(f"Healthy providers for group {model_group}: {healthy}")
         return healthy
 
     async def _add_cooldown(self, exception: str, provider_id: str):
         """
-        Add a provider to the cooldown, we keep the data more than the cooldown time,
-        so that we can monitor the cooldown metrics later.
+        Add a provider to the cooldown by opening its circuit, nothing changes if it's already open.
         :param exception:
         :param provider_id:
         :return:
         """
-        key = self._build_cooldown_key(provider_id)
-        await self.cache.async_set_value(
-            key,
-            CooldownState(
-                exception=exception,
-                timestamp=time.time(),
-                cooldown_seconds=self.cooldown_seconds,
-            ).serialize(),
-            ttl=DEFAULT_CACHE_EXPIRED_SECONDS,
-        )
+        if not await self.circuit_breaker.open(provider_id, exception):
+            return
+        # The provider is judged by the calls after the cooldown.
+        self.failure_rate_tracker.reset(provider_id)
         self.logger.info(f"Provider {provider_id} added to cooldown due to '{exception}'")
+        self._notify_listeners(provider_id)
+
+    def _notify_listeners(self, provider_id: str):
+        for listener in self._cooldown_listeners:
+            listener(provider_id)
 
     async def _is_in_cooldown(self, provider_id: str) -> bool:
         """
-        Check if the provider is in cooldown. We don't use the `ttl` of the record to check it,
-        we need to calculate the `timestamp` and `cooldown_seconds` to determine if the provider is in cooldown.
+        Check if the provider is in cooldown, i.e. its circuit is open or has no free probe slot.
         :param provider_id:
         :return:
         """
-        # Get the expiration time for the provider
-        key = self._build_cooldown_key(provider_id)
-        data = await self.cache.async_get_value(key)
-        if data is None:
-            return False
-        cooldown_state = CooldownState.deserialize(data)
-        return not cooldown_state.is_expired()
+        return not self.circuit_breaker.is_available(provider_id)
 
     async def _should_cooldown(self, provider_id: str, original_exception: APIStatusError) -> bool:
         """
         Check if the provider should be put in cooldown based on:
         1. Exception type.
-        2. The allowed fails' policy.
-        Update the failed calls cache if the provider should not be put in cooldown.
+        2. The failures in the window exceed the allowed fails' policy, the failure rate reaches the threshold,
+           and there are enough calls in the window.
         :param provider_id:
         :param original_exception:
         :return:
@@ -143,16 +306,13 @@ class ProviderStatusManager:
             return True
 
         allowed_fails = self._get_allowed_fails_from_policy(exception=original_exception)
-        key = self._build_fail_calls_key(provider_id)
-        lock = self._fetch_or_create_lock(key)
-        async with lock:
-            current_fails = await self.cache.async_get_value(key) or 0
-            updated_fails = current_fails + 1
-
-            if updated_fails > allowed_fails:
-                return True
-            await self.cache.async_set_value(key, updated_fails, ttl=DEFAULT_CACHE_EXPIRED_SECONDS)
-            return False
+        self.failure_rate_tracker.record_failure(provider_id)
+        failures, total = self.failure_rate_tracker.stats(provider_id)
+        return (
+            failures > allowed_fails
+            and total >= self.min_request_volume
+            and failures >= self.failure_rate_threshold * total
+        )
 
     def _get_allowed_fails_from_policy(self, exception: APIStatusError):
         """
@@ -172,33 +332,15 @@ class ProviderStatusManager:
                 return allowed_fails
         return self.general_allowed_fails
 
-    @staticmethod
-    def _build_fail_calls_key(provider_id: str) -> str:
-        current_minute = datetime.now().strftime("%Y%m%d%H%M")
-        return f"failed_calls:{provider_id}:{current_minute}"
-
-    @staticmethod
-    def _build_cooldown_key(provider_id: str) -> str:
-        current_minute = datetime.now().strftime("%Y%m%d%H%M")
-        return f"cooldown:{provider_id}:{current_minute}"
-
     @staticmethod
     def _is_cooldown_required_for_exception(exception: APIStatusError) -> bool:
         """
-        Return True if exception is in critical exceptions, or http code >= 500
+        Return True if exception is in critical exceptions, or a rate limit with a Retry-After header, i.e. the
+        provider asks to back off. The other errors, e.g. 5xx, are counted in the failure rate, so an isolated error
+        among many successful calls doesn't put the provider in cooldown.
         :param exception:
         :return:
         """
         if isinstance(exception, CRITICAL_EXCEPTIONS):
             return True
-        if isinstance(exception, TEMPORARY_EXCEPTIONS):
-            return False
-        exception_status = exception.status_code
-        if CLIENT_ERROR_MIN_STATUS <= exception_status < CLIENT_ERROR_MAX_STATUS:
-            return False
-        return True
-
-    def _fetch_or_create_lock(self, key: str):
-        if key not in self._locks:
-            self._locks[key] = asyncio.Lock()
-        return self._locks[key]
+        return isinstance(exception, RateLimitError) and "retry-after" in exception.response.headers
@@ -0,0 +1,233 @@
+import math
+import time
+import bisect
+import random
+import asyncio
+from typing import Any, Callable, Iterator, Optional
+from dataclasses import field, dataclass
+
+from src.config import LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.router.log import get_logger
+from src.config.config import LLMProviderConfig
+from src.utils.context import RouterContext, router_context
+from src.load_balance.latency import LatencyTracker
+from src.load_balance.rpm_tpm_manager import RpmTpmManager
+from src.load_balance.provider_manager import ProviderStatusManager
+
+
+@dataclass(frozen=True)
+class RoutingSnapshot:
+    """
+    The precompiled selection structure of a group.
+    - `providers` are the eligible providers at `built_at`, for the lowest TPM strategy they are ordered by TPM usage.
+    - `cumulative_weights` is used for weighted selection, empty means uniform (or ordered) selection.
+    - `tiers` are the end indexes of the runs of equally ranked providers of an ordered snapshot, e.g. the providers
+      without usage yet, the picks are spread within a tier so that its first provider doesn't get every request
+      until the next refresh.
+    """
+
+    providers: tuple[LLMProviderConfig, ...]
+    cumulative_weights: tuple[float, ...] = ()
+    ordered: bool = False
+    tiers: tuple[int, ...] = ()
+    built_at: float = field(default_factory=time.monotonic)
+
+    def candidates(self) -> Iterator[LLMProviderConfig]:
+        """
+        Yield the providers in the order they should be tried, the first one is the pick of the strategy.
+        Only the first element is computed by the strategy, the rest is the fallback order for the validation,
+        it's generated lazily since the first candidate is usually within its limits.
+        :return:
+        """
+        n = len(self.providers)
+        if n == 0:
+            return
+        if self.ordered:
+            start = 0
+            for end in self.tiers or range(1, n + 1):
+                size = end - start
+                offset = random.randrange(size)
+                for i in range(size):
+                    yield self.providers[start + (offset + i) % size]
+                start = end
+            return
+        if self.cumulative_weights and self.cumulative_weights[-1] > 0:
+            x = random.random() * self.cumulative_weights[-1]
+            start = min(bisect.bisect_right(self.cumulative_weights, x), n - 1)
+        else:
+            start = random.randrange(n)
+        for i in range(n):
+            yield self.providers[(start + i) % n]
+
+    @classmethod
+    def ranked(cls, providers: list[LLMProviderConfig], rank: Callable[[LLMProviderConfig], Any]) -> "RoutingSnapshot":
+        """
+        Build an ordered snapshot, the providers with the same rank form a tier.
+        :param providers:
+        :param rank: the lower the better.
+        :return:
+        """
+        ranks = {p.id: rank(p) for p in providers}
+        ordered = sorted(providers, key=lambda p: ranks[p.id])
+        tiers = [i for i in range(1, len(ordered)) if ranks[ordered[i].id] != ranks[ordered[i - 1].id]]
+        if ordered:
+            tiers.append(len(ordered))
+        return cls(providers=tuple(ordered), ordered=True, tiers=tuple(tiers))
+
+
+class RoutingTable:
+    def __init__(
+        self,
+        log_cfg: LogConfiguration,
+        load_balancer_config: LoadBalancerConfig,
+        provider_status_manager: ProviderStatusManager,
+        rpm_tpm_manager: RpmTpmManager,
+        group_load_balancer_config: Optional[dict[str, LoadBalancerConfig]] = None,
+        latency_tracker: Optional[LatencyTracker] = None,
+    ):
+        """
+        Routing table mode, the eligible providers and the selection structure of each group are recomputed
+        by a background task every `routing_table_refresh_ms`, or earlier when a provider is put in cooldown,
+        or a provider is rejected by the validation at scheduling time.
+        The hot path only picks a provider from the snapshot and validates it against the RPM/TPM limits.
+        :param log_cfg:
+        :param load_balancer_config: the default config, its refresh interval is used for all groups.
+        :param provider_status_manager:
+        :param rpm_tpm_manager:
+        :param group_load_balancer_config: the strategy of a group is compiled from its own config if specified.
+        :param latency_tracker: required by the latency based strategy.
+        """
+        self.logger = get_logger(__name__, log_cfg)
+        self.load_balancer_config = load_balancer_config
+        self.provider_status_manager = provider_status_manager
+        self.rpm_tpm_manager = rpm_tpm_manager
+        self.group_load_balancer_config = group_load_balancer_config or {}
+        self.latency_tracker = latency_tracker
+        self.refresh_interval = load_balancer_config.routing_table_refresh_ms / 1000
+        self.snapshots: dict[str, RoutingSnapshot] = {}
+        self.refresh_task: Optional[asyncio.Task] = None
+        self._dirty: Optional[asyncio.Event] = None
+        provider_status_manager.add_cooldown_listener(self.invalidate)
+
+    async def start_refresh_task(self):
+        if not self.refresh_task:
+            self._dirty = asyncio.Event()
+            self.refresh_task = asyncio.create_task(self._periodic_refresh())
+
+    async def stop_refresh_task(self):
+        if self.refresh_task:
+            self.refresh_task.cancel()
+            try:
+                await self.refresh_task
+            except asyncio.CancelledError:
+                self.logger.warning("Routing table refresh task was cancelled")
+            self.refresh_task = None
+
+    def invalidate(self, *_args):
+        """
+        Mark the routing table as dirty, the background task recomputes it without waiting for the next interval.
+        :return:
+        """
+        if self._dirty is not None:
+            self._dirty.set()
+
+    async def schedule_provider(self, group: str, token_count: int) -> Optional[LLMProviderConfig]:
+        """
+        Pick a provider from the snapshot of the group. The snapshot may be stale, so the candidate is validated
+        against its RPM/TPM limits before it is returned. The group is compiled synchronously on its first request.
+        :param group:
+        :param token_count:
+        :return:
+        """
+        await self.start_refresh_task()
+        snapshot = self.snapshots.get(group)
+        if snapshot is None:
+            snapshot = await self.refresh(group)
+        for provider in snapshot.candidates():
+            if await self._within_limits(group, provider, token_count):
+                return provider
+            self.logger.debug(f"Provider {provider.id} in routing table of {group} is over limit")
+            self.invalidate()
+        return None
+
+    async def refresh(self, group: Optional[str] = None) -> Optional[RoutingSnapshot]:
+        """
+        Recompute the snapshot of a group, or all known groups if group is None.
+        :param group:
+        :return: The snapshot of the group if group is specified.
+        """
+        groups = [group] if group is not None else list(self.snapshots)
+        for g in groups:
+            self.snapshots[g] = await self._compile(g)
+        return self.snapshots[group] if group is not None else None
+
+    async def reload(
+        self,
+        load_balancer_config: LoadBalancerConfig,
+        group_load_balancer_config: Optional[dict[str, LoadBalancerConfig]] = None,
+    ):
+        """
+        Apply the load balancer configs of a new router config, the snapshots of the known groups are recompiled
+        before they are swapped in, the requests use the previous snapshots meanwhile.
+        :param load_balancer_config:
+        :param group_load_balancer_config:
+        :return:
+        """
+        self.load_balancer_config = load_balancer_config
+        self.group_load_balancer_config = group_load_balancer_config or {}
+        self.refresh_interval = load_balancer_config.routing_table_refresh_ms / 1000
+        groups = [g for g in self.snapshots if g in self.provider_status_manager.provider_groups]
+        self.snapshots = {g: await self._compile(g) for g in groups}
+
+    async def _compile(self, group: str) -> RoutingSnapshot:
+        # The usage is tracked by minute of the router context, the background task does not have one.
+        token = router_context.set(RouterContext(model_group=group, token_count=0))
+        try:
+            providers = await self.provider_status_manager.get_available_providers(group)
+            eligible = []
+            tpm_usages = {}
+            for p in providers:
+                if await self._within_limits(group, p, 0):
+                    eligible.append(p)
+                    tpm_usages[p.id] = await self.rpm_tpm_manager.tpm_usage_at_minute(group, p.id)
+        finally:
+            router_context.reset(token)
+        lb_config = self.group_load_balancer_config.get(group, self.load_balancer_config)
+        strategy = lb_config.strategy
+        if strategy == LoadBalancerStrategy.LOWEST_TPM_BALANCER:
+            return RoutingSnapshot.ranked(eligible, lambda p: tpm_usages[p.id])
+        if strategy == LoadBalancerStrategy.LATENCY_BASED_BALANCER and self.latency_tracker:
+            return RoutingSnapshot.ranked(eligible, lambda p: self.latency_tracker.percentile(p.id, 0.5) or 0.0)
+        if strategy == LoadBalancerStrategy.COST_BASED_BALANCER:
+            return RoutingSnapshot.ranked(eligible, lambda p: p.cost if p.cost is not None else math.inf)
+        if strategy == LoadBalancerStrategy.CAPACITY_BASED_BALANCER:
+            dimension = lb_config.capacity_dimension
+            cumulative, total = [], 0.0
+            for p in eligible:
+                total += getattr(p, dimension) or 0
+                cumulative.append(total)
+            return RoutingSnapshot(providers=tuple(eligible), cumulative_weights=tuple(cumulative))
+        return RoutingSnapshot(providers=tuple(eligible))
+
+    async def _within_limits(self, group: str, provider: LLMProviderConfig, token_count: int) -> bool:
+        rpm_limit = provider.rpm or math.inf
+        tpm_limit = provider.tpm or math.inf
+        if math.isinf(rpm_limit) and math.isinf(tpm_limit):
+            return True
+        if await self.rpm_tpm_manager.rpm_usage_at_minute(group, provider.id) + 1 > rpm_limit:
+            return False
+        if await self.rpm_tpm_manager.tpm_usage_at_minute(group, provider.id) + token_count > tpm_limit:
+            return False
+        return True
+
+    async def _periodic_refresh(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._dirty.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.logger.error(f"Failed to refresh routing table: {e}")
@@ -54,7 +54,8 @@ class RpmTpmManager:
 
     async def _increase_occupied(self, dimension: Dimension, group: str, provider_id: str, value: int):
         """
-        Before invoking a provider, the RPM 'occupying' for the provider is incremented. We will insert initialized usage data here.
+        Before invoking a provider, the RPM 'occupying' for the provider is incremented. We will insert initialized usage data
+        here if the provider has no usage in this minute yet.
         :param dimension:
         :param group:
         :param provider_id:
@@ -63,14 +64,16 @@ class RpmTpmManager:
         """
         key, lock = self._fetch_or_create_lock(dimension, group, provider_id)
         async with lock:
-            usage = self.Usage(used=0, occupying=value)
+            data = await self.cache.async_get_value(key)
+            usage = self.Usage.deserialize(data) if data else self.Usage(used=0, occupying=0)
+            usage.occupying += value
             await self.cache.async_set_value(key, usage.serialize(), ttl=self.DEFAULT_TTL)
 
     async def increase_rpm_occupied(self, group: str, provider_id: str, value: int = 1):
         return await self._increase_occupied(Dimension.RPM, group, provider_id, value)
 
     async def increase_tpm_occupied(self, group: str, provider_id: str, value: int):
-        return await self._increase_occupied(Dimension.RPM, group, provider_id, value)
+        return await self._increase_occupied(Dimension.TPM, group, provider_id, value)
 
     async def _update_used_usage(self, dimension: Dimension, group: str, provider_id: str, value: int):
         """
@@ -0,0 +1,4 @@
+from src.metrics.registry import Gauge, Counter, Histogram, MetricsRegistry
+from src.metrics.instrumentation import Instrumentation
+
+__all__ = ["Gauge", "Counter", "Histogram", "MetricsRegistry", "Instrumentation"]
@@ -0,0 +1,110 @@
+import time
+from typing import Any, Optional
+
+from src.config import MetricsConfig
+from src.metrics.registry import MetricsRegistry
+
+SPAN_PREFIX = "llm_router."
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc_info):
+        return None
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+class _Stage:
+    __slots__ = ("instrumentation", "labels", "start", "span")
+
+    def __init__(self, instrumentation: "Instrumentation", labels: tuple[str, str, str]):
+        self.instrumentation = instrumentation
+        self.labels = labels
+        self.span = None
+
+    def __enter__(self):
+        tracer = self.instrumentation.tracer
+        if tracer is not None:
+            stage, group, provider = self.labels
+            self.span = tracer.start_as_current_span(
+                SPAN_PREFIX + stage, attributes={"llm_router.group": group, "llm_router.provider": provider}
+            )
+            self.span.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.instrumentation.stage_seconds.observe(self.labels, time.perf_counter() - self.start)
+        if self.span is not None:
+            self.span.__exit__(*exc_info)
+        return None
+
+
+class Instrumentation:
+    def __init__(self, config: MetricsConfig, tracer: Optional[Any] = None):
+        """
+        Time the stages of the requests. If the metrics are disabled, a stage is a shared no-op context manager,
+        so the instrumentation costs an attribute check per stage.
+        :param config:
+        :param tracer: the OpenTelemetry tracer of the spans, default is the tracer of the global provider if the
+            tracing is enabled.
+        """
+        self.enabled = config.enabled
+        self.registry = MetricsRegistry()
+        self.stage_seconds = self.registry.histogram(
+            "llm_router_stage_seconds",
+            "The duration of the stages of the requests in seconds.",
+            ("stage", "group", "provider"),
+            config.buckets,
+        )
+        self.tracer = None
+        if config.enabled and config.tracing_enabled:
+            self.tracer = tracer or _get_tracer()
+
+    def stage(self, stage: str, group: str, provider: Optional[str] = None):
+        """
+        Time a stage in a with block, e.g. `with metrics.stage("schedule_provider", group): ...`.
+        :param stage:
+        :param group:
+        :param provider:
+        :return:
+        """
+        if not self.enabled:
+            return _NOOP_STAGE
+        return _Stage(self, (stage, group, provider or ""))
+
+    def observe(self, stage: str, group: str, provider: Optional[str], seconds: float):
+        """
+        Record a stage which is not a block of the router, e.g. the sleep of a retry, it starts now.
+        :param stage:
+        :param group:
+        :param provider:
+        :param seconds:
+        :return:
+        """
+        if not self.enabled:
+            return
+        labels = (stage, group, provider or "")
+        self.stage_seconds.observe(labels, seconds)
+        if self.tracer is not None:
+            start = time.time_ns()
+            span = self.tracer.start_span(
+                SPAN_PREFIX + stage,
+                start_time=start,
+                attributes={"llm_router.group": labels[1], "llm_router.provider": labels[2]},
+            )
+            span.end(end_time=start + int(seconds * 1e9))
+
+
+def _get_tracer():
+    try:
+        from opentelemetry import trace
+    except ImportError as e:
+        raise ImportError("Tracing requires OpenTelemetry: pip install opentelemetry-api") from e
+    return trace.get_tracer("llm-router")
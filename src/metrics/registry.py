@@ -0,0 +1,164 @@
+import math
+from bisect import bisect_left
+from typing import Union, Optional
+
+Labels = tuple[str, ...]
+
+
+class _Series:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, label_names: Labels, buckets: tuple[float, ...]):
+        """
+        A Prometheus histogram with fixed buckets, an observation is a bisect and three increments.
+        The event loop is single-threaded, so the series need no lock.
+        :param name:
+        :param description:
+        :param label_names:
+        :param buckets: the sorted upper bounds, the +Inf bucket is implicit.
+        """
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: dict[Labels, _Series] = {}
+
+    def observe(self, labels: Labels, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _Series(len(self.buckets) + 1)
+        # The bucket `le` includes its upper bound.
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def count(self, labels: Labels) -> int:
+        series = self._series.get(labels)
+        return series.count if series else 0
+
+    def sum(self, labels: Labels) -> float:
+        series = self._series.get(labels)
+        return series.sum if series else 0.0
+
+    def quantile(self, labels: Labels, q: float) -> Optional[float]:
+        """
+        Estimate the quantile by linear interpolation within its bucket, like `histogram_quantile` of Prometheus.
+        :param labels:
+        :param q: in [0, 1]
+        :return: None if there is no observation, the highest bucket bound if the quantile is in the +Inf bucket.
+        """
+        series = self._series.get(labels)
+        if not series or not series.count:
+            return None
+        rank = q * series.count
+        cumulative = 0
+        for i, count in enumerate(series.counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def labels(self) -> list[Labels]:
+        return list(self._series)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._series.items():
+            label_text = _format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), series.counts):
+                cumulative += count
+                le = "+Inf" if math.isinf(bound) else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series.sum!r}")
+            lines.append(f"{self.name}_count{{{label_text}}} {series.count}")
+        return lines
+
+
+class Gauge:
+    type = "gauge"
+
+    def __init__(self, name: str, description: str, label_names: Labels):
+        """
+        A Prometheus gauge, the values are set when the metrics are collected.
+        :param name:
+        :param description:
+        :param label_names:
+        """
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.values: dict[Labels, float] = {}
+
+    def set(self, labels: Labels, value: Union[int, float]):
+        self.values[labels] = value
+
+    def get(self, labels: Labels) -> Optional[float]:
+        return self.values.get(labels)
+
+    def clear(self):
+        self.values.clear()
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in self.values.items():
+            label_text = f"{{{_format_labels(self.label_names, labels)}}}" if labels else ""
+            lines.append(f"{self.name}{label_text} {value}")
+        return lines
+
+
+class Counter(Gauge):
+    """
+    A Prometheus counter, the values are the running totals kept by the components, e.g. the cache hits,
+    and set when the metrics are collected.
+    """
+
+    type = "counter"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: dict[str, Union[Histogram, Gauge, Counter]] = {}
+
+    def histogram(self, name: str, description: str, label_names: Labels, buckets: tuple[float, ...]) -> Histogram:
+        return self._register(Histogram(name, description, label_names, buckets))
+
+    def gauge(self, name: str, description: str, label_names: Labels) -> Gauge:
+        return self._register(Gauge(name, description, label_names))
+
+    def counter(self, name: str, description: str, label_names: Labels) -> Counter:
+        return self._register(Counter(name, description, label_names))
+
+    def render(self) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format.
+        :return:
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+
+def _format_labels(names: Labels, values: Labels) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
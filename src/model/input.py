@@ -1,7 +1,9 @@
+import json
 from typing import Optional
-from dataclasses import dataclass
+from dataclasses import replace, dataclass
 
 from src.config import RetryConfig, FallbackConfig
+from src.utils.hash import generate_unique_id
 from src.model.message import ChatMessageValues
 from src.exceptions.exceptions import InvalidInputError
 
@@ -22,6 +24,65 @@ class UserParams:
 @dataclass
 class RouterParams(UserParams):
     # To distinguish with request, we use `RouterInput`.
-    timeout_seconds: int = 30
+    # The deadline of the request across retries and fallback, default is `RouterConfig.timeout_seconds`.
+    timeout_seconds: Optional[float] = None
     retry_config: Optional[RetryConfig] = None
     fallback_config: Optional[FallbackConfig] = None
+    # Set to False to bypass the response cache for this request.
+    use_cache: bool = True
+
+    def __post_init__(self):
+        super().__post_init__()
+        if self.timeout_seconds is not None and self.timeout_seconds <= 0:
+            raise InvalidInputError(f"Invalid timeout_seconds value: {self.timeout_seconds}")
+
+    def override(self, **changes) -> "RouterParams":
+        """
+        A shallow copy with the changes, e.g. the retry, fallback or model group of an attempt.
+        The router doesn't mutate the params, it layers its overrides on a copy, so the caller's params are unchanged,
+        and the text and messages are shared rather than copied, they must not be mutated while the request is
+        in flight.
+        :param changes:
+        :return:
+        """
+        return replace(self, **changes)
+
+    def request_key(self) -> str:
+        """
+        A canonical hash of the fields which determine the response, the retry, fallback and timeout are excluded.
+        :return:
+        """
+        data = {"model_group": self.model_group, "text": self.text, "messages": self.messages}
+        return generate_unique_id(json.dumps(data, default=str, separators=(",", ":"), sort_keys=True))
+
+    def coalescing_key(self) -> str:
+        """
+        The key of the concurrent requests which share a provider call, the request key with the retry and fallback,
+        which determine the providers tried. The timeout is excluded, each caller waits with its own deadline.
+        :return:
+        """
+        return generate_unique_id(f"{self.request_key()}:{self.retry_config!r}:{self.fallback_config!r}")
+
+
+@dataclass
+class EmbeddingParams:
+    model_group: str
+    texts: list[str]
+    # The deadline of the request across retries and fallback, default is `RouterConfig.timeout_seconds`.
+    timeout_seconds: Optional[float] = None
+    retry_config: Optional[RetryConfig] = None
+    fallback_config: Optional[FallbackConfig] = None
+
+    def __post_init__(self):
+        if not self.texts:
+            raise InvalidInputError("'texts' must be provided.")
+        if self.timeout_seconds is not None and self.timeout_seconds <= 0:
+            raise InvalidInputError(f"Invalid timeout_seconds value: {self.timeout_seconds}")
+
+    def override(self, **changes) -> "EmbeddingParams":
+        """
+        A shallow copy with the changes, the texts are shared like `RouterParams.override`.
+        :param changes:
+        :return:
+        """
+        return replace(self, **changes)
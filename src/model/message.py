@@ -1,7 +1,5 @@
 from typing import Union, Literal, Iterable, Optional, Required, TypedDict
 
-from openai.types.chat import ChatCompletionContentPartInputAudioParam
-
 
 class OpenAIChatCompletionTextObject(TypedDict):
     type: Literal["text"]
@@ -26,8 +24,15 @@ class ChatCompletionImageObject(TypedDict):
     image_url: Union[str, ChatCompletionImageUrlObject]
 
 
-class ChatCompletionAudioObject(ChatCompletionContentPartInputAudioParam):
-    pass
+# The input audio part of OpenAI, it's declared here, so importing the router doesn't import the OpenAI SDK.
+class ChatCompletionInputAudio(TypedDict):
+    data: str  # Base64 encoded audio data.
+    format: Literal["wav", "mp3"]
+
+
+class ChatCompletionAudioObject(TypedDict):
+    type: Literal["input_audio"]
+    input_audio: ChatCompletionInputAudio
 
 
 OpenAIMessageContentListBlock = Union[
@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Optional, AsyncIterator
 
-from src.model.input import UserParams
+from src.model.input import UserParams, EmbeddingParams
 
 
 class BaseLLMProvider(ABC):
@@ -13,3 +13,28 @@ class BaseLLMProvider(ABC):
     @abstractmethod
     async def completion(self, param: UserParams) -> Any:
         pass
+
+    async def stream_completion(self, param: UserParams) -> AsyncIterator[Any]:
+        """
+        Stream the completion in chunks. The default implementation yields the whole completion as a single chunk,
+        override it if the provider supports streaming.
+        :param param:
+        :return:
+        """
+        yield await self.completion(param)
+
+    async def embedding(self, param: EmbeddingParams) -> list[Any]:
+        """
+        Embed the texts of the param, override it if the provider supports embeddings.
+        :param param:
+        :return: one embedding per text, in order.
+        """
+        raise NotImplementedError(f"{self!r} does not support embeddings")
+
+    async def health_check(self) -> Optional[bool]:
+        """
+        Optional lightweight probe of the provider, e.g. list the models or a 1-token completion.
+        It's used by the health probe scheduler to remove unhealthy providers before users reach them.
+        :return: True if the provider is healthy, False otherwise. None if the provider does not support probing.
+        """
+        return None
@@ -0,0 +1,123 @@
+import asyncio
+from typing import Any, Union, Callable, Iterable, Optional, Awaitable, AsyncIterable, AsyncIterator
+from collections import deque
+from dataclasses import dataclass
+
+from src.model.input import RouterParams
+
+
+@dataclass
+class BatchResult:
+    """
+    The outcome of an item of a batch, `exception` is set if the item failed.
+    """
+
+    index: int
+    params: RouterParams
+    result: Any = None
+    exception: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.exception is None
+
+
+async def aiter_params(
+    params: Union[Iterable[RouterParams], AsyncIterable[RouterParams]],
+) -> AsyncIterator[RouterParams]:
+    if isinstance(params, AsyncIterable):
+        async for p in params:
+            yield p
+    else:
+        for p in params:
+            yield p
+
+
+async def prepend(first: RouterParams, rest: AsyncIterator[RouterParams]) -> AsyncIterator[RouterParams]:
+    yield first
+    async for p in rest:
+        yield p
+
+
+async def _run_item(
+    completion: Callable[[RouterParams], Awaitable[Any]],
+    index: int,
+    params: RouterParams,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> BatchResult:
+    try:
+        if semaphore is None:
+            return BatchResult(index, params, result=await completion(params))
+        async with semaphore:
+            return BatchResult(index, params, result=await completion(params))
+    except Exception as e:
+        return BatchResult(index, params, exception=e)
+
+
+async def run_batch(
+    completion: Callable[[RouterParams], Awaitable[Any]],
+    params: Union[Iterable[RouterParams], AsyncIterable[RouterParams]],
+    concurrency: int,
+    ordered: bool = False,
+) -> AsyncIterator[BatchResult]:
+    """
+    Run the completion for each item, with at most `concurrency` items in flight.
+    The items are pulled from the input lazily, so the memory is bounded by the concurrency, not the input size.
+    In ordered mode, at most `2 * concurrency` items are started but not yet yielded, a slow item blocks the new
+    items once the window is full, instead of buffering an unbounded number of results.
+    :param completion:
+    :param params:
+    :param concurrency:
+    :param ordered: yield the results in input order, otherwise as they complete.
+    :return:
+    """
+    if concurrency <= 0:
+        raise ValueError(f"Invalid concurrency value: {concurrency}")
+    items = aiter_params(params)
+    exhausted = False
+    index = 0
+
+    async def next_task(semaphore: Optional[asyncio.Semaphore] = None) -> Optional[asyncio.Task]:
+        nonlocal exhausted, index
+        if exhausted:
+            return None
+        item = await anext(items, None)
+        if item is None:
+            exhausted = True
+            return None
+        task = asyncio.create_task(_run_item(completion, index, item, semaphore))
+        index += 1
+        return task
+
+    pending: Union[set, deque] = deque() if ordered else set()
+    try:
+        if ordered:
+            semaphore = asyncio.Semaphore(concurrency)
+            while True:
+                while len(pending) < 2 * concurrency:
+                    task = await next_task(semaphore)
+                    if task is None:
+                        break
+                    pending.append(task)
+                if not pending:
+                    return
+                # Keep the head in the window until it's done, so it's cancelled if the batch is closed.
+                result = await pending[0]
+                pending.popleft()
+                yield result
+        else:
+            while True:
+                while len(pending) < concurrency:
+                    task = await next_task()
+                    if task is None:
+                        break
+                    pending.add(task)
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        await items.aclose()
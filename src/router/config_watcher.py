@@ -0,0 +1,84 @@
+import asyncio
+from typing import Union, Callable, Optional, Awaitable
+from pathlib import Path
+
+from src.config import LogConfiguration
+from src.router.log import get_logger
+from src.config.config import RouterConfig
+from src.config.loader import ConfigLoader
+
+
+class ConfigWatcher:
+    def __init__(
+        self,
+        log_cfg: LogConfiguration,
+        path: Union[str, Path],
+        on_change: Callable[[RouterConfig], Awaitable[None]],
+        loader: Optional[ConfigLoader] = None,
+        interval_seconds: float = 1.0,
+    ):
+        """
+        Poll the config file and apply its config when the file changes, e.g. with `Router.update_config`.
+        An invalid config is logged and skipped, the last valid config stays in effect until the file is fixed.
+        If the config fails to apply, it's applied again at the next check.
+        :param log_cfg:
+        :param path: a JSON or YAML config file.
+        :param on_change: apply the new config.
+        :param loader: the loader which built the current config, so the unchanged providers keep their ids.
+        :param interval_seconds: how often the modification time of the file is checked.
+        """
+        self.logger = get_logger(__name__, log_cfg)
+        self.path = Path(path)
+        self.on_change = on_change
+        self.loader = loader or ConfigLoader()
+        self.interval_seconds = interval_seconds
+        self.watch_task: Optional[asyncio.Task] = None
+        self._stamp = self._file_stamp()
+
+    async def start_watch_task(self):
+        if not self.watch_task:
+            self.watch_task = asyncio.create_task(self._watch_loop())
+
+    async def stop_watch_task(self):
+        if self.watch_task:
+            self.watch_task.cancel()
+            try:
+                await self.watch_task
+            except asyncio.CancelledError:
+                self.logger.warning("Config watch task was cancelled")
+            self.watch_task = None
+
+    async def check(self) -> bool:
+        """
+        Load and apply the config if the file changed since the last check.
+        :return: True if a new config is applied.
+        """
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return False
+        try:
+            cfg = self.loader.load(self.path)
+        except Exception as e:
+            self._stamp = stamp
+            self.logger.error(f"Failed to load config {self.path}, keep the current config: {e}")
+            return False
+        await self.on_change(cfg)
+        # Only an applied config is marked as seen, a failed update is retried.
+        self._stamp = stamp
+        self.logger.info(f"Config {self.path} is reloaded")
+        return True
+
+    def _file_stamp(self) -> Optional[tuple[int, int]]:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def _watch_loop(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.check()
+            except Exception as e:
+                self.logger.error(f"Failed to apply config {self.path}: {e}")
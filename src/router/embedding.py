@@ -0,0 +1,160 @@
+import asyncio
+from typing import Any, Callable, Optional, Awaitable
+
+from src.config import LogConfiguration
+from src.router.log import get_logger
+from src.exceptions.exceptions import BadRequestError, RetryExhaustedError
+
+
+def split_batches(token_counts: list[int], max_size: int, max_tokens: Optional[int]) -> list[tuple[int, int]]:
+    """
+    Split the texts into consecutive batches of at most `max_size` texts and `max_tokens` tokens, a text larger
+    than `max_tokens` is a batch of its own.
+    :param token_counts: the token count of each text.
+    :param max_size:
+    :param max_tokens:
+    :return: the [start, end) ranges of the batches.
+    """
+    batches = []
+    start = 0
+    tokens = 0
+    for i, count in enumerate(token_counts):
+        if i > start and (i - start >= max_size or (max_tokens is not None and tokens + count > max_tokens)):
+            batches.append((start, i))
+            start = i
+            tokens = 0
+        tokens += count
+    batches.append((start, len(token_counts)))
+    return batches
+
+
+def is_input_error(exc: BaseException) -> bool:
+    """
+    Whether the provider rejected the input of the call, e.g. a text of the batch is invalid or too long, so the
+    same texts fail on any provider.
+    :param exc: the exception of the call, the last exception of the retries if they are exhausted.
+    :return:
+    """
+    if isinstance(exc, RetryExhaustedError):
+        exc = exc.last_exception
+    return isinstance(exc, BadRequestError) and not isinstance(exc, RetryExhaustedError)
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        log_cfg: LogConfiguration,
+        linger_seconds: float,
+        max_size: int,
+        max_tokens: Optional[int],
+        send: Callable[[list[str], int], Awaitable[list[Any]]],
+    ):
+        """
+        Merge the texts of concurrent embedding requests into batches. A batch is sent when it's full, or
+        `linger_seconds` after its first text, so a request waits at most the linger window for other requests.
+        If a batch merging several requests is rejected for its input, the texts of each request are sent again on
+        their own, so one bad text only fails the request it belongs to.
+        :param log_cfg:
+        :param linger_seconds:
+        :param max_size: the maximum number of texts of a batch.
+        :param max_tokens: the maximum number of tokens of a batch.
+        :param send: embed the texts of a batch with their total token count.
+        """
+        self.logger = get_logger(__name__, log_cfg)
+        self.linger_seconds = linger_seconds
+        self.max_size = max_size
+        self.max_tokens = max_tokens
+        self.send = send
+        # (text, token count, future, request number)
+        self.pending: list[tuple[str, int, asyncio.Future, int]] = []
+        self.pending_tokens = 0
+        self.batches = 0
+        self.texts = 0
+        self.requests = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, texts: list[str], token_counts: list[int]) -> list[asyncio.Future]:
+        """
+        Add the texts to the pending batch.
+        :param texts:
+        :param token_counts:
+        :return: the future of each embedding.
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        self.requests += 1
+        for text, count in zip(texts, token_counts):
+            if self.pending and (
+                len(self.pending) >= self.max_size
+                or (self.max_tokens is not None and self.pending_tokens + count > self.max_tokens)
+            ):
+                self.flush()
+            future = loop.create_future()
+            self.pending.append((text, count, future, self.requests))
+            self.pending_tokens += count
+            futures.append(future)
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        elif self.pending and self._timer is None:
+            self._timer = loop.call_later(self.linger_seconds, self.flush)
+        return futures
+
+    def flush(self):
+        """
+        Send the pending batch.
+        :return:
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # The requests cancelled while lingering are dropped.
+        items = [item for item in self.pending if not item[2].done()]
+        self.pending = []
+        self.pending_tokens = 0
+        if not items:
+            return
+        self.batches += 1
+        self.texts += len(items)
+        task = asyncio.create_task(self._send(items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, items: list[tuple[str, int, asyncio.Future, int]], isolate: bool = True):
+        """
+        Send a batch and resolve the futures of its texts.
+        :param items:
+        :param isolate: if the batch is rejected for its input, send the texts of each request on their own.
+        :return:
+        """
+        try:
+            embeddings = await self.send([item[0] for item in items], sum(item[1] for item in items))
+            if len(embeddings) != len(items):
+                raise ValueError(f"Expected {len(items)} embeddings, got {len(embeddings)}")
+        except Exception as e:
+            requests = list(dict.fromkeys(item[3] for item in items))
+            if isolate and len(requests) > 1 and is_input_error(e):
+                self.logger.warning(
+                    f"Embedding batch of {len(items)} texts is rejected: {e}, send the {len(requests)} requests apart"
+                )
+                await asyncio.gather(
+                    *(self._send([item for item in items if item[3] == r], isolate=False) for r in requests)
+                )
+                return
+            self.logger.warning(f"Embedding batch of {len(items)} texts failed: {e}")
+            for item in items:
+                if not item[2].done():
+                    item[2].set_exception(e)
+            return
+        for item, embedding in zip(items, embeddings):
+            if not item[2].done():
+                item[2].set_result(embedding)
+
+    async def close(self):
+        """
+        Send the pending batch and wait for the batches in flight.
+        :return:
+        """
+        self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, Callable, Optional, Sequence, Awaitable
+
+from src.config import FallbackMode, FallbackConfig, LogConfiguration
+from src.router.log import get_logger
+
+
+class FallbackExecutor:
+    def __init__(self, log_cfg: LogConfiguration, fallback_config: FallbackConfig):
+        """
+        Call the fallback groups of a request in sequence, staggered or all at once, depending on the mode.
+        A group is started when all the started groups failed, or, in the staggered mode, when the latest one has
+        not succeeded within `stagger_seconds`. The first successful group wins, the other calls are cancelled.
+        :param log_cfg:
+        :param fallback_config:
+        """
+        self.logger = get_logger(__name__, log_cfg)
+        self.fallback_config = fallback_config
+
+    def delay(self) -> Optional[float]:
+        """
+        :return: the delay to start the next group while the started ones are running, None to wait for them.
+        """
+        mode = self.fallback_config.mode
+        if mode == FallbackMode.RACE:
+            return 0
+        if mode == FallbackMode.STAGGERED:
+            return self.fallback_config.stagger_seconds
+        return None
+
+    async def execute(
+        self,
+        groups: Sequence[str],
+        call: Callable[[str], Awaitable[Any]],
+        discard: Optional[Callable[[Any], Awaitable[None]]] = None,
+    ) -> Any:
+        """
+        :param groups: the fallback chain.
+        :param call: call a group in a new task, so each call has its own router context.
+        :param discard: release the result of a successful call which lost the race, e.g. close a stream.
+        :return: the result of the first successful group. If all the groups fail, raise the exception of the last.
+        """
+        delay = self.delay()
+        tasks: dict[asyncio.Task, int] = {}
+        running: set[asyncio.Task] = set()
+        errors: dict[int, BaseException] = {}
+        winner: Optional[asyncio.Task] = None
+        try:
+            while True:
+                if len(tasks) < len(groups):
+                    task = asyncio.create_task(call(groups[len(tasks)]))
+                    tasks[task] = len(tasks)
+                    running.add(task)
+                if not running:
+                    break
+                timeout = delay if len(tasks) < len(groups) else None
+                done, running = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.get):
+                    if task.exception() is not None:
+                        errors[tasks[task]] = task.exception()
+                    elif winner is None:
+                        winner = task
+                    elif discard:
+                        await discard(task.result())
+                if winner is not None:
+                    self.logger.info(f"Fallback model {groups[tasks[winner]]} won, {len(tasks)} started")
+                    return winner.result()
+            raise errors[len(groups) - 1]
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.wait(running)
+                for task in running:
+                    if not task.cancelled() and task.exception() is None and discard:
+                        await discard(task.result())
@@ -0,0 +1,149 @@
+import time
+import asyncio
+from typing import Any, Callable, Optional, Awaitable
+
+from src.config import HedgingConfig, LogConfiguration
+from src.router.log import get_logger
+from src.config.config import LLMProviderConfig
+from src.utils.context import RouterContext, router_context
+from src.load_balance.latency import LatencyTracker
+from src.load_balance.rpm_tpm_manager import RpmTpmManager
+
+# The learned threshold of a group is recomputed at most once per interval.
+THRESHOLD_RECOMPUTE_SECONDS = 1
+
+
+class HedgingManager:
+    def __init__(
+        self,
+        log_cfg: LogConfiguration,
+        hedging_config: HedgingConfig,
+        latency_tracker: LatencyTracker,
+        rpm_tpm_manager: RpmTpmManager,
+    ):
+        """
+        Send a hedged request to a second provider if the first one is slower than the threshold.
+        The RPM/TPM occupancy of the hedged call is charged when it is sent. Only the winner's occupancy is
+        converted to usage by the retry manager, so the loser's occupancy is released here.
+        A primary call cancelled by a faster hedged call records its elapsed time as its latency, a lower bound,
+        otherwise the slowest calls would be missing from the percentile which sets the threshold.
+        :param log_cfg:
+        :param hedging_config:
+        :param latency_tracker:
+        :param rpm_tpm_manager:
+        """
+        self.logger = get_logger(__name__, log_cfg)
+        self.hedging_config = hedging_config
+        self.latency_tracker = latency_tracker
+        self.rpm_tpm_manager = rpm_tpm_manager
+        self.budget = 0.0
+        self.hedged_requests = 0
+        self._thresholds: dict[str, tuple[float, Optional[float]]] = {}
+
+    def threshold(self, group: str, providers: list[LLMProviderConfig]) -> Optional[float]:
+        """
+        Get the hedging threshold of the group in seconds.
+        :param group:
+        :param providers: providers of the group, their latencies are used to learn the threshold.
+        :return: None if the request should not be hedged.
+        """
+        if self.hedging_config.delay_seconds is not None:
+            return self.hedging_config.delay_seconds
+        now = time.monotonic()
+        cached = self._thresholds.get(group)
+        if cached and now - cached[0] < THRESHOLD_RECOMPUTE_SECONDS:
+            return cached[1]
+        ids = [p.id for p in providers]
+        threshold = None
+        if sum(self.latency_tracker.count(i) for i in ids) >= self.hedging_config.min_samples:
+            threshold = self.latency_tracker.group_percentile(ids, self.hedging_config.percentile)
+        self._thresholds[group] = (now, threshold)
+        return threshold
+
+    def _try_acquire_budget(self) -> bool:
+        if self.budget >= 1:
+            self.budget -= 1
+            return True
+        return False
+
+    async def execute(
+        self,
+        group: str,
+        providers: list[LLMProviderConfig],
+        primary: LLMProviderConfig,
+        call: Callable[[LLMProviderConfig], Awaitable[Any]],
+        pick_secondary: Callable[[LLMProviderConfig], Awaitable[Optional[LLMProviderConfig]]],
+    ) -> Any:
+        """
+        Call the primary provider, and hedge it with a secondary provider after the threshold.
+        :param group:
+        :param providers: providers of the group.
+        :param primary: the scheduled provider, it's the provider in the router context.
+        :param call: invoke the provider.
+        :param pick_secondary: schedule another provider, the primary provider must be excluded.
+        :return: the first successful result, if both calls fail, raise the exception of the primary call.
+        """
+        self.budget = min(self.budget + self.hedging_config.budget_ratio, self.hedging_config.max_budget)
+        threshold = self.threshold(group, providers)
+        if threshold is None:
+            return await call(primary)
+        primary_started = time.monotonic()
+        primary_task = asyncio.ensure_future(call(primary))
+        secondary_task = None
+        secondary = None
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=threshold)
+            if done or not self._try_acquire_budget():
+                return await primary_task
+            try:
+                secondary = await pick_secondary(primary)
+            except Exception as e:
+                # The primary call is healthy, a failed scheduling of the hedge must not cancel it.
+                self.logger.warning(f"Picking the secondary provider of {group} failed, not hedging: {e!r}")
+                secondary = None
+            if secondary is None:
+                self.budget += 1
+                return await primary_task
+            ctx: RouterContext = router_context.get()
+            await self.rpm_tpm_manager.increase_rpm_occupied(group, secondary.id)
+            await self.rpm_tpm_manager.increase_tpm_occupied(group, secondary.id, ctx.token_count)
+            self.hedged_requests += 1
+            self.logger.info(f"Hedging request to {secondary.id} after {threshold:.3f}s, primary {primary.id}")
+            secondary_task = asyncio.ensure_future(call(secondary))
+            winner = await self._race(primary_task, secondary_task)
+            loser = primary if winner is secondary_task else secondary
+            if winner is secondary_task:
+                # The retry manager converts the occupancy of the provider in context to usage.
+                ctx.update_provider_id(secondary.id)
+                if not primary_task.done():
+                    self.latency_tracker.record(primary.id, time.monotonic() - primary_started)
+            await self._release(group, loser, ctx.token_count)
+            return winner.result()
+        except BaseException:
+            if secondary_task is not None:
+                await self._release(group, secondary, router_context.get().token_count)
+            raise
+        finally:
+            for task in (primary_task, secondary_task):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    @staticmethod
+    async def _race(primary_task: asyncio.Future, secondary_task: asyncio.Future) -> asyncio.Future:
+        """
+        Wait for the first successful task, if both fail, raise the exception of the primary task.
+        :param primary_task:
+        :param secondary_task:
+        :return:
+        """
+        pending = {primary_task, secondary_task}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task
+        raise primary_task.exception()
+
+    async def _release(self, group: str, provider: LLMProviderConfig, token_count: int):
+        await self.rpm_tpm_manager.release_rpm_occupied(group, provider.id)
+        await self.rpm_tpm_manager.release_tpm_occupied(group, provider.id, token_count)
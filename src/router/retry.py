@@ -1,3 +1,4 @@
+import asyncio
 from typing import Any, Callable, Optional, Awaitable
 
 from tenacity import (
@@ -10,7 +11,7 @@ from tenacity import (
     retry_if_exception,
 )
 
-from src.config import RetryPolicy, LogConfiguration
+from src.config import RetryPolicy, MetricsConfig, LogConfiguration
 from src.router.log import get_logger
 from src.model.input import UserParams
 from src.utils.context import RouterContext, router_context
@@ -24,8 +25,11 @@ from src.exceptions.exceptions import (
     RetryExhaustedError,
     ContentPolicyViolationError,
 )
+from src.metrics.instrumentation import Instrumentation
 from src.load_balance.rpm_tpm_manager import RpmTpmManager
 
+_NO_METRICS = Instrumentation(MetricsConfig())
+
 
 class RetryManager:
     def __init__(
@@ -38,6 +42,9 @@ class RetryManager:
         retry_policy: Optional[RetryPolicy] = None,
         fix_wait_seconds: float = 1,
         multiplier: float = 1,
+        defer_usage: bool = False,
+        expected_latency: Optional[Callable[[], Optional[float]]] = None,
+        metrics: Optional[Instrumentation] = None,
     ):
         """
         1. Default Retry (Global Shared Count)
@@ -46,11 +53,18 @@ class RetryManager:
         Under retry_policy, different error types have isolated retry counts. Each error type uses its own max_retries without affecting others.
         3. Global Cap (num_retries_per_request)
         Total retries across all errors never exceed num_retries_per_request. This acts as a hard upper limit for safety.
+        The wrapped function calls `occupy` once the provider of the attempt is scheduled, the occupancy is released
+        when the attempt fails, and converted to usage when it succeeds.
         :param async_wrapped_fn:
         :param log_cfg:
         :param max_attempt:
         :param max_delay:
         :param retry_policy:
+        :param defer_usage: if True, the occupancy is not converted to usage when the call succeeds, the caller must
+            call `commit_usage` or `release_resources` later, e.g. when a stream is exhausted.
+        :param expected_latency: the expected latency of an attempt, a retry is skipped if its wait and expected
+            latency don't fit in the time left before the deadline of the request.
+        :param metrics: time the RPM/TPM accounting and the waits between the attempts.
         """
         self.async_wrapped_fn = async_wrapped_fn
         self.max_attempt = max_attempt
@@ -59,7 +73,12 @@ class RetryManager:
         self.rpm_tpm_manager = rpm_tpm_manager
         self.fix_wait_seconds = fix_wait_seconds
         self.multiplier = multiplier
+        self.defer_usage = defer_usage
+        self.expected_latency = expected_latency
+        self.metrics = metrics or _NO_METRICS
         self.logger = get_logger(__name__, log_cfg)
+        # Whether the occupancy of the provider in context is charged, and not yet released or converted to usage.
+        self.occupying = False
 
     def retry_error_callback(self, retry_state: RetryCallState):
         """
@@ -90,15 +109,41 @@ class RetryManager:
 
     async def before(self, retry_state: RetryCallState):
         self._log_retrying_msg("Before", retry_state)
-        ctx: RouterContext = router_context.get()
-        await self.rpm_tpm_manager.increase_rpm_occupied(ctx.model_group, ctx.provider_id)
-        await self.rpm_tpm_manager.increase_tpm_occupied(ctx.model_group, ctx.provider_id, ctx.token_count)
 
-    async def release_resources(self):
+    async def occupy(self, ctx: Optional[RouterContext] = None):
+        """
+        Charge the RPM/TPM occupancy of the provider in context, once it's scheduled for the attempt.
+        :param ctx:
+        :return:
+        """
+        ctx = ctx or router_context.get()
+        with self.metrics.stage("usage_accounting", ctx.model_group, ctx.provider_id):
+            await self.rpm_tpm_manager.increase_rpm_occupied(ctx.model_group, ctx.provider_id)
+            await self.rpm_tpm_manager.increase_tpm_occupied(ctx.model_group, ctx.provider_id, ctx.token_count)
+        self.occupying = True
+
+    async def before_sleep(self, retry_state: RetryCallState):
         ctx: RouterContext = router_context.get()
+        self.metrics.observe("retry_wait", ctx.model_group, ctx.provider_id, retry_state.upcoming_sleep)
+
+    async def release_resources(self, ctx: Optional[RouterContext] = None):
+        # e.g. the attempt failed before a provider was scheduled.
+        if not self.occupying:
+            return
+        self.occupying = False
+        ctx = ctx or router_context.get()
         await self.rpm_tpm_manager.release_rpm_occupied(ctx.model_group, ctx.provider_id)
         await self.rpm_tpm_manager.release_tpm_occupied(ctx.model_group, ctx.provider_id, ctx.token_count)
 
+    async def commit_usage(self, ctx: Optional[RouterContext] = None):
+        if not self.occupying:
+            return
+        self.occupying = False
+        ctx = ctx or router_context.get()
+        with self.metrics.stage("usage_accounting", ctx.model_group, ctx.provider_id):
+            await self.rpm_tpm_manager.update_rpm_used_usage(ctx.model_group, ctx.provider_id)
+            await self.rpm_tpm_manager.update_tpm_used_usage(ctx.model_group, ctx.provider_id, ctx.token_count)
+
     async def after(self, retry_state: RetryCallState):
         self._log_retrying_msg("After", retry_state)
         if retry_state.outcome.failed:
@@ -116,6 +161,8 @@ class RetryManager:
         # Global delay limit
         if retry_state.idle_for >= self.max_delay:
             return True
+        if self._exceeds_deadline(retry_state):
+            return True
         if retry_state.outcome and retry_state.outcome.failed:
             exc = retry_state.outcome.exception()
             # If the exception is in the list of exceptions that should stop immediately
@@ -128,6 +175,19 @@ class RetryManager:
                 return retry_state.attempt_number >= effective_max
         return False
 
+    def _exceeds_deadline(self, retry_state: RetryCallState) -> bool:
+        remaining = router_context.get().remaining_seconds()
+        if remaining is None:
+            return False
+        expected = (self.expected_latency() if self.expected_latency else None) or 0
+        if retry_state.upcoming_sleep + expected < remaining:
+            return False
+        self.logger.warning(
+            f"Skip retry #{retry_state.attempt_number + 1}, {remaining:.3f}s left before the deadline, "
+            f"wait {retry_state.upcoming_sleep:.3f}s and expected latency {expected:.3f}s"
+        )
+        return True
+
     async def execute(self, val: UserParams) -> Any:
         # If the retry succeeded or throw non-retryable exception, this `after` function will not be called
         # So we need to release the occupied resources here and update cost at the end of `execute` function
@@ -148,16 +208,20 @@ class RetryManager:
                 retry=retry_if_exception(self.should_retry),
                 before=self.before,
                 after=self.after,
+                before_sleep=self.before_sleep,
                 reraise=True,
                 retry_error_callback=self.retry_error_callback,
             )
             result = await retryer(self.async_wrapped_fn, val)
             # update cost if succeed
-            ctx: RouterContext = router_context.get()
             self.logger.debug(f"Model call succeeded")
-            await self.rpm_tpm_manager.update_rpm_used_usage(ctx.model_group, ctx.provider_id)
-            await self.rpm_tpm_manager.update_tpm_used_usage(ctx.model_group, ctx.provider_id, ctx.token_count)
+            if not self.defer_usage:
+                await self.commit_usage()
             return result
+        except asyncio.CancelledError:
+            # e.g. the call lost a fallback race.
+            await self.release_resources()
+            raise
         except Exception as e:
             self.logger.error("Error in retry manager", exc_info=True)
             await self.release_resources()
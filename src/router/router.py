@@ -1,137 +1,936 @@
-from copy import deepcopy
-from typing import cast
+import math
+import time
+import asyncio
+from typing import Any, Union, Callable, Iterable, Optional, Awaitable, AsyncIterable, AsyncIterator, cast
+from dataclasses import dataclass
 
-from src.config import RetryConfig, FallbackConfig, LoadBalancerStrategy
+from src.config import RetryConfig, FallbackConfig, LoadBalancerConfig, LoadBalancerStrategy
+from src.metrics import Gauge, Instrumentation, MetricsRegistry
 from src.router.log import get_logger
-from src.model.input import UserParams, RouterParams
+from src.model.input import UserParams, RouterParams, EmbeddingParams
 from src.cache.memory import MemoryCache
-from src.load_balance import RandomBalancer, ProviderStatusManager
+from src.load_balance import (
+    RandomBalancer,
+    CostBasedBalancer,
+    LatencyBasedBalancer,
+    ProviderStatusManager,
+)
+from src.router.batch import BatchResult, prepend, run_batch, aiter_params
 from src.router.retry import RetryManager
-from src.config.config import RouterConfig
+from src.router.state import RoutingState
+from src.utils.asyncy import BackgroundLoop
+from src.config.config import RouterConfig, LLMProviderConfig
 from src.token.counter import TokenCounter
 from src.utils.context import RouterContext, router_context
-from src.exceptions.exceptions import SHOULD_FALLBACK_EXCEPTIONS, NoProviderAvailableError
+from src.cache.response import ResponseCache
+from src.router.hedging import HedgingManager
+from src.token.registry import TokenizerRegistry
+from src.router.fallback import FallbackExecutor
+from src.router.embedding import EmbeddingBatcher, split_batches
+from src.load_balance.base import BaseLoadBalancer
+from src.load_balance.latency import LatencyTracker
+from src.router.base_provider import BaseLLMProvider
+from src.router.single_flight import SingleFlight
+from src.exceptions.exceptions import SHOULD_FALLBACK_EXCEPTIONS, DeadlineExceededError, NoProviderAvailableError
 from src.load_balance.lowest_tpm import LowestTPMBalancer
+from src.load_balance.health_probe import HealthProbeScheduler
+from src.load_balance.routing_table import RoutingTable
 from src.load_balance.capacity_based import CapacityBasedBalancer
+from src.load_balance.circuit_breaker import CircuitState
 from src.load_balance.rpm_tpm_manager import RpmTpmManager
 
+# The configs which are not reloaded by `update_config`.
+_STATIC_CONFIGS = (
+    "log_config",
+    "cooldown_config",
+    "hedging_config",
+    "health_check_config",
+    "outlier_detection_config",
+    "response_cache_config",
+    "embedding_batch_config",
+    "single_flight_enabled",
+    "metrics_config",
+    "tokenizer_config",
+)
+# The values of the circuit state gauge.
+_CIRCUIT_STATE_VALUES = {CircuitState.CLOSED: 0, CircuitState.OPEN: 1, CircuitState.HALF_OPEN: 2}
+# The stream ended before its first chunk.
+_NO_CHUNK = object()
+# The quantiles of the time to the first chunk and between the chunks of the streams in the metrics.
+_STREAM_QUANTILES = (0.5, 0.95, 0.99)
+# The chunks of a stream read ahead of the caller, the inter-chunk time is exact while the caller keeps up with them.
+_READ_AHEAD_CHUNKS = 16
+# The default concurrency of a batch if the capacity of the group is unknown, and its upper limit.
+DEFAULT_BATCH_CONCURRENCY = 16
+MAX_BATCH_CONCURRENCY = 1024
+# The latency assumed to estimate the concurrency of a batch until the group has latencies.
+DEFAULT_BATCH_LATENCY_SECONDS = 1
+
+
+# Call a provider with the input of a request.
+_Invoke = Callable[[BaseLLMProvider, Any], Awaitable[Any]]
+
+
+def _invoke_completion(impl: BaseLLMProvider, param: RouterParams) -> Awaitable[Any]:
+    return impl.completion(param)
+
+
+def _invoke_embedding(impl: BaseLLMProvider, param: EmbeddingParams) -> Awaitable[list[Any]]:
+    return impl.embedding(param)
+
+
+def _prompt(arg: Union[RouterParams, EmbeddingParams]) -> tuple[Optional[str], Optional[list]]:
+    # The load balancers take the prompt of a completion, an embedding has none.
+    if isinstance(arg, EmbeddingParams):
+        return None, None
+    return arg.text, arg.messages
+
+
+def _register_gauges(registry: MetricsRegistry) -> dict[str, Gauge]:
+    provider = ("group", "provider")
+    return {
+        "rpm": registry.gauge("llm_router_rpm_usage", "The requests of the provider in the current minute.", provider),
+        "tpm": registry.gauge("llm_router_tpm_usage", "The tokens of the provider in the current minute.", provider),
+        "rpm_limit": registry.gauge("llm_router_rpm_limit", "The RPM limit of the provider.", provider),
+        "tpm_limit": registry.gauge("llm_router_tpm_limit", "The TPM limit of the provider.", provider),
+        "circuit": registry.gauge(
+            "llm_router_circuit_state", "The circuit of the provider, 0 closed, 1 open and 2 half-open.", provider
+        ),
+        "unhealthy": registry.gauge(
+            "llm_router_provider_unhealthy", "1 if the provider failed its last health probe.", provider
+        ),
+        "feedback_queue": registry.gauge(
+            "llm_router_feedback_queue_size", "The provider feedback waiting for the background task.", ()
+        ),
+        "embedding_pending": registry.gauge(
+            "llm_router_embedding_pending_texts", "The texts waiting for the next embedding batch.", ("group",)
+        ),
+        "ttft": registry.gauge(
+            "llm_router_ttft_seconds",
+            "The time to the first chunk of the recent streams of the provider.",
+            (*provider, "quantile"),
+        ),
+        "inter_chunk": registry.gauge(
+            "llm_router_inter_chunk_seconds",
+            "The time between the chunks of the recent streams of the provider.",
+            (*provider, "quantile"),
+        ),
+        "coalesced": registry.counter(
+            "llm_router_coalesced_requests_total", "The requests coalesced with an identical call in flight.", ()
+        ),
+        "hedged": registry.counter("llm_router_hedged_requests_total", "The requests hedged to a second provider.", ()),
+        "cache_hits": registry.counter(
+            "llm_router_response_cache_hits_total", "The requests answered by the response cache.", ()
+        ),
+        "cache_similar_hits": registry.counter(
+            "llm_router_response_cache_similar_hits_total",
+            "The response cache hits of a near-duplicate prompt, they are included in the hits.",
+            (),
+        ),
+        "cache_misses": registry.counter(
+            "llm_router_response_cache_misses_total", "The requests not found in the response cache.", ()
+        ),
+    }
+
+
+@dataclass
+class _StreamStart:
+    retryer: RetryManager
+    provider: LLMProviderConfig
+    stream: AsyncIterator[Any]
+    first_chunk: Any
+    started_at: float
+    # The context of the stream's request, e.g. of the winning fallback group.
+    ctx: RouterContext
+
+
+async def _read_chunks(stream: AsyncIterator[Any], chunks: asyncio.Queue):
+    """
+    Put the chunks of a stream in the queue with their arrival time, then `_NO_CHUNK`, or the error of the stream.
+    The queue is bounded, so the reader waits for a slow caller instead of buffering the whole stream.
+    :param stream:
+    :param chunks: (arrival time, chunk, error)
+    :return:
+    """
+    try:
+        async for chunk in stream:
+            await chunks.put((time.monotonic(), chunk, None))
+    except Exception as e:
+        await chunks.put((time.monotonic(), _NO_CHUNK, e))
+        return
+    await chunks.put((time.monotonic(), _NO_CHUNK, None))
+
 
 class Router:
     def __init__(self, cfg: RouterConfig):
         """ """
+        self.config = cfg
         self.log_cfg = cfg.log_config
-        self.load_balancer_config = cfg.load_balancer_config
         self.retry_config = cfg.retry_config
         self.fallback_config = cfg.fallback_config
         self.cooldown_config = cfg.cooldown_config
+        self.timeout_seconds = cfg.timeout_seconds
+        self.embedding_batch_config = cfg.embedding_batch_config
 
         self.cache = MemoryCache(cfg.log_config)
         self.logger = get_logger(__name__, self.log_cfg)
+        self.latency_tracker = LatencyTracker()
+        # The time to first chunk and the time between chunks of the streams, per provider.
+        self.ttft_tracker = LatencyTracker()
+        self.inter_chunk_tracker = LatencyTracker()
         self.provider_status_manager = ProviderStatusManager(
-            cfg.log_config, cfg.llm_provider_group, cooldown_config=cfg.cooldown_config, cache=self.cache
+            cfg.log_config,
+            cfg.llm_provider_group,
+            cooldown_config=cfg.cooldown_config,
+            cache=self.cache,
+            latency_tracker=self.latency_tracker,
+            outlier_detection_config=cfg.outlier_detection_config,
         )
         self.rpm_tpm_manager = RpmTpmManager(self.cache, self.log_cfg)
-        self.load_balancer = self.routing_strategy_init(strategy=cfg.load_balancer_config.strategy)
-        self.tc = TokenCounter(cfg.log_config)
+        # The current routing state, it's replaced as a whole by `update_config`.
+        self.routing_state = self._build_routing_state(cfg)
+        self.routing_table = self._create_routing_table(cfg) if self._uses_routing_table(cfg) else None
+        self.hedging_manager = (
+            HedgingManager(self.log_cfg, cfg.hedging_config, self.latency_tracker, self.rpm_tpm_manager)
+            if cfg.hedging_config.enabled
+            else None
+        )
+        self.health_probe_scheduler = (
+            HealthProbeScheduler(self.log_cfg, cfg.health_check_config, self.provider_status_manager)
+            if cfg.health_check_config.enabled
+            else None
+        )
+        self.single_flight = SingleFlight(self.log_cfg) if cfg.single_flight_enabled else None
+        self.response_cache = (
+            ResponseCache(
+                self.log_cfg,
+                cfg.response_cache_config,
+                cfg.response_cache_config.backend or MemoryCache(self.log_cfg),
+            )
+            if cfg.response_cache_config.enabled
+            else None
+        )
+        self.fallback_executor = FallbackExecutor(self.log_cfg, self.fallback_config)
+        # The embedding batchers of the groups, created by the first request of each group if batching is enabled.
+        self.embedding_batchers: dict[str, EmbeddingBatcher] = {}
+        self._update_lock = asyncio.Lock()
+        # The loop of the sync API, its thread is started by the first sync call.
+        self.background_loop = BackgroundLoop("router-loop")
+        # The tokenizers are shared by the token counting of the router, and loaded by the warm-up or on first use.
+        self.tokenizers = TokenizerRegistry(cfg.log_config, cfg.tokenizer_config)
+        self.tc = TokenCounter(cfg.log_config, self.tokenizers)
+        self.metrics = Instrumentation(cfg.metrics_config)
+        self._gauges = _register_gauges(self.metrics.registry)
+
+    async def close(self):
+        """
+        Stop the background tasks of the router.
+        :return:
+        """
+        # The batches in flight report to the provider status manager, wait for them first.
+        for batcher in self.embedding_batchers.values():
+            await batcher.close()
+        if self.routing_table:
+            await self.routing_table.stop_refresh_task()
+        if self.health_probe_scheduler:
+            await self.health_probe_scheduler.stop_probe_task()
+        await self.provider_status_manager.stop_feedback_task()
+        await self.provider_status_manager.stop_sync_task()
 
-    def routing_strategy_init(self, strategy: LoadBalancerStrategy):
+    async def warmup(self):
+        """
+        Load the default encoding and the tokenizers of the config in a worker thread, so the first requests don't
+        pay for it. The router serves requests without a warm-up, e.g. start it in the background with
+        `asyncio.create_task(router.warmup())`, or await it before serving traffic.
+        :return:
+        """
+        await asyncio.to_thread(self.tc.warmup)
+
+    async def metrics_text(self) -> str:
+        """
+        Collect the gauges of the usage, circuits, stream latencies and queues, the counters of the coalesced, hedged
+        and cached requests, and render them with the stage histograms in the
+        Prometheus text format. The histograms are empty if the metrics are disabled.
+        :return:
+        """
+        gauges = self._gauges
+        for gauge in gauges.values():
+            gauge.clear()
+        status = self.provider_status_manager
+        # The usage is kept per minute, the minute of the collection is that of a new context.
+        token = router_context.set(RouterContext(model_group="", token_count=0))
+        try:
+            for group, providers in self.routing_state.provider_groups.items():
+                for p in providers:
+                    labels = (group, p.id)
+                    gauges["rpm"].set(labels, await self.rpm_tpm_manager.rpm_usage_at_minute(group, p.id))
+                    gauges["tpm"].set(labels, await self.rpm_tpm_manager.tpm_usage_at_minute(group, p.id))
+                    if p.rpm is not None:
+                        gauges["rpm_limit"].set(labels, p.rpm)
+                    if p.tpm is not None:
+                        gauges["tpm_limit"].set(labels, p.tpm)
+                    gauges["circuit"].set(labels, _CIRCUIT_STATE_VALUES[status.circuit_breaker.state(p.id)])
+                    gauges["unhealthy"].set(labels, int(p.id in status.unhealthy))
+                    for name, tracker in (("ttft", self.ttft_tracker), ("inter_chunk", self.inter_chunk_tracker)):
+                        for q in _STREAM_QUANTILES:
+                            value = tracker.percentile(p.id, q)
+                            if value is not None:
+                                gauges[name].set((*labels, str(q)), value)
+        finally:
+            router_context.reset(token)
+        gauges["feedback_queue"].set((), status.feedback_queue.qsize() if status.feedback_queue else 0)
+        for group, batcher in self.embedding_batchers.items():
+            gauges["embedding_pending"].set((group,), len(batcher.pending))
+        # The counters of the disabled features are not exported.
+        if self.single_flight:
+            gauges["coalesced"].set((), self.single_flight.coalesced)
+        if self.hedging_manager:
+            gauges["hedged"].set((), self.hedging_manager.hedged_requests)
+        if self.response_cache:
+            gauges["cache_hits"].set((), self.response_cache.hits)
+            gauges["cache_similar_hits"].set((), self.response_cache.similar_hits)
+            gauges["cache_misses"].set((), self.response_cache.misses)
+        return self.metrics.registry.render()
+
+    def shutdown(self):
+        """
+        Close the router and stop its background loop, the counterpart of `close` for the sync API.
+        :return:
+        """
+        if self.background_loop.is_running():
+            self.background_loop.run(self.close())
+            self.background_loop.stop()
+
+    @property
+    def load_balancer_config(self) -> LoadBalancerConfig:
+        return self.routing_state.load_balancer_config
+
+    @property
+    def group_load_balancer_config(self) -> dict[str, LoadBalancerConfig]:
+        return self.routing_state.group_load_balancer_config
+
+    @property
+    def load_balancer(self) -> BaseLoadBalancer:
+        return self.routing_state.load_balancer
+
+    @property
+    def load_balancers(self) -> dict[str, BaseLoadBalancer]:
+        return self.routing_state.load_balancers
+
+    async def update_config(self, cfg: RouterConfig):
+        """
+        Apply a new config without restarting the router, e.g. to add a provider or change its RPM limit.
+        The providers, load balancers, retry, fallback and timeout are reloaded. The routing state is compiled off
+        the request path and swapped in at once, the requests in flight complete against the state they started with.
+        The usage, cooldown and latency of the providers are keyed by the provider id, which is derived from its
+        model id, implementation and name, so they carry over to the kept providers, even if their limits are changed.
+        The other configs, e.g. the cooldown, hedging and response cache, take effect on a new router.
+        With the sync API, run it in the background loop: `router.background_loop.run(router.update_config(cfg))`.
+        :param cfg:
+        :return:
+        """
+        async with self._update_lock:
+            for name in _STATIC_CONFIGS:
+                if getattr(cfg, name) != getattr(self.config, name):
+                    self.logger.warning(f"{name} is changed, it takes effect on a new router")
+            state = self._build_routing_state(cfg, self.routing_state)
+            old_ids = {p.id for providers in self.routing_state.provider_groups.values() for p in providers}
+            new_ids = {p.id for providers in cfg.llm_provider_group.values() for p in providers}
+            self.retry_config = cfg.retry_config
+            self.fallback_config = cfg.fallback_config
+            self.fallback_executor = FallbackExecutor(self.log_cfg, cfg.fallback_config)
+            self.timeout_seconds = cfg.timeout_seconds
+            self.routing_state = state
+            self.provider_status_manager.update_provider_groups(state.provider_groups)
+            self.config = cfg
+            self.logger.info(
+                f"Router config is updated, {len(new_ids - old_ids)} providers added, "
+                f"{len(old_ids - new_ids)} removed, {len(old_ids & new_ids)} kept"
+            )
+            if self.routing_table:
+                await self.routing_table.reload(cfg.load_balancer_config, cfg.group_load_balancer_config)
+            elif self._uses_routing_table(cfg):
+                self.routing_table = self._create_routing_table(cfg)
+            if self.health_probe_scheduler:
+                await self.health_probe_scheduler.update_providers(state.provider_groups)
+            # The batch limits depend on the providers, the batchers are recreated on demand.
+            batchers, self.embedding_batchers = self.embedding_batchers, {}
+            for batcher in batchers.values():
+                await batcher.close()
+
+    def _build_routing_state(self, cfg: RouterConfig, previous: Optional[RoutingState] = None) -> RoutingState:
+        """
+        Compile the routing state of the config, the load balancers of the previous state are reused if their
+        configs are unchanged.
+        :param cfg:
+        :param previous:
+        :return:
+        """
+        if previous and previous.load_balancer_config == cfg.load_balancer_config:
+            load_balancer = previous.load_balancer
+        else:
+            load_balancer = self.routing_strategy_init(cfg.load_balancer_config.strategy, cfg.load_balancer_config)
+        # Groups without a specific load balancer config share the default load balancer.
+        load_balancers = {group: load_balancer for group in cfg.llm_provider_group}
+        for group, lb_config in cfg.group_load_balancer_config.items():
+            if previous and previous.group_load_balancer_config.get(group) == lb_config:
+                load_balancers[group] = previous.load_balancers[group]
+            else:
+                load_balancers[group] = self.routing_strategy_init(lb_config.strategy, lb_config)
+        return RoutingState(
+            provider_groups={group: list(providers) for group, providers in cfg.llm_provider_group.items()},
+            load_balancer_config=cfg.load_balancer_config,
+            group_load_balancer_config=dict(cfg.group_load_balancer_config),
+            load_balancer=load_balancer,
+            load_balancers=load_balancers,
+        )
+
+    @staticmethod
+    def _uses_routing_table(cfg: RouterConfig) -> bool:
+        return any(cfg.get_load_balancer_config(group).routing_table_enabled for group in cfg.llm_provider_group)
+
+    def _create_routing_table(self, cfg: RouterConfig) -> RoutingTable:
+        return RoutingTable(
+            self.log_cfg,
+            cfg.load_balancer_config,
+            self.provider_status_manager,
+            self.rpm_tpm_manager,
+            group_load_balancer_config=cfg.group_load_balancer_config,
+            latency_tracker=self.latency_tracker,
+        )
+
+    def _state(self) -> RoutingState:
+        """
+        The routing state of the current request, or the current state outside a request.
+        :return:
+        """
+        ctx: Optional[RouterContext] = router_context.get(None)
+        if ctx is not None and ctx.routing_state is not None:
+            return ctx.routing_state
+        return self.routing_state
+
+    def routing_strategy_init(self, strategy: LoadBalancerStrategy, load_balancer_config: LoadBalancerConfig = None):
         self.logger.info(f"Routing strategy: {strategy}")
+        kwargs = dict(
+            lb_cache=self.cache,
+            log_cfg=self.log_cfg,
+            load_balancer_config=load_balancer_config or self.load_balancer_config,
+            rpm_tpm_manager=self.rpm_tpm_manager,
+        )
+        if strategy == LoadBalancerStrategy.LATENCY_BASED_BALANCER:
+            return LatencyBasedBalancer(**kwargs, latency_tracker=self.latency_tracker)
         strategy_config = {
             LoadBalancerStrategy.LOWEST_TPM_BALANCER: LowestTPMBalancer,
             LoadBalancerStrategy.CAPACITY_BASED_BALANCER: CapacityBasedBalancer,
+            LoadBalancerStrategy.COST_BASED_BALANCER: CostBasedBalancer,
         }
         config = strategy_config.get(strategy, RandomBalancer)
-        return config(
-            lb_cache=self.cache,
-            log_cfg=self.log_cfg,
-            load_balancer_config=self.load_balancer_config,
-            rpm_tpm_manager=self.rpm_tpm_manager,
-        )
+        return config(**kwargs)
+
+    def _get_load_balancer_config(self, group: str) -> LoadBalancerConfig:
+        return self._state().get_load_balancer_config(group)
+
+    def _get_load_balancer(self, group: str):
+        return self._state().get_load_balancer(group)
 
-    def normalize_input(self, arg: RouterParams):
+    def normalize_input(self, arg: Union[RouterParams, EmbeddingParams]):
         """
-        Normalize the input to the router
+        Normalize the input to the router, the default retry, fallback and timeout are layered on a shallow copy.
         :param arg:
-        :return:
+        :return: the input itself if it has nothing to normalize.
         """
-        new_arg = deepcopy(arg)
+        overrides = {}
         if arg.retry_config is None:
-            new_arg.retry_config = self.retry_config
+            overrides["retry_config"] = self.retry_config
         if arg.fallback_config is None:
-            new_arg.fallback_config = self.fallback_config
-        self.logger.info(f"Normalized input: before {arg} after {new_arg}")
-        return new_arg
+            overrides["fallback_config"] = self.fallback_config
+        if arg.timeout_seconds is None:
+            overrides["timeout_seconds"] = self.timeout_seconds
+        if not overrides:
+            return arg
+        # Log the overrides only, the prompt may be megabytes.
+        self.logger.debug(f"Normalized input of {arg.model_group}: default {', '.join(overrides)}")
+        return arg.override(**overrides)
+
+    def completion(self, arg: RouterParams) -> Any:
+        """
+        The sync `async_completion`, it's thread-safe. The requests of all threads run in the background loop of the
+        router, so they share its state, e.g. the cooldown, RPM/TPM usage and the connections of the providers.
+        A router is used either by its sync API or from a single event loop, since its locks are bound to the loop
+        which uses them first.
+        :param arg:
+        :return:
+        """
+        return self.background_loop.run(self.async_completion(arg))
 
     async def async_completion(
         self,
         arg: RouterParams,
     ):
-        # create context for each request
-        router_context.set(
-            RouterContext(
-                model_group=arg.model_group,
-                token_count=self.tc.token_counter(messages=arg.messages, text=arg.text),
+        use_cache = self.response_cache is not None and arg.use_cache
+        key = arg.request_key() if use_cache else None
+        signature = None
+        if use_cache:
+            signature = self.response_cache.signature(arg.model_group, arg.text, arg.messages)
+            # A hit skips the token counting, scheduling and RPM/TPM accounting.
+            hit, result = await self.response_cache.get(key, arg.model_group, signature)
+            if hit:
+                self.logger.debug(f"Response cache hit for {key}")
+                return result
+        if self.single_flight:
+            return await self.single_flight.do(
+                arg.coalescing_key(),
+                lambda: self._async_completion(arg, key, signature),
+                arg.timeout_seconds or self.timeout_seconds,
             )
+        return await self._async_completion(arg, key, signature)
+
+    async def _async_completion(
+        self, arg: RouterParams, cache_key: Optional[str] = None, signature: Optional[int] = None
+    ):
+        if self.health_probe_scheduler:
+            await self.health_probe_scheduler.start_probe_task()
+        new_arg = self.normalize_input(arg)
+        with self.metrics.stage("request", arg.model_group):
+            # create context for each request
+            router_context.set(self._create_context(new_arg))
+            try:
+                result = await self._complete(new_arg)
+                # handle result
+                self.logger.info(f"Completion result: {result}")
+                if cache_key is not None:
+                    await self.response_cache.set(cache_key, result, arg.model_group, signature)
+                return result
+            except SHOULD_FALLBACK_EXCEPTIONS as e:
+                # try to fallback
+                self.logger.warning(f"Should fallback: {e}")
+                completion = self._complete_and_cache if cache_key is not None else None
+                return await self._trigger_fallback(new_arg, e, completion)
+            except Exception as e:
+                self.logger.error(f"Error in completion: {e}")
+                raise e
+
+    async def _complete(self, arg: RouterParams) -> Any:
+        """
+        Complete the request in its model group with retry, in the router context of the request.
+        :param arg:
+        :return:
+        """
+        return await self._execute(arg, _invoke_completion)
+
+    async def _complete_and_cache(self, arg: RouterParams) -> Any:
+        """
+        Complete a fallback request, and cache its result under the key of the fallback group only, so the degraded
+        result is not served to the requests of the original group once it recovers.
+        :param arg: the input of the fallback group.
+        :return:
+        """
+        result = await self._complete(arg)
+        signature = self.response_cache.signature(arg.model_group, arg.text, arg.messages)
+        await self.response_cache.set(arg.request_key(), result, arg.model_group, signature)
+        return result
+
+    async def _embed(self, arg: EmbeddingParams) -> list[Any]:
+        """
+        Embed a batch in its model group with retry, in the router context of the batch.
+        :param arg:
+        :return:
+        """
+        return await self._execute(arg, _invoke_embedding)
+
+    async def _execute(self, arg: Union[RouterParams, EmbeddingParams], invoke: _Invoke) -> Any:
+        async def run(param):
+            provider = await self._select_provider(param)
+            await retryer.occupy()
+            return await self._call_provider(param, provider, invoke)
+
+        retryer = RetryManager(
+            run,
+            log_cfg=self.log_cfg,
+            max_attempt=arg.retry_config.max_attempt,
+            retry_policy=arg.retry_config.retry_policy,
+            rpm_tpm_manager=self.rpm_tpm_manager,
+            metrics=self.metrics,
+            expected_latency=lambda: self._expected_latency(arg.model_group),
         )
+        return await retryer.execute(cast(UserParams, arg))
+
+    async def async_embedding(self, arg: EmbeddingParams) -> list[Any]:
+        """
+        Embed the texts with the retry, fallback and deadline of `async_completion`.
+        The texts are split into batches which fit the providers of the group, each batch is a provider call which
+        takes 1 request and the tokens of its texts of the RPM/TPM. If the embedding batching is enabled, the texts
+        are merged with the texts of the concurrent requests of the group, the merged batches use the retry and
+        fallback of the router, and the request waits for its embeddings until its own deadline.
+        :param arg:
+        :return: one embedding per text, in order.
+        """
+        if self.health_probe_scheduler:
+            await self.health_probe_scheduler.start_probe_task()
+        model = self._token_model(arg.model_group)
+        token_counts = [self.tc.token_counter(model=model, text=text) for text in arg.texts]
+        if self.embedding_batch_config.enabled:
+            futures = self._get_embedding_batcher(arg.model_group).submit(arg.texts, token_counts)
+            timeout = asyncio.timeout(arg.timeout_seconds or self.timeout_seconds)
+            try:
+                async with timeout:
+                    return list(await asyncio.gather(*futures))
+            except Exception as e:
+                if timeout.expired():
+                    raise DeadlineExceededError(
+                        f"Deadline exceeded waiting for the embeddings of {arg.model_group}"
+                    ) from e
+                raise
         new_arg = self.normalize_input(arg)
+        max_size, max_tokens = self._embedding_limits(arg.model_group)
+        batches = split_batches(token_counts, max_size, max_tokens)
+        # Each batch runs in its own task, so it has its own router context.
+        results = await asyncio.gather(
+            *(
+                self._embed_batch(new_arg.override(texts=arg.texts[start:end]), sum(token_counts[start:end]))
+                for start, end in batches
+            )
+        )
+        return [embedding for result in results for embedding in result]
+
+    async def _embed_batch(self, arg: EmbeddingParams, token_count: int) -> list[Any]:
+        router_context.set(self._create_context(arg, token_count))
         try:
+            embeddings = await self._embed(arg)
+        except SHOULD_FALLBACK_EXCEPTIONS as e:
+            self.logger.warning(f"Should fallback: {e}")
+            embeddings = await self._trigger_fallback(arg, e, self._embed)
+        if len(embeddings) != len(arg.texts):
+            raise ValueError(f"Expected {len(arg.texts)} embeddings, got {len(embeddings)}")
+        return embeddings
 
-            async def run(*args, **kwargs):
-                healthy_providers = await self.provider_status_manager.get_available_providers(new_arg.model_group)
-                provider = await self.load_balancer.schedule_provider(
-                    new_arg.model_group, healthy_providers, new_arg.text, new_arg.messages
-                )
-                if not provider:
-                    raise NoProviderAvailableError("No provider available")
-                ctx: RouterContext = router_context.get()
-                # update current model group and provider_id, used in retry manager to update usage.
-                ctx.update_model_group(arg.model_group)
-                ctx.update_provider_id(provider.id)
-                ctx.update_start_time()
-                return await provider.impl.completion(*args, **kwargs)
-
-            retryer = RetryManager(
-                run,
-                log_cfg=self.log_cfg,
-                max_attempt=new_arg.retry_config.max_attempt,
-                retry_policy=new_arg.retry_config.retry_policy,
-                rpm_tpm_manager=self.rpm_tpm_manager,
+    def _get_embedding_batcher(self, group: str) -> EmbeddingBatcher:
+        batcher = self.embedding_batchers.get(group)
+        if batcher is None:
+            max_size, max_tokens = self._embedding_limits(group)
+
+            async def send(texts: list[str], token_count: int) -> list[Any]:
+                return await self._embed_batch(self.normalize_input(EmbeddingParams(group, texts)), token_count)
+
+            batcher = EmbeddingBatcher(
+                self.log_cfg, self.embedding_batch_config.linger_seconds, max_size, max_tokens, send
             )
-            result = await retryer.execute(cast(UserParams, new_arg))
-            # handle result
-            self.logger.info(f"Completion result: {result}")
-            return result
+            self.embedding_batchers[group] = batcher
+        return batcher
+
+    def _embedding_limits(self, group: str) -> tuple[int, Optional[int]]:
+        """
+        The batch limits of the group, a batch fits every provider of the group, so it can be retried on any of them.
+        :param group:
+        :return: the maximum number of texts and tokens of a batch.
+        """
+        providers = self._state().providers(group)
+        sizes = [p.max_batch_size for p in providers if p.max_batch_size is not None]
+        tokens = [p.max_batch_tokens for p in providers if p.max_batch_tokens is not None]
+        if self.embedding_batch_config.max_batch_tokens is not None:
+            tokens.append(self.embedding_batch_config.max_batch_tokens)
+        return min(sizes + [self.embedding_batch_config.max_batch_size]), min(tokens, default=None)
+
+    async def astream_completion(self, arg: RouterParams) -> AsyncIterator[Any]:
+        """
+        Stream the completion chunks. If the provider fails before its first chunk, the request is retried or falls
+        back to another group like `async_completion`, after the first chunk, the error is raised to the caller.
+        The RPM/TPM occupancy is held while streaming, it's converted to usage when the stream is exhausted,
+        or released if the stream fails or is closed early.
+        After the first chunk, the provider stream is read up to `_READ_AHEAD_CHUNKS` ahead of the caller, so the time
+        between the chunks is measured as they arrive, without the time the caller takes between its reads.
+        :param arg:
+        :return:
+        """
+        if self.health_probe_scheduler:
+            await self.health_probe_scheduler.start_probe_task()
+        new_arg = self.normalize_input(arg)
+        router_context.set(self._create_context(new_arg))
+        start = await self._open_stream(new_arg)
+        # The caller may use the router between the chunks, keep the context of this request for the accounting.
+        ctx = start.ctx
+        provider = start.provider
+        completed = False
+        reader = None
+        try:
+            if start.first_chunk is not _NO_CHUNK:
+                last = time.monotonic()
+                self.ttft_tracker.record(provider.id, last - start.started_at)
+                chunks: asyncio.Queue = asyncio.Queue(maxsize=_READ_AHEAD_CHUNKS)
+                reader = asyncio.create_task(_read_chunks(start.stream, chunks))
+                yield start.first_chunk
+                while True:
+                    arrived, chunk, error = await chunks.get()
+                    if error is not None:
+                        raise error
+                    if chunk is _NO_CHUNK:
+                        break
+                    self.inter_chunk_tracker.record(provider.id, arrived - last)
+                    last = arrived
+                    yield chunk
+            completed = True
+        except Exception as e:
+            self.provider_status_manager.report(provider.id, e, None)
+            raise
+        finally:
+            if reader is not None:
+                reader.cancel()
+                await asyncio.wait([reader])
+            await start.stream.aclose()
+            if completed:
+                self.provider_status_manager.report(provider.id, None, None)
+                await start.retryer.commit_usage(ctx)
+            else:
+                await start.retryer.release_resources(ctx)
+
+    async def abatch_completion(
+        self,
+        params: Union[Iterable[RouterParams], AsyncIterable[RouterParams]],
+        concurrency: Optional[int] = None,
+        ordered: bool = False,
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Run `async_completion` for each input with bounded concurrency, the inputs are pulled lazily, so a batch of
+        any size runs in flat memory. The exception of an item is captured in its result, it doesn't stop the batch.
+        :param params: an iterator or async iterator of inputs.
+        :param concurrency: the maximum number of requests in flight, default is estimated from the RPM of the
+            group of the first input and its median latency.
+        :param ordered: yield the results in input order, otherwise as they complete.
+        :return:
+        """
+        if concurrency is None:
+            items = aiter_params(params)
+            first = await anext(items, None)
+            if first is None:
+                return
+            concurrency = self._batch_concurrency(first.model_group)
+            params = prepend(first, items)
+        self.logger.info(f"Batch completion with concurrency {concurrency}, ordered {ordered}")
+        async for result in run_batch(self.async_completion, params, concurrency, ordered):
+            yield result
+
+    def _batch_concurrency(self, group: str) -> int:
+        """
+        Estimate the concurrency to use the capacity of the group, by Little's law:
+        concurrency = requests per second * latency.
+        :param group:
+        :return:
+        """
+        providers = self._state().providers(group)
+        if not providers or any(p.rpm is None for p in providers):
+            return DEFAULT_BATCH_CONCURRENCY
+        latency = self.latency_tracker.group_percentile([p.id for p in providers], 0.5)
+        if latency is None:
+            latency = DEFAULT_BATCH_LATENCY_SECONDS
+        concurrency = math.ceil(sum(p.rpm for p in providers) / 60 * latency)
+        return min(max(concurrency, 1), MAX_BATCH_CONCURRENCY)
+
+    async def _open_stream(self, arg: RouterParams) -> _StreamStart:
+        """
+        Open a stream and wait for its first chunk, with retry and fallback.
+        :param arg:
+        :return:
+        """
+
+        async def run(param: RouterParams) -> _StreamStart:
+            provider = await self._select_provider(param)
+            await retryer.occupy()
+            started_at = time.monotonic()
+            remaining = router_context.get().remaining_seconds()
+            stream = provider.impl.stream_completion(self._with_timeout(param, remaining))
+            timeout = asyncio.timeout(remaining)
+            try:
+                # The deadline bounds the wait for the first chunk, the rest of the stream is paced by the caller.
+                async with timeout:
+                    first_chunk = await anext(stream, _NO_CHUNK)
+            except Exception as e:
+                await stream.aclose()
+                if timeout.expired():
+                    raise DeadlineExceededError(
+                        f"Deadline exceeded waiting for the first chunk of {provider.id}"
+                    ) from e
+                self.provider_status_manager.report(provider.id, e, None)
+                raise
+            return _StreamStart(retryer, provider, stream, first_chunk, started_at, router_context.get())
+
+        retryer = RetryManager(
+            run,
+            log_cfg=self.log_cfg,
+            max_attempt=arg.retry_config.max_attempt,
+            retry_policy=arg.retry_config.retry_policy,
+            rpm_tpm_manager=self.rpm_tpm_manager,
+            metrics=self.metrics,
+            defer_usage=True,
+            expected_latency=lambda: self._expected_latency(arg.model_group),
+        )
+        try:
+            return await retryer.execute(arg)
         except SHOULD_FALLBACK_EXCEPTIONS as e:
-            # try to fallback
             self.logger.warning(f"Should fallback: {e}")
-            return await self._trigger_fallback(new_arg, e)
-        except Exception as e:
-            self.logger.error(f"Error in completion: {e}")
-            raise e
+            return await self._trigger_fallback(arg, e, self._open_stream)
+
+    async def _select_provider(self, arg: Union[RouterParams, EmbeddingParams]) -> LLMProviderConfig:
+        ctx: RouterContext = router_context.get()
+        remaining = ctx.remaining_seconds()
+        # Don't take the capacity of a provider for an answer nobody waits for.
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError(f"Deadline exceeded before scheduling a provider of {arg.model_group}")
+        provider = await self._schedule_provider(arg, ctx)
+        if not provider:
+            raise NoProviderAvailableError("No provider available")
+        self.provider_status_manager.on_provider_selected(provider.id)
+        # update current model group and provider_id, used in retry manager to update usage.
+        ctx.update_model_group(arg.model_group)
+        ctx.update_provider_id(provider.id)
+        ctx.update_start_time()
+        return provider
 
-    async def _trigger_fallback(self, arg: RouterParams, e: SHOULD_FALLBACK_EXCEPTIONS):
+    async def _schedule_provider(self, arg: Union[RouterParams, EmbeddingParams], ctx: RouterContext):
+        if self.routing_table and self._get_load_balancer_config(arg.model_group).routing_table_enabled:
+            with self.metrics.stage("schedule_provider", arg.model_group):
+                return await self.routing_table.schedule_provider(arg.model_group, ctx.token_count)
+        state = self._state()
+        with self.metrics.stage("get_available_providers", arg.model_group):
+            healthy_providers = await self.provider_status_manager.get_available_providers(
+                arg.model_group, state.providers(arg.model_group)
+            )
+        load_balancer = state.get_load_balancer(arg.model_group)
+        with self.metrics.stage("schedule_provider", arg.model_group):
+            return await load_balancer.schedule_provider(arg.model_group, healthy_providers, *_prompt(arg))
+
+    async def _call_provider(
+        self,
+        arg: Union[RouterParams, EmbeddingParams],
+        provider: LLMProviderConfig,
+        invoke: Optional[_Invoke] = None,
+    ):
+        """
+        Invoke the provider, hedge the call with another provider if hedging is enabled.
+        The outcome and latency of each call are reported to the provider status manager,
+        which updates the cooldown and the latency of the provider in the background.
+        The time left before the deadline is passed to the provider as `timeout_seconds`, and the call is cancelled
+        when the deadline is reached, which is not counted against the provider.
+        :param arg:
+        :param provider:
+        :param invoke: call the provider with the input, default is its completion.
+        :return:
+        """
+        ctx: RouterContext = router_context.get()
+        invoke = invoke or _invoke_completion
+
+        async def call(p: LLMProviderConfig):
+            start = time.monotonic()
+            remaining = ctx.remaining_seconds()
+            timeout = asyncio.timeout(remaining)
+            try:
+                with self.metrics.stage("provider_call", arg.model_group, p.id):
+                    async with timeout:
+                        result = await invoke(p.impl, self._with_timeout(arg, remaining))
+            except Exception as e:
+                if timeout.expired():
+                    raise DeadlineExceededError(f"Deadline exceeded calling {p.id}") from e
+                self.provider_status_manager.report(p.id, e, time.monotonic() - start)
+                raise
+            self.provider_status_manager.report(p.id, None, time.monotonic() - start)
+            return result
+
+        if not self.hedging_manager:
+            return await call(provider)
+        return await self.hedging_manager.execute(
+            arg.model_group,
+            self._state().providers(arg.model_group),
+            provider,
+            call,
+            lambda primary: self._schedule_secondary_provider(arg, primary),
+        )
+
+    def _create_context(
+        self, arg: Union[RouterParams, EmbeddingParams], token_count: Optional[int] = None
+    ) -> RouterContext:
+        if token_count is None:
+            with self.metrics.stage("token_counter", arg.model_group):
+                token_count = self.tc.token_counter(
+                    model=self._token_model(arg.model_group), messages=arg.messages, text=arg.text
+                )
+        return RouterContext(
+            model_group=arg.model_group,
+            token_count=token_count,
+            deadline=time.monotonic() + arg.timeout_seconds,
+            routing_state=self.routing_state,
+        )
+
+    def _token_model(self, group: str) -> str:
+        """
+        The model id whose tokenizer counts the tokens of the group, that of its first provider if a tokenizer of the
+        config matches it, otherwise empty for the default encoding.
+        :param group:
+        :return:
+        """
+        providers = self._state().providers(group)
+        model = providers[0].model_id if providers else ""
+        return model if self.tokenizers.match(model) else ""
+
+    @staticmethod
+    def _with_timeout(arg: Union[RouterParams, EmbeddingParams], remaining: Optional[float]):
+        return arg if remaining is None else arg.override(timeout_seconds=max(remaining, 0.001))
+
+    def _expected_latency(self, group: str) -> Optional[float]:
+        providers = self._state().providers(group)
+        return self.latency_tracker.group_percentile([p.id for p in providers], 0.5)
+
+    async def _schedule_secondary_provider(self, arg: Union[RouterParams, EmbeddingParams], primary: LLMProviderConfig):
+        state = self._state()
+        providers = await self.provider_status_manager.get_available_providers(
+            arg.model_group, state.providers(arg.model_group)
+        )
+        healthy_providers = [p for p in providers if p.id != primary.id]
+        provider = await state.get_load_balancer(arg.model_group).schedule_provider(
+            arg.model_group, healthy_providers, *_prompt(arg)
+        )
+        if provider:
+            self.provider_status_manager.on_provider_selected(provider.id)
+        return provider
+
+    async def _trigger_fallback(
+        self, arg: Union[RouterParams, EmbeddingParams], e: SHOULD_FALLBACK_EXCEPTIONS, completion=None
+    ):
         """
         Fallback allows the user to specify a list of models to try if the primary model fails.
         We don't apply retry on fallback models, since we may have already retried the primary model.
+        The fallback groups reuse the token count and deadline of the request, each group runs in its own task and
+        router context, so the losers of a race are cancelled and their occupancy is released.
         :param arg:
+        :param completion: the function to call with the fallback input in its context, default is `_complete`,
+            e.g. `_open_stream` or `_embed`.
         :return:
         """
-        if (
-            not arg.fallback_config.allow_fallback
-            or not self.fallback_config.degraded_map
-            or arg.model_group not in self.fallback_config.degraded_map
-        ):
+        completion = completion or self._complete
+        chain = self.fallback_config.chains.get(arg.model_group)
+        if not arg.fallback_config.allow_fallback or not chain:
             self.logger.info("No fallback model specified")
             raise e
-        new_arg = deepcopy(arg)
-        for i, fallback_group in enumerate(self.fallback_config.degraded_map[arg.model_group]):
-            try:
-                self.logger.info(f"Trying fallback model: {fallback_group}")
-                new_arg.model_group = fallback_group
-                new_arg.retry_config = RetryConfig(max_attempt=1)
-                new_arg.fallback_config = FallbackConfig(allow_fallback=False)
-                return await self.async_completion(new_arg)
-            except Exception as e:
-                if i == len(self.fallback_config.degraded_map[arg.model_group]) - 1:
-                    raise e
-                continue
+        ctx: RouterContext = router_context.get()
+        retry_config = RetryConfig(max_attempt=1)
+        fallback_config = FallbackConfig(allow_fallback=False)
+
+        async def call(fallback_group: str):
+            remaining = ctx.remaining_seconds()
+            if remaining is not None and remaining <= (self._expected_latency(fallback_group) or 0):
+                self.logger.warning(f"Skip fallback model {fallback_group}, {remaining:.3f}s left before the deadline")
+                raise DeadlineExceededError(f"Deadline exceeded before fallback to {fallback_group}") from e
+            self.logger.info(f"Trying fallback model: {fallback_group}")
+            router_context.set(ctx.fork(fallback_group))
+            new_arg = arg.override(
+                model_group=fallback_group,
+                retry_config=retry_config,
+                fallback_config=fallback_config,
+                timeout_seconds=remaining if remaining is not None else arg.timeout_seconds,
+            )
+            return await completion(new_arg)
+
+        discard = self._discard_stream if completion == self._open_stream else None
+        return await self.fallback_executor.execute(chain, call, discard)
+
+    async def _discard_stream(self, start: _StreamStart):
+        await start.stream.aclose()
+        await start.retryer.release_resources(start.ctx)
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Any, Callable, Optional, Awaitable
+
+from src.config import LogConfiguration
+from src.router.log import get_logger
+from src.exceptions.exceptions import DeadlineExceededError
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, log_cfg: LogConfiguration):
+        """
+        Coalesce the concurrent calls with the same key into one call, the callers share its result or exception.
+        The call runs in its own task, so a cancelled caller does not fail the others. Each caller waits at most its
+        own timeout, a follower isn't held by the deadline of the caller which started the call. The call is cancelled
+        only when all its callers are cancelled or timed out.
+        The result object is shared by all the callers, they must not mutate it.
+        :param log_cfg:
+        """
+        self.logger = get_logger(__name__, log_cfg)
+        self.calls: dict[str, _Call] = {}
+        # The number of callers which waited on the call of another caller.
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """
+        :param key:
+        :param fn: start the call, if no call with the key is in flight.
+        :param timeout: the seconds this caller waits for the result, None to wait until the call is done.
+        :return:
+        """
+        call = self.calls.get(key)
+        if call is None:
+            call = self.calls[key] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self.coalesced += 1
+            self.logger.debug(f"Request {key} is coalesced with an in-flight call")
+        call.waiters += 1
+        deadline = asyncio.timeout(timeout)
+        try:
+            async with deadline:
+                return await asyncio.shield(call.task)
+        except TimeoutError as e:
+            if not deadline.expired():
+                raise
+            self._abandon(key, call)
+            raise DeadlineExceededError(f"Deadline exceeded waiting for the in-flight call of {key}") from e
+        except asyncio.CancelledError:
+            self._abandon(key, call)
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _abandon(self, key: str, call: _Call):
+        if call.task.done() or call.waiters > 1:
+            return
+        # The last caller is gone, nobody waits for the result.
+        call.task.cancel()
+        self._forget(key, call)
+
+    def _forget(self, key: str, call: _Call):
+        if self.calls.get(key) is call:
+            del self.calls[key]
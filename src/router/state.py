@@ -0,0 +1,32 @@
+from dataclasses import dataclass
+
+from src.config import LoadBalancerConfig
+from src.config.config import LLMProviderConfig
+from src.load_balance.base import BaseLoadBalancer
+
+
+@dataclass(frozen=True)
+class RoutingState:
+    """
+    The per-group indexes compiled from a router config: the providers and the load balancer of each group.
+    The router swaps in a new state on a config update, a request keeps the state of the config it started with,
+    so it's retried and hedged within the same providers.
+    The usage, cooldown and latency of a provider are kept by the router, keyed by the provider id, so they carry over
+    to the next state for the unchanged providers.
+    """
+
+    provider_groups: dict[str, list[LLMProviderConfig]]
+    load_balancer_config: LoadBalancerConfig
+    group_load_balancer_config: dict[str, LoadBalancerConfig]
+    # The load balancer shared by the groups without a specific load balancer config.
+    load_balancer: BaseLoadBalancer
+    load_balancers: dict[str, BaseLoadBalancer]
+
+    def providers(self, group: str) -> list[LLMProviderConfig]:
+        return self.provider_groups.get(group) or []
+
+    def get_load_balancer_config(self, group: str) -> LoadBalancerConfig:
+        return self.group_load_balancer_config.get(group, self.load_balancer_config)
+
+    def get_load_balancer(self, group: str) -> BaseLoadBalancer:
+        return self.load_balancers.get(group, self.load_balancer)
@@ -0,0 +1,3 @@
+from src.server.app import GatewayApp
+
+__all__ = ["GatewayApp"]
@@ -0,0 +1,40 @@
+"""
+Run the gateway with uvicorn, the router is created by a factory, since the providers are defined in code:
+
+    uv run python -m src.server my_service.gateway:create_router --port 8000
+"""
+
+import argparse
+import importlib
+from typing import Callable
+
+from src.config import GatewayConfig
+from src.server.app import GatewayApp
+from src.router.router import Router
+
+
+def load_factory(path: str) -> Callable[[], Router]:
+    module, _, name = path.partition(":")
+    if not module or not name:
+        raise ValueError(f"Invalid factory {path!r}, expected 'module:function'")
+    return getattr(importlib.import_module(module), name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("factory", help="'module:function' which returns the Router")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-in-flight", type=int, default=GatewayConfig.max_in_flight)
+    parser.add_argument("--keep-alive", type=int, default=30, help="the idle timeout of a connection in seconds")
+    args = parser.parse_args()
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise SystemExit("The gateway requires uvicorn: pip install 'llm-router[server]'") from e
+    app = GatewayApp(load_factory(args.factory)(), GatewayConfig(max_in_flight=args.max_in_flight))
+    uvicorn.run(app, host=args.host, port=args.port, timeout_keep_alive=args.keep_alive, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
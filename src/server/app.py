@@ -0,0 +1,306 @@
+import time
+import asyncio
+from typing import Any, Callable, Optional, Awaitable
+
+from src.config import GatewayConfig
+from src.server import codec
+from src.router.log import get_logger
+from src.model.input import RouterParams, EmbeddingParams
+from src.router.router import Router
+from src.exceptions.exceptions import (
+    APIStatusError,
+    RateLimitError,
+    RetryExhaustedError,
+    DeadlineExceededError,
+    NoProviderAvailableError,
+)
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+
+_SSE_HEADERS = [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]
+_SSE_DONE = b"data: [DONE]\n\n"
+# The stream ended.
+_END = object()
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str, error_type: str = "invalid_request_error"):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.error_type = error_type
+
+
+class GatewayApp:
+    def __init__(self, router: Router, config: Optional[GatewayConfig] = None):
+        """
+        An OpenAI compatible ASGI app on top of the router, it serves `POST /v1/chat/completions`, with SSE
+        streaming if `stream` is true, `POST /v1/embeddings`, and `GET /metrics` in the Prometheus text format.
+        The `model` of a request is the model group, the optional `timeout` is its deadline in seconds, the other
+        OpenAI parameters are ignored.
+        The JSON responses have a content length, so the server keeps the connections alive between requests.
+        The router is warmed up in the background by the lifespan startup of the server, and closed by its shutdown.
+        :param router:
+        :param config:
+        """
+        self.router = router
+        self.config = config or GatewayConfig()
+        self.logger = get_logger(__name__, router.log_cfg)
+        self.in_flight = 0
+        self.shed = 0
+        self.warmup_task: Optional[asyncio.Task] = None
+        self.routes = {
+            ("POST", "/v1/chat/completions"): self._chat_completions,
+            ("POST", "/v1/embeddings"): self._embeddings,
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if scope["method"] == "GET" and scope["path"] == "/metrics":
+            # The scrapes are served even if the gateway is overloaded.
+            await self._metrics(send)
+            return
+        handler = self.routes.get((scope["method"], scope["path"]))
+        if handler is None:
+            await _send_error(send, 404, f"Unknown path: {scope['method']} {scope['path']}", "not_found_error")
+            return
+        # The event loop is single-threaded, the counter needs no lock.
+        if self.in_flight >= self.config.max_in_flight:
+            self.shed += 1
+            retry_after = [(b"retry-after", str(self.config.retry_after_seconds).encode())]
+            await _send_error(send, 503, "The gateway is overloaded", "overloaded_error", retry_after)
+            return
+        self.in_flight += 1
+        started = False
+
+        async def tracked_send(message: dict[str, Any]):
+            nonlocal started
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await handler(await self._read_body(receive), tracked_send)
+        except _HTTPError as e:
+            await _send_error(send, e.status, e.message, e.error_type)
+        except Exception as e:
+            if started:
+                self.logger.warning(f"Error after the response of {scope['path']} started: {e}")
+                return
+            status, error_type = _status_of(e)
+            self.logger.warning(f"Error in {scope['path']}: {status} {e!r}")
+            await _send_error(send, status, str(e), error_type)
+        finally:
+            self.in_flight -= 1
+
+    async def _lifespan(self, receive: Receive, send: Send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if codec.NAME == "orjson":
+                    self.logger.info("Gateway encodes JSON with orjson")
+                else:
+                    self.logger.warning("orjson is not installed, the gateway encodes JSON with the slower stdlib json")
+                # The server accepts requests without waiting for the warm-up.
+                self.warmup_task = asyncio.create_task(self.router.warmup())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.warmup_task:
+                    try:
+                        await self.warmup_task
+                    except Exception as e:
+                        self.logger.warning(f"Warm-up of the router failed: {e}")
+                await self.router.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _metrics(self, send: Send):
+        text = await self.router.metrics_text()
+        text += (
+            "# HELP llm_router_gateway_in_flight The requests in flight of the gateway.\n"
+            "# TYPE llm_router_gateway_in_flight gauge\n"
+            f"llm_router_gateway_in_flight {self.in_flight}\n"
+            "# HELP llm_router_gateway_shed_total The requests rejected because the gateway was overloaded.\n"
+            "# TYPE llm_router_gateway_shed_total counter\n"
+            f"llm_router_gateway_shed_total {self.shed}\n"
+        )
+        data = text.encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                    (b"content-length", str(len(data)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": data})
+
+    async def _read_body(self, receive: Receive) -> dict[str, Any]:
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise _HTTPError(499, "Client disconnected")
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.config.max_body_bytes:
+                raise _HTTPError(413, f"Request body exceeds {self.config.max_body_bytes} bytes")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        try:
+            body = codec.loads(b"".join(chunks))
+        except ValueError as e:
+            raise _HTTPError(400, f"Invalid JSON body: {e}") from e
+        if not isinstance(body, dict):
+            raise _HTTPError(400, "The JSON body must be an object")
+        return body
+
+    def _model_group(self, body: dict[str, Any]) -> str:
+        group = body.get("model")
+        if not isinstance(group, str):
+            raise _HTTPError(400, "'model' must be a model group")
+        if group not in self.router.routing_state.provider_groups:
+            raise _HTTPError(404, f"Model group not found: {group}", "not_found_error")
+        return group
+
+    @staticmethod
+    def _timeout(body: dict[str, Any]) -> Optional[float]:
+        timeout = body.get("timeout")
+        if timeout is None:
+            return None
+        # A bool is an int, but not a timeout.
+        if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+            raise _HTTPError(400, "'timeout' must be a positive number of seconds")
+        return timeout
+
+    async def _chat_completions(self, body: dict[str, Any], send: Send):
+        group = self._model_group(body)
+        params = RouterParams(
+            model_group=group,
+            text=body.get("prompt"),
+            messages=body.get("messages"),
+            timeout_seconds=self._timeout(body),
+        )
+        if body.get("stream"):
+            await self._stream(group, params, send)
+            return
+        result = await self.router.async_completion(params)
+        await _send_json(send, 200, _completion_body(group, result))
+
+    async def _stream(self, group: str, params: RouterParams, send: Send):
+        """
+        Stream the chunks as server-sent events. The response starts with the first chunk, so a request which fails
+        before it gets an error status, an error after it is sent as the last event.
+        :param group:
+        :param params:
+        :param send:
+        :return:
+        """
+        stream = self.router.astream_completion(params)
+        try:
+            chunk = await anext(stream, _END)
+            await send({"type": "http.response.start", "status": 200, "headers": _SSE_HEADERS})
+            try:
+                while chunk is not _END:
+                    event = b"data: " + codec.dumps(_chunk_body(group, chunk)) + b"\n\n"
+                    await send({"type": "http.response.body", "body": event, "more_body": True})
+                    chunk = await anext(stream, _END)
+                tail = _SSE_DONE
+            except Exception as e:
+                self.logger.warning(f"Stream of {group} failed: {e}")
+                _, error_type = _status_of(e)
+                tail = b"data: " + codec.dumps(_error_body(str(e), error_type)) + b"\n\n"
+            await send({"type": "http.response.body", "body": tail, "more_body": False})
+        finally:
+            await stream.aclose()
+
+    async def _embeddings(self, body: dict[str, Any], send: Send):
+        group = self._model_group(body)
+        texts = body.get("input")
+        if isinstance(texts, str):
+            texts = [texts]
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            raise _HTTPError(400, "'input' must be a string or a list of strings")
+        embeddings = await self.router.async_embedding(
+            EmbeddingParams(model_group=group, texts=texts, timeout_seconds=self._timeout(body))
+        )
+        data = [{"object": "embedding", "index": i, "embedding": e} for i, e in enumerate(embeddings)]
+        await _send_json(send, 200, {"object": "list", "model": group, "data": data})
+
+
+def _status_of(e: Exception) -> tuple[int, str]:
+    """
+    The HTTP status and OpenAI error type of a router error.
+    :param e:
+    :return:
+    """
+    if isinstance(e, RetryExhaustedError) and e.last_exception is not None:
+        return _status_of(e.last_exception)
+    if isinstance(e, DeadlineExceededError):
+        return 504, "timeout_error"
+    if isinstance(e, NoProviderAvailableError):
+        return 503, "overloaded_error"
+    if isinstance(e, RateLimitError):
+        return 429, "rate_limit_error"
+    if isinstance(e, APIStatusError):
+        # The errors of the providers are bad gateway errors of the gateway.
+        return (e.status_code, "invalid_request_error") if e.status_code < 500 else (502, "api_error")
+    return 500, "api_error"
+
+
+def _completion_body(group: str, result: Any) -> Any:
+    # The providers returning OpenAI responses are passed through, a text is wrapped in a completion.
+    if isinstance(result, dict) or hasattr(result, "model_dump"):
+        return result
+    return {
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": group,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": result}, "finish_reason": "stop"}],
+    }
+
+
+def _chunk_body(group: str, chunk: Any) -> Any:
+    if isinstance(chunk, dict) or hasattr(chunk, "model_dump"):
+        return chunk
+    return {
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": group,
+        "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}],
+    }
+
+
+def _error_body(message: str, error_type: str) -> dict[str, Any]:
+    return {"error": {"message": message, "type": error_type}}
+
+
+async def _send_json(send: Send, status: int, body: Any, headers: Optional[list[tuple[bytes, bytes]]] = None):
+    data = codec.dumps(body)
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(data)).encode()),
+                *(headers or []),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": data})
+
+
+async def _send_error(
+    send: Send, status: int, message: str, error_type: str, headers: Optional[list[tuple[bytes, bytes]]] = None
+):
+    await _send_json(send, status, _error_body(message, error_type), headers)
@@ -0,0 +1,35 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The JSON library in use, orjson is installed by the `server` extra.
+NAME = "json" if orjson is None else "orjson"
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize to compact JSON, with orjson if it's installed, it's several times faster on large payloads,
+    e.g. the embeddings of a batch.
+    :param obj:
+    :return:
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _default(obj: Any) -> Any:
+    # e.g. the pydantic models of the OpenAI SDK.
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
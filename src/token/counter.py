@@ -1,19 +1,19 @@
-from enum import Enum
-from typing import Union, Optional
-from functools import lru_cache
-from dataclasses import dataclass
-
-import tiktoken
-from tokenizers import Tokenizer
+from typing import Any, Union, Optional
 
 from src.config import LogConfiguration
 from src.router.log import get_logger
 from src.token.func import _format_function_definitions
 from src.model.message import ChatMessageValues
+from src.token.registry import TokenizerType, TokenCounterFunc, TokenizerRegistry, get_cl100k_base
 
 DEFAULT_IMAGE_TOKEN_COUNT = 250
 
-CL100K_BASE = tiktoken.get_encoding("cl100k_base")
+
+def __getattr__(name: str) -> Any:
+    # `CL100K_BASE` used to be loaded at import time.
+    if name == "CL100K_BASE":
+        return get_cl100k_base()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def _count_message_tokens(encoding, messages, tokens_per_message, tokens_per_name):
@@ -60,36 +60,30 @@ def _process_messages(messages):
     return text, is_tool_call
 
 
-class TokenizerType(Enum):
-    HuggingFace = "huggingface"
-    OpenAI = "openai"
-
-
-@dataclass
-class TokenCounterFunc:
-    tokenizer: Tokenizer
-    tokenizer_type: TokenizerType
-
-
 class TokenCounter:
-    def __init__(self, log_cfg: LogConfiguration):
+    def __init__(self, log_cfg: LogConfiguration, registry: Optional[TokenizerRegistry] = None):
+        """
+        Count the tokens of the requests.
+        :param log_cfg:
+        :param registry: the tokenizers of the models, default is a registry without rules.
+        """
         self.logger = get_logger(__name__, log_cfg=log_cfg)
+        self.registry = registry or TokenizerRegistry(log_cfg)
+
+    def warmup(self):
+        """
+        Load the tokenizers of the registry, so the first request doesn't pay for it.
+        :return:
+        """
+        self.registry.warmup()
 
     def _get_encoding(self, model):
-        try:
-            return tiktoken.encoding_for_model(model)
-        except KeyError:
-            self.logger.error(f"Could not automatically map {model} to a tokeniser. ")
-            return tiktoken.get_encoding("cl100k_base")
-
-    @staticmethod
-    @lru_cache(maxsize=128)
-    def _select_tokenizer_helper(model: str):
-        if "llama-3" in model.lower():
-            tokenizer = Tokenizer.from_pretrained("Xenova/llama-3-tokenizer")
-            return TokenCounterFunc(tokenizer=tokenizer, tokenizer_type=TokenizerType.HuggingFace)
-        else:
-            return TokenCounterFunc(tokenizer=CL100K_BASE, tokenizer_type=TokenizerType.OpenAI)
+        func = self.registry.get(model)
+        # The OpenAI counting of a model with a Hugging Face tokenizer falls back to the default encoding.
+        return func.tokenizer if func.tokenizer_type == TokenizerType.OpenAI else self.registry.get("").tokenizer
+
+    def _select_tokenizer_helper(self, model: str) -> TokenCounterFunc:
+        return self.registry.get(model)
 
     def _openai_token_counter(
         self,
@@ -157,5 +151,5 @@ class TokenCounter:
                     tool_choice=tool_choice,
                 )
         else:
-            num_tokens = len(CL100K_BASE.encode(text, disallowed_special=()))
+            num_tokens = len(self.registry.get("").tokenizer.encode(text, disallowed_special=()))
         return num_tokens
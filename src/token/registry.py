@@ -0,0 +1,188 @@
+import os
+import threading
+from enum import Enum
+from typing import TYPE_CHECKING, Union, Callable, Iterator, Optional
+from fnmatch import fnmatchcase
+from functools import lru_cache
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from src.config import LogConfiguration
+from src.router.log import get_logger
+from src.config.tokenizer import TokenizerSpec, TokenizerConfig
+
+if TYPE_CHECKING:
+    from tiktoken import Encoding
+    from tokenizers import Tokenizer
+
+# The tokenizer of the Llama 3 models on the Hugging Face Hub.
+LLAMA_3_TOKENIZER = "Xenova/llama-3-tokenizer"
+
+
+class TokenizerType(Enum):
+    HuggingFace = "huggingface"
+    OpenAI = "openai"
+
+
+@dataclass
+class TokenCounterFunc:
+    tokenizer: Union["Tokenizer", "Encoding"]
+    tokenizer_type: TokenizerType
+
+
+# The tokenizer backends take hundreds of milliseconds to import and load, they are loaded on first use or by a
+# warm-up, not when the router is imported.
+def _tiktoken():
+    import tiktoken
+
+    return tiktoken
+
+
+def _tokenizer_class() -> type["Tokenizer"]:
+    from tokenizers import Tokenizer
+
+    return Tokenizer
+
+
+_TIKTOKEN_CACHE_DIR = "TIKTOKEN_CACHE_DIR"
+_env_lock = threading.Lock()
+
+
+@contextmanager
+def _tiktoken_cache_dir(path: Optional[str]) -> Iterator[None]:
+    """
+    tiktoken only reads its cache directory from the environment when it loads an encoding, so the variable is set
+    for the duration of the load, and the previous value is restored afterwards.
+    :param path: None to keep the environment as is.
+    :return:
+    """
+    if path is None:
+        yield
+        return
+    with _env_lock:
+        previous = os.environ.get(_TIKTOKEN_CACHE_DIR)
+        os.environ[_TIKTOKEN_CACHE_DIR] = path
+        try:
+            yield
+        finally:
+            if previous is None:
+                os.environ.pop(_TIKTOKEN_CACHE_DIR, None)
+            else:
+                os.environ[_TIKTOKEN_CACHE_DIR] = previous
+
+
+@lru_cache(maxsize=1)
+def get_cl100k_base() -> "Encoding":
+    return _tiktoken().get_encoding("cl100k_base")
+
+
+class TokenizerRegistry:
+    def __init__(self, log_cfg: LogConfiguration, config: Optional[TokenizerConfig] = None):
+        """
+        Resolve the tokenizer of a model id with the rules of the config, and load each tokenizer once. The router
+        and its token counter share a registry. The warm-up runs in a worker thread while the event loop may count
+        tokens, so the loading is guarded by a lock, the lookups of resolved models are not.
+        :param log_cfg:
+        :param config:
+        """
+        self.logger = get_logger(__name__, log_cfg)
+        self.config = config or TokenizerConfig()
+        self._lock = threading.RLock()
+        # The loaded tokenizers by source, e.g. ("encoding", "cl100k_base") or ("path", "/models/tokenizer.json").
+        self._loaded: dict[tuple[str, str], TokenCounterFunc] = {}
+        # The resolved tokenizer and the matching rule of each model id.
+        self._models: dict[str, TokenCounterFunc] = {}
+        self._matches: dict[str, Optional[TokenizerSpec]] = {}
+        cache_dir = self.config.tiktoken_cache_dir
+        if cache_dir and os.environ.get(_TIKTOKEN_CACHE_DIR, cache_dir) != cache_dir:
+            self.logger.info(
+                f"tiktoken encodings of this router are loaded from {cache_dir} instead of "
+                f"{_TIKTOKEN_CACHE_DIR}={os.environ[_TIKTOKEN_CACHE_DIR]}"
+            )
+
+    def match(self, model: str) -> Optional[TokenizerSpec]:
+        """
+        The first rule whose pattern matches the model id.
+        :param model:
+        :return: None if no rule matches.
+        """
+        try:
+            return self._matches[model]
+        except KeyError:
+            pass
+        lowered = model.lower()
+        spec = next((s for s in self.config.tokenizers if fnmatchcase(lowered, s.pattern.lower())), None)
+        self._matches[model] = spec
+        return spec
+
+    def get(self, model: str) -> TokenCounterFunc:
+        """
+        The tokenizer of the model id, the default encoding if the id is empty.
+        :param model:
+        :return:
+        """
+        func = self._models.get(model)
+        if func is None:
+            with self._lock:
+                func = self._models.get(model)
+                if func is None:
+                    func = self._models[model] = self._resolve(model)
+        return func
+
+    def warmup(self):
+        """
+        Load the default encoding and the tokenizer of every rule.
+        :return:
+        """
+        self.get("")
+        for spec in self.config.tokenizers:
+            with self._lock:
+                self._load_spec(spec)
+        self.logger.info(f"{len(self._loaded)} tokenizers are loaded")
+
+    def _resolve(self, model: str) -> TokenCounterFunc:
+        default = self.config.default_encoding
+        if not model:
+            return self._load_encoding(default)
+        spec = self.match(model)
+        if spec is not None:
+            return self._load_spec(spec)
+        if "llama-3" in model.lower():
+            if self.config.allow_download:
+                return self._load(
+                    ("hub", LLAMA_3_TOKENIZER),
+                    lambda: TokenCounterFunc(
+                        _tokenizer_class().from_pretrained(LLAMA_3_TOKENIZER), TokenizerType.HuggingFace
+                    ),
+                )
+            self.logger.warning(f"No local tokenizer of {model} and the downloads are disabled, use {default}")
+            return self._load_encoding(default)
+        try:
+            with _tiktoken_cache_dir(self.config.tiktoken_cache_dir):
+                encoding = _tiktoken().encoding_for_model(model)
+        except KeyError:
+            self.logger.error(f"Could not automatically map {model} to a tokeniser. ")
+            return self._load_encoding(default)
+        return self._load(("encoding", encoding.name), lambda: TokenCounterFunc(encoding, TokenizerType.OpenAI))
+
+    def _load_spec(self, spec: TokenizerSpec) -> TokenCounterFunc:
+        if spec.path is not None:
+            return self._load(
+                ("path", spec.path),
+                lambda: TokenCounterFunc(_tokenizer_class().from_file(spec.path), TokenizerType.HuggingFace),
+            )
+        return self._load_encoding(spec.encoding)
+
+    def _load_encoding(self, name: str) -> TokenCounterFunc:
+        def load() -> TokenCounterFunc:
+            with _tiktoken_cache_dir(self.config.tiktoken_cache_dir):
+                return TokenCounterFunc(_tiktoken().get_encoding(name), TokenizerType.OpenAI)
+
+        return self._load(("encoding", name), load)
+
+    def _load(self, source: tuple[str, str], load: Callable[[], TokenCounterFunc]) -> TokenCounterFunc:
+        func = self._loaded.get(source)
+        if func is None:
+            self.logger.info(f"Loading tokenizer {source[1]} from {source[0]}")
+            func = self._loaded[source] = load()
+        return func
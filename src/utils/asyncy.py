@@ -1,8 +1,15 @@
 import asyncio
+import threading
+from typing import Any, Optional, Coroutine
 from concurrent.futures import ThreadPoolExecutor
 
 
 def run_async_function(async_fn, *args, **kwargs):
+    """
+    Run the async function in a new event loop, the objects bound to a loop, e.g. `asyncio.Lock`, can't be shared
+    between the calls, use `BackgroundLoop` to call a long-lived object, e.g. the router.
+    """
+
     def run_in_new_loop():
         new_loop = asyncio.new_event_loop()
         try:
@@ -22,3 +29,75 @@ def run_async_function(async_fn, *args, **kwargs):
     except RuntimeError:
         # No running event loop, we can safely run in this thread
         return run_in_new_loop()
+
+
+class BackgroundLoop:
+    def __init__(self, name: str = "background-loop"):
+        """
+        An event loop running forever in a daemon thread, the sync callers of any thread submit their coroutines
+        to it, so they share the loop-bound state, e.g. locks, tasks and connections.
+        The thread is started by the first call.
+        :param name: the name of the thread.
+        """
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    self._start()
+        return self._loop
+
+    def _start(self):
+        loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=loop.run_forever, name=self.name, daemon=True)
+        self._thread.start()
+        self._loop = loop
+
+    def is_running(self) -> bool:
+        return self._loop is not None
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Run the coroutine in the loop and wait for its result.
+        :param coro:
+        :param timeout: in seconds, the coroutine is cancelled if it's not done in time.
+        :return:
+        """
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError(f"Can't wait for {self.name} in its own thread")
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # e.g. timeout or KeyboardInterrupt, don't leave the coroutine running.
+            future.cancel()
+            raise
+
+    def stop(self):
+        """
+        Stop the loop and wait for its thread, the pending tasks are cancelled.
+        :return:
+        """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None:
+                return
+            self._loop = self._thread = None
+        asyncio.run_coroutine_threadsafe(self._cancel_tasks(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    @staticmethod
+    async def _cancel_tasks():
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,9 +1,10 @@
 import json
+import time
 import uuid
 import contextvars
-from typing import Optional
+from typing import Any, Optional
 from datetime import datetime
-from dataclasses import field, asdict, dataclass
+from dataclasses import field, fields, dataclass
 
 router_context = contextvars.ContextVar("Router context")
 
@@ -22,6 +23,10 @@ class RouterContext:
     token_count: int
     start_time: datetime = field(init=False)
     provider_id: Optional[str] = None
+    # The monotonic time by which the request must be done, None if it has no deadline.
+    deadline: Optional[float] = None
+    # The `RoutingState` of the router when the request started, the request completes against its providers.
+    routing_state: Optional[Any] = field(default=None, repr=False)
 
     def __post_init__(self):
         self.request_id = str(uuid.uuid4())
@@ -31,7 +36,8 @@ class RouterContext:
         return self.start_time.strftime("%Y%m%d%H%M")
 
     def serialize(self):
-        data = asdict(self)
+        # The routing state is not data of the request, and `asdict` would deep copy it.
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.name != "routing_state"}
         data["start_time"] = self.start_time.isoformat()
         return json.dumps(data)
 
@@ -43,3 +49,27 @@ class RouterContext:
 
     def update_provider_id(self, provider_id: str):
         self.provider_id = provider_id
+
+    def fork(self, model_group: str) -> "RouterContext":
+        """
+        A context for a sub-request of this request, e.g. a fallback, it shares the request id, token count,
+        deadline and routing state, and has its own provider.
+        :param model_group:
+        :return:
+        """
+        ctx = RouterContext(
+            model_group=model_group,
+            token_count=self.token_count,
+            deadline=self.deadline,
+            routing_state=self.routing_state,
+        )
+        ctx.request_id = self.request_id
+        return ctx
+
+    def remaining_seconds(self) -> Optional[float]:
+        """
+        :return: the time left before the deadline, negative if it has passed, None if there is no deadline.
+        """
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
@@ -87,3 +87,11 @@ async def test_concurrent_writes(mock_cache):
     tasks = [write("key", i) for i in range(10)]
     await asyncio.gather(*tasks)
     assert await mock_cache.async_get_value("key") == 9
+
+
+@pytest.mark.asyncio
+async def test_async_delete_value(mock_cache):
+    await mock_cache.async_set_value("key", "value")
+    await mock_cache.async_delete_value("key")
+    await mock_cache.async_delete_value("missing")
+    assert await mock_cache.async_get_value("key") is None
@@ -0,0 +1,121 @@
+import random
+
+import pytest
+
+from src.cache.near_duplicate import (
+    MASK_64,
+    NearDuplicateIndex,
+    simhash,
+    normalize,
+    prompt_text,
+    max_distance,
+    signature_of,
+)
+
+
+def majority_simhash(tokens):
+    features = [hash(t) & MASK_64 for t in tokens]
+    features += [((a * 0x100000001B3) ^ b) & MASK_64 for a, b in zip(features, features[1:])]
+    signature = 0
+    for i in range(64):
+        if sum((f >> i) & 1 for f in features) > len(features) // 2:
+            signature |= 1 << i
+    return signature
+
+
+def test_normalize():
+    text = "Ticket 4821 opened at 2024-01-02T10:00:00 by id=9f3a:\n  the Export button,  is greyed out!"
+    assert normalize(text) == [
+        "ticket", "4821", "opened", "at", "2024", "01", "02t10", "00", "00", "by", "id", "9f3a",
+        "the", "export", "button", "is", "greyed", "out",
+    ]  # fmt: skip
+
+
+def test_prompt_text():
+    messages = [
+        {"role": "system", "content": "be brief"},
+        {"role": "user", "content": [{"type": "text", "text": "hello"}]},
+    ]
+    assert prompt_text(None, messages) == "system\nbe brief\nuser\nhello"
+    assert prompt_text("hi", None) == "hi"
+    image = {"type": "image_url", "image_url": {"url": "data:"}}
+    assert prompt_text(None, [{"role": "user", "content": [image]}]) is None
+
+
+def test_simhash_is_bitwise_majority():
+    rng = random.Random(0)
+    for _ in range(200):
+        tokens = [rng.choice("abcdefgh") * rng.randint(1, 3) for _ in range(rng.randint(0, 200))]
+        assert simhash(tokens) == majority_simhash(tokens)
+
+
+def test_similar_prompts_have_close_signatures():
+    # The hash of str is seeded per process, compare many prompts so the test doesn't depend on the seed.
+    rng = random.Random(0)
+    vocabulary = ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=6)) for _ in range(1000)]
+    close = far = 0
+    for _ in range(100):
+        words = rng.choices(vocabulary, k=60)
+        signature = signature_of(" ".join(words))
+        variant = " ".join(words[:30] + ["id"] + words[30:])
+        close += (signature ^ signature_of(variant)).bit_count() <= max_distance(0.9)
+        far += (signature ^ signature_of(" ".join(rng.choices(vocabulary, k=60)))).bit_count() <= max_distance(0.9)
+    assert close >= 80
+    assert far == 0
+    assert signature_of("Hello,  world 42!") == signature_of("hello\nworld 42")
+
+
+def test_prompts_differing_by_numbers():
+    assert signature_of("What is 2+2?") != signature_of("What is 317*42?")
+    assert signature_of("Refund order 1001") != signature_of("Refund order 2002")
+    assert signature_of("12345") != signature_of("67890")
+    assert signature_of(" ?! ") is None
+
+
+def test_max_distance():
+    assert max_distance(1) == 0
+    assert max_distance(0.95) == 3
+    assert max_distance(0.9) == 6
+
+
+def test_index_lookup():
+    index = NearDuplicateIndex(capacity=10)
+    index.add(0b1111, "a")
+    index.add(0b1111 << 60, "b")
+    assert index.lookup(0b1111, 0) == "a"
+    # The nearest entry within the distance.
+    assert index.lookup(0b0111, 1) == "a"
+    assert index.lookup(0b0011, 1) is None
+    assert index.lookup((0b1111 << 60) | 1, 2) == "b"
+
+
+def test_index_generations():
+    index = NearDuplicateIndex(capacity=2)
+    for i in range(5):
+        index.add(i << 20, str(i))
+    # The two latest generations are kept, the first is dropped.
+    assert len(index) == 3
+    assert index.lookup(0, 0) is None
+    assert index.lookup(2 << 20, 0) == "2"
+    assert index.lookup(4 << 20, 0) == "4"
+
+
+def test_index_remove():
+    index = NearDuplicateIndex(capacity=2)
+    index.add(0b1111, "a")
+    index.add(0b0111, "b")
+    index.remove("a")
+    assert len(index) == 1
+    assert index.lookup(0b1111, 1) == "b"
+    index.remove("b")
+    assert index.lookup(0b1111, 1) is None
+    # A key added again replaces its entry, in the previous generation too.
+    index.add(0b1111, "c")
+    index.add(1 << 40, "c")
+    assert len(index) == 1
+    assert index.lookup(0b1111, 0) is None
+
+
+def test_invalid_capacity():
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(capacity=0)
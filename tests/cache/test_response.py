@@ -0,0 +1,171 @@
+import pytest
+from openai.types import CompletionUsage
+
+from src.config import LogConfiguration, ResponseCacheConfig
+from src.cache.base import BaseCache
+from src.cache.memory import MemoryCache
+from src.cache.response import ResponseCache
+
+
+def create_cache(**kwargs):
+    log_cfg = LogConfiguration()
+    return ResponseCache(log_cfg, ResponseCacheConfig(enabled=True, **kwargs), MemoryCache(log_cfg))
+
+
+@pytest.mark.asyncio
+async def test_get_set():
+    cache = create_cache()
+    assert await cache.get("k") == (False, None)
+    await cache.set("k", {"content": "hello"})
+    assert await cache.get("k") == (True, {"content": "hello"})
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_compression():
+    cache = create_cache(compress_min_bytes=100)
+    large = "x" * 10_000
+    await cache.set("large", large)
+    await cache.set("small", "x")
+    assert cache.entries["large"][0] < 1000
+    assert (await cache.cache.async_get_value("response:large"))[:1] == b"z"
+    assert (await cache.cache.async_get_value("response:small"))[:1] == b"r"
+    assert await cache.get("large") == (True, large)
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction():
+    cache = create_cache(max_bytes=300, compress_min_bytes=None)
+    for key in ["a", "b", "c"]:
+        await cache.set(key, key * 80)
+    # The least recently used entry is evicted once the cap is exceeded.
+    assert (await cache.get("a"))[0]
+    await cache.set("d", "d" * 80)
+    assert not (await cache.get("b"))[0]
+    assert (await cache.get("a"))[0]
+    assert cache.total_bytes <= 300
+
+
+@pytest.mark.asyncio
+async def test_oversize_and_unpicklable_responses_are_skipped():
+    cache = create_cache(max_bytes=10, compress_min_bytes=None)
+    await cache.set("large", "x" * 100)
+    await cache.set("lambda", lambda: None)
+    assert not cache.entries
+    assert not (await cache.get("large"))[0]
+
+
+@pytest.mark.asyncio
+async def test_ttl():
+    cache = create_cache(ttl_seconds=1)
+    await cache.set("k", "v")
+    assert cache.entries["k"][1] > 0
+    await cache.cache.async_delete_value("response:k")
+    assert not (await cache.get("k"))[0]
+    assert "k" not in cache.entries
+    assert cache.total_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_default_delete_value():
+    class DictCache(BaseCache):
+        def __init__(self):
+            super().__init__(default_ttl=60)
+            self.data = {}
+
+        async def async_set_value(self, key, value, ttl=None, **_kwargs):
+            self.data[key] = None if ttl == 0 else value
+
+        async def async_get_value(self, key, **_kwargs):
+            return self.data.get(key)
+
+    log_cfg = LogConfiguration()
+    cache = ResponseCache(
+        log_cfg, ResponseCacheConfig(enabled=True, max_bytes=100, compress_min_bytes=None), DictCache()
+    )
+    await cache.set("a", "a" * 60)
+    await cache.set("b", "b" * 60)
+    assert not (await cache.get("a"))[0]
+    assert (await cache.get("b"))[0]
+
+
+@pytest.mark.asyncio
+async def test_similar_prompt_hit():
+    cache = create_cache(similarity_threshold=0.9, group_similarity_threshold={"exact": 1})
+    prompt = "Summarize ticket 4821 opened at 2024-01-02T10:00:00: the export button is greyed out after the update"
+    similar = (
+        "summarize  Ticket 4821, opened at 2024-01-02T10:00:00:\nthe export button is greyed out after the update!"
+    )
+    signature = cache.signature("group", prompt, None)
+    assert signature == cache.signature("group", similar, None)
+    await cache.set("k", "greyed", "group", signature)
+    assert await cache.get("other", "group", cache.signature("group", similar, None)) == (True, "greyed")
+    # The index is per group.
+    assert not (await cache.get("other", "another", signature))[0]
+    assert (cache.hits, cache.similar_hits, cache.misses) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_prompts_differing_by_numbers_miss():
+    cache = create_cache(similarity_threshold=1)
+    for prompt, answer in [("What is 2+2?", "4"), ("Refund order 1001", "refunded 1001")]:
+        await cache.set(prompt, answer, "group", cache.signature("group", prompt, None))
+    for prompt in ["What is 317*42?", "Refund order 2002"]:
+        assert not (await cache.get(prompt, "group", cache.signature("group", prompt, None)))[0]
+    assert cache.similar_hits == 0
+
+
+@pytest.mark.asyncio
+async def test_evicted_and_expired_entries_leave_the_index():
+    cache = create_cache(similarity_threshold=0.9, max_bytes=300, compress_min_bytes=None)
+    for key in ["a", "b", "c", "d"]:
+        await cache.set(key, key * 80, "group", cache.signature("group", f"prompt {key}", None))
+    assert "a" not in cache.entries
+    assert len(cache.near_duplicates["group"]) == len(cache.entries) == 3
+    # The expired entries are dropped on the next write.
+    for key in ["b", "c"]:
+        cache.expiries[key] = 0
+    await cache.set("e", "e", "group", cache.signature("group", "prompt e", None))
+    assert list(cache.entries) == ["d", "e"]
+    assert len(cache.near_duplicates["group"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_similarity_disabled():
+    cache = create_cache(group_similarity_threshold={"group": 0.9})
+    assert cache.signature("other", "hello", None) is None
+    assert cache.signature("group", None, [{"role": "user", "content": [{"type": "image_url"}]}]) is None
+    assert cache.signature("group", "hello", None) is not None
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"max_bytes": 0},
+        {"similarity_threshold": 0},
+        {"group_similarity_threshold": {"group": 1.5}},
+        {"max_similar_entries": 0},
+    ],
+)
+def test_invalid_config(kwargs):
+    with pytest.raises(ValueError):
+        ResponseCacheConfig(**kwargs)
+
+
+@pytest.mark.asyncio
+async def test_pydantic_response_round_trip():
+    cache = create_cache()
+    usage = CompletionUsage(prompt_tokens=1, completion_tokens=2, total_tokens=3)
+    await cache.set("k", {"usage": usage, "choices": ["a"]})
+    found, response = await cache.get("k")
+    assert found
+    assert response == {"usage": usage, "choices": ["a"]}
+    assert isinstance(response["usage"], CompletionUsage)
+
+
+@pytest.mark.asyncio
+async def test_payload_never_imports_code():
+    cache = create_cache()
+    payload = b'r{"__model__":"not_imported_module:Model","data":{}}'
+    await cache.cache.async_set_value("response:k", payload)
+    assert await cache.get("k") == (False, None)
@@ -2,7 +2,15 @@ import logging
 
 import pytest
 
-from src.config import CooldownConfig, FallbackConfig, LogConfiguration, LoadBalancerConfig
+from src.config import (
+    CooldownConfig,
+    FallbackConfig,
+    LogConfiguration,
+    HealthCheckConfig,
+    LoadBalancerConfig,
+    LoadBalancerStrategy,
+    OutlierDetectionConfig,
+)
 from src.config.config import RouterConfig, LLMProviderConfig
 from tests.mock_provider import MockLLMProvider
 
@@ -42,7 +50,32 @@ def test_provider_unique_id():
     gpt3_impl = MockLLMProvider()
     gpt3 = LLMProviderConfig(model_id="gpt3", impl=gpt3_impl, rpm=100, tpm=100)
 
-    assert gpt3.id == "2be8ffd8042afda156a9c8cf50936c0e4192ce47947f9a3e158919038bf6c8a6"
+    assert gpt3.id == "9470a3e21bedbe0a232d7c6258f3c2cc870eb706bbec58111682d12e96e37734"
+    # The limits are not part of the identity.
+    assert LLMProviderConfig(model_id="gpt3", impl=gpt3_impl, rpm=10).id == gpt3.id
+
+
+def create_config(groups):
+    return RouterConfig(
+        llm_provider_group=groups, load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM)
+    )
+
+
+def test_provider_id_collision():
+    east = LLMProviderConfig(model_id="gpt3", impl=MockLLMProvider(), rpm=100)
+    west = LLMProviderConfig(model_id="gpt3", impl=MockLLMProvider(), rpm=10)
+    # The default repr of an implementation is its class, the deployments have the same id.
+    assert east.id == west.id
+    with pytest.raises(ValueError, match="distinct names"):
+        create_config({"a": [east], "b": [west]})
+    with pytest.raises(ValueError, match="twice in group a"):
+        create_config({"a": [east, LLMProviderConfig(model_id="gpt3", impl=east.impl)]})
+
+    west = LLMProviderConfig(model_id="gpt3", impl=west.impl, rpm=10, name="west")
+    assert west.id != east.id
+    create_config({"a": [east, west]})
+    # A provider may be shared by several groups.
+    create_config({"a": [east], "b": [east]})
 
 
 def test_failed_init_provider_with_id():
@@ -166,3 +199,76 @@ def test_to_json():
         "}"
     )
     assert actual == expect.replace(" ", "")
+
+
+def test_invalid_routing_table_refresh_interval():
+    with pytest.raises(ValueError):
+        LoadBalancerConfig(capacity_dimension="rpm", routing_table_refresh_ms=0)
+
+
+def test_group_load_balancer_config():
+    gpt3 = LLMProviderConfig(model_id="gpt3", impl=MockLLMProvider(), tpm=100)
+    latency_config = LoadBalancerConfig(strategy=LoadBalancerStrategy.LATENCY_BASED_BALANCER)
+    rc = RouterConfig(
+        llm_provider_group={"chat": [gpt3], "batch": [gpt3]},
+        load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+        group_load_balancer_config={"chat": latency_config},
+    )
+    assert rc.get_load_balancer_config("chat") is latency_config
+    assert rc.get_load_balancer_config("batch").strategy == LoadBalancerStrategy.RANDOM
+
+
+def test_group_load_balancer_config_validation():
+    gpt3 = LLMProviderConfig(model_id="gpt3", impl=MockLLMProvider(), tpm=100)
+    with pytest.raises(ValueError, match="unknown group"):
+        RouterConfig(
+            llm_provider_group={"chat": [gpt3]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            group_load_balancer_config={"missing": LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM)},
+        )
+    with pytest.raises(ValueError, match="Capacity dimension rpm is not found."):
+        RouterConfig(
+            llm_provider_group={"chat": [gpt3]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            group_load_balancer_config={"chat": LoadBalancerConfig(capacity_dimension="rpm")},
+        )
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(interval_seconds=0),
+        dict(interval_seconds=10, max_interval_seconds=5),
+        dict(backoff_multiplier=0.5),
+        dict(jitter=1),
+        dict(max_concurrency=0),
+    ],
+)
+def test_invalid_health_check_config(kwargs):
+    with pytest.raises(ValueError):
+        HealthCheckConfig(**kwargs)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(interval_seconds=0),
+        dict(percentile=0),
+        dict(threshold_multiplier=1),
+        dict(min_samples=0),
+        dict(base_ejection_seconds=30, max_ejection_seconds=10),
+        dict(max_ejection_percent=101),
+    ],
+)
+def test_invalid_outlier_detection_config(kwargs):
+    with pytest.raises(ValueError):
+        OutlierDetectionConfig(**kwargs)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [dict(failure_rate_threshold=1.5), dict(min_request_volume=-1), dict(window_seconds=0), dict(num_buckets=0)],
+)
+def test_invalid_failure_rate_config(kwargs):
+    with pytest.raises(ValueError):
+        CooldownConfig(**kwargs)
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from src.config import FallbackMode, RetryStrategy, LoadBalancerStrategy
+from src.config.loader import ConfigLoader, read_config_file
+from tests.mock_provider import MockLLMProvider
+
+CONFIG = {
+    "timeout_seconds": 10,
+    "load_balancer_config": {"strategy": "random-balancer"},
+    "group_load_balancer_config": {"chat": {"strategy": "COST_BASED_BALANCER"}},
+    "fallback_config": {"allow_fallback": True, "degraded_map": {"chat": ["backup"]}, "mode": "staggered"},
+    "llm_provider_group": {
+        "chat": [
+            {"model_id": "gpt-4o", "impl": "tests.mock_provider:MockLLMProvider", "rpm": 100, "cost": 0.5},
+            {"model_id": "gpt-4o-mini", "impl": "tests.mock_provider:MockLLMProvider"},
+        ],
+        "backup": [{"model_id": "qwen", "impl": "tests.mock_provider:MockLLMProvider", "params": {}}],
+    },
+}
+
+
+def test_build_config():
+    cfg = ConfigLoader().build(CONFIG)
+    assert cfg.timeout_seconds == 10
+    assert cfg.load_balancer_config.strategy == LoadBalancerStrategy.RANDOM
+    assert cfg.group_load_balancer_config["chat"].strategy == LoadBalancerStrategy.COST_BASED_BALANCER
+    assert cfg.fallback_config.mode == FallbackMode.STAGGERED
+    assert cfg.fallback_config.chains == {"chat": ("backup",)}
+    assert cfg.retry_config.retry_policy is None
+    chat = cfg.llm_provider_group["chat"]
+    assert [(p.model_id, p.rpm, p.cost) for p in chat] == [("gpt-4o", 100, 0.5), ("gpt-4o-mini", None, None)]
+    assert isinstance(chat[0].impl, MockLLMProvider)
+    # The providers of the same class and parameters share their implementation.
+    assert chat[0].impl is cfg.llm_provider_group["backup"][0].impl
+
+
+def test_reload_keeps_provider_ids():
+    loader = ConfigLoader()
+    ids = [p.id for p in loader.build(CONFIG).llm_provider_group["chat"]]
+    cfg = loader.build(CONFIG)
+    assert [p.id for p in cfg.llm_provider_group["chat"]] == ids
+    # Another loader creates new implementations.
+    assert ConfigLoader().build(CONFIG).llm_provider_group["chat"][0].impl is not cfg.llm_provider_group["chat"][0].impl
+
+
+def test_build_nested_enum():
+    cfg = ConfigLoader().build(
+        {**CONFIG, "retry_config": {"max_attempt": 2, "retry_policy": {"TimeoutErrorRetries": 1}}}
+    )
+    assert cfg.retry_config.retry_policy.TimeoutErrorRetries == 1
+    assert RetryStrategy("constant_retry") == RetryStrategy.CONSTANT_INTERVAL
+
+
+@pytest.mark.parametrize(
+    "data, error",
+    [
+        ({**CONFIG, "unknown": 1}, "Unknown field 'unknown' of RouterConfig"),
+        ({**CONFIG, "llm_provider_group": {"g": [{"model_id": "m"}]}}, "requires 'impl'"),
+        (
+            {**CONFIG, "llm_provider_group": {"g": [{"model_id": "m", "impl": "json:JSONDecoder"}]}},
+            "not a BaseLLMProvider",
+        ),
+        ({**CONFIG, "load_balancer_config": {"strategy": "unknown"}}, "unknown"),
+    ],
+)
+def test_build_invalid(data, error):
+    with pytest.raises(Exception, match=error):
+        ConfigLoader().build(data)
+
+
+def test_read_config_file(tmp_path):
+    json_path = tmp_path / "router.json"
+    json_path.write_text(json.dumps(CONFIG))
+    yaml_path = tmp_path / "router.yaml"
+    yaml_path.write_text("timeout_seconds: 10\nllm_provider_group:\n  chat: []\n")
+    assert read_config_file(json_path) == CONFIG
+    assert read_config_file(yaml_path) == {"timeout_seconds": 10, "llm_provider_group": {"chat": []}}
+    with pytest.raises(ValueError):
+        read_config_file(tmp_path / "router.toml")
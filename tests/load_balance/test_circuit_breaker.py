@@ -0,0 +1,133 @@
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.config import CooldownConfig, LogConfiguration
+from src.cache.base import BaseCache
+from src.cache.memory import MemoryCache
+from src.load_balance.circuit_breaker import CircuitState, CooldownState, CircuitBreaker
+
+
+def create_provider(provider_id):
+    return MagicMock(id=provider_id)
+
+
+@pytest.fixture
+def cooldown_config():
+    return CooldownConfig(cooldown_seconds=10, cooldown_multiplier=2, max_cooldown_seconds=35, half_open_max_probes=2)
+
+
+@pytest.fixture
+def breaker(cooldown_config):
+    return CircuitBreaker(LogConfiguration(), cooldown_config)
+
+
+def expire(breaker, provider_id):
+    circuit = breaker.circuits[provider_id]
+    circuit.opened_at = time.time() - circuit.cooldown_seconds - 1
+
+
+@pytest.mark.asyncio
+async def test_open_and_half_open(breaker):
+    providers = [create_provider("p1"), create_provider("p2")]
+    assert breaker.filter_available(providers) == providers
+    await breaker.open("p1", "RateLimitError")
+    assert breaker.state("p1") == CircuitState.OPEN
+    assert [p.id for p in breaker.filter_available(providers)] == ["p2"]
+    expire(breaker, "p1")
+    assert breaker.state("p1") == CircuitState.HALF_OPEN
+    assert breaker.filter_available(providers) == providers
+
+
+@pytest.mark.asyncio
+async def test_half_open_limits_probes(breaker):
+    await breaker.open("p1", "RateLimitError")
+    expire(breaker, "p1")
+    breaker.acquire("p1")
+    assert breaker.is_available("p1")
+    breaker.acquire("p1")
+    assert not breaker.is_available("p1")
+
+
+@pytest.mark.asyncio
+async def test_half_open_success_closes(breaker):
+    await breaker.open("p1", "RateLimitError")
+    expire(breaker, "p1")
+    breaker.acquire("p1")
+    await breaker.record_success("p1")
+    assert breaker.state("p1") == CircuitState.CLOSED
+    assert "p1" not in breaker.tripped
+
+
+@pytest.mark.asyncio
+async def test_exponential_cooldown(breaker):
+    await breaker.open("p1", "RateLimitError")
+    assert breaker.circuits["p1"].cooldown_seconds == 10
+    expire(breaker, "p1")
+    assert breaker.is_half_open("p1")
+    await breaker.open("p1", "RateLimitError")
+    assert breaker.circuits["p1"].cooldown_seconds == 20
+    expire(breaker, "p1")
+    await breaker.open("p1", "RateLimitError")
+    assert breaker.circuits["p1"].cooldown_seconds == 35
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_is_not_extended(breaker):
+    assert await breaker.open("p1", "RateLimitError")
+    opened_at = breaker.circuits["p1"].opened_at
+    # The failures of the requests in flight when the circuit opened.
+    assert not await breaker.open("p1", "InternalServerError")
+    circuit = breaker.circuits["p1"]
+    assert (circuit.cooldown_seconds, circuit.open_count, circuit.opened_at) == (10, 1, opened_at)
+    assert circuit.exception == "InternalServerError"
+
+
+@pytest.mark.asyncio
+async def test_cooldown_resets_after_recovery(breaker):
+    await breaker.open("p1", "RateLimitError")
+    expire(breaker, "p1")
+    await breaker.record_success("p1")
+    breaker.circuits["p1"].closed_at = time.time() - 100
+    await breaker.open("p1", "RateLimitError")
+    assert breaker.circuits["p1"].cooldown_seconds == 10
+
+
+@pytest.mark.asyncio
+async def test_stale_probes_are_released(breaker):
+    await breaker.open("p1", "RateLimitError")
+    expire(breaker, "p1")
+    breaker.acquire("p1")
+    breaker.acquire("p1")
+    assert not breaker.is_available("p1")
+    expire(breaker, "p1")
+    assert breaker.is_available("p1")
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_is_shared():
+    cache = MagicMock(spec=BaseCache)
+    cache.async_set_value = AsyncMock()
+    breaker = CircuitBreaker(LogConfiguration(), CooldownConfig(shared_cache=cache))
+    await breaker.open("p1", "RateLimitError")
+    key, data = cache.async_set_value.await_args.args
+    assert key == "cooldown:p1"
+    assert CooldownState.deserialize(data).exception == "RateLimitError"
+
+
+@pytest.mark.asyncio
+async def test_sync_from_cache():
+    config = CooldownConfig(shared_cache=MemoryCache(LogConfiguration()))
+    await CircuitBreaker(LogConfiguration(), config).open("p1", "RateLimitError")
+    breaker = CircuitBreaker(LogConfiguration(), config)
+    assert await breaker.sync_from_cache(["p1", "p2"]) == ["p1"]
+    assert breaker.state("p1") == CircuitState.OPEN
+    assert breaker.state("p2") == CircuitState.CLOSED
+    # The circuit is adopted once.
+    assert await breaker.sync_from_cache(["p1", "p2"]) == []
+
+
+def test_invalid_cooldown_multiplier():
+    with pytest.raises(ValueError):
+        CooldownConfig(cooldown_multiplier=0.5)
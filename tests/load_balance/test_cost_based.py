@@ -0,0 +1,53 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.config import LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.cache.memory import MemoryCache
+from src.config.config import LLMProviderConfig
+from src.utils.context import RouterContext, router_context
+from tests.mock_provider import MockLLMProvider
+from src.load_balance.cost_based import CostBasedBalancer
+from src.load_balance.rpm_tpm_manager import RpmTpmManager
+
+
+@pytest.fixture
+def balancer():
+    cache = MemoryCache(LogConfiguration())
+    instance = CostBasedBalancer(
+        cache,
+        LogConfiguration(),
+        LoadBalancerConfig(strategy=LoadBalancerStrategy.COST_BASED_BALANCER),
+        RpmTpmManager(cache, LogConfiguration()),
+    )
+    instance.logger = MagicMock()
+    return instance
+
+
+@pytest.fixture(autouse=True)
+def context():
+    token = router_context.set(RouterContext(model_group="group1", token_count=10))
+    yield
+    router_context.reset(token)
+
+
+@pytest.mark.asyncio
+async def test_select_cheapest_provider(balancer):
+    cheap = LLMProviderConfig(model_id="cheap", impl=MockLLMProvider(), cost=0.1)
+    expensive = LLMProviderConfig(model_id="expensive", impl=MockLLMProvider(), cost=1)
+    unknown = LLMProviderConfig(model_id="unknown", impl=MockLLMProvider())
+    assert await balancer.schedule_provider("group1", [unknown, expensive, cheap]) is cheap
+    assert await balancer.schedule_provider("group1", [unknown, expensive]) is expensive
+    assert await balancer.schedule_provider("group1", [unknown]) is unknown
+
+
+@pytest.mark.asyncio
+async def test_skip_cheapest_provider_over_limit(balancer):
+    cheap = LLMProviderConfig(model_id="cheap", impl=MockLLMProvider(), cost=0.1, tpm=5)
+    expensive = LLMProviderConfig(model_id="expensive", impl=MockLLMProvider(), cost=1)
+    assert await balancer.schedule_provider("group1", [cheap, expensive]) is expensive
+
+
+@pytest.mark.asyncio
+async def test_no_provider(balancer):
+    assert await balancer.schedule_provider("group1", []) is None
@@ -0,0 +1,46 @@
+import pytest
+
+from src.load_balance.failure_rate import FailureRateTracker
+
+
+def test_stats():
+    tracker = FailureRateTracker(window_seconds=60, num_buckets=6)
+    for _ in range(3):
+        tracker.record_failure("p1", now=0)
+    for _ in range(9997):
+        tracker.record_success("p1", now=5)
+    assert tracker.stats("p1", now=5) == (3, 10000)
+    assert tracker.failure_rate("p1", now=5) == 3 / 10000
+    assert tracker.stats("p2", now=5) == (0, 0)
+    assert tracker.failure_rate("p2", now=5) == 0
+
+
+def test_sliding_window():
+    tracker = FailureRateTracker(window_seconds=60, num_buckets=6)
+    tracker.record_failure("p1", now=0)
+    tracker.record_failure("p1", now=30)
+    tracker.record_success("p1", now=59)
+    assert tracker.stats("p1", now=59) == (2, 3)
+    # The first sub-window falls out of the window.
+    assert tracker.stats("p1", now=60) == (1, 2)
+    assert tracker.stats("p1", now=120) == (0, 0)
+
+
+def test_stale_slot_is_reused():
+    tracker = FailureRateTracker(window_seconds=60, num_buckets=6)
+    tracker.record_failure("p1", now=0)
+    # The same slot in the ring buffer, one window later.
+    tracker.record_success("p1", now=60)
+    assert tracker.stats("p1", now=60) == (0, 1)
+
+
+def test_reset():
+    tracker = FailureRateTracker()
+    tracker.record_failure("p1")
+    tracker.reset("p1")
+    assert tracker.stats("p1") == (0, 0)
+
+
+def test_invalid_window():
+    with pytest.raises(ValueError):
+        FailureRateTracker(window_seconds=0)
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from src.config import CooldownConfig, LogConfiguration, HealthCheckConfig
+from src.cache.memory import MemoryCache
+from src.config.config import LLMProviderConfig
+from tests.mock_provider import MockLLMProvider
+from src.load_balance.health_probe import HealthProbeScheduler
+from src.load_balance.provider_manager import ProviderStatusManager
+
+
+class ProbedProvider(MockLLMProvider):
+    def __init__(self, results):
+        self.results = list(results)
+        self.probes = 0
+
+    async def health_check(self):
+        self.probes += 1
+        result = self.results.pop(0) if self.results else True
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class SlowProbedProvider(MockLLMProvider):
+    async def health_check(self):
+        await asyncio.sleep(10)
+        return True
+
+
+def create_scheduler(providers, **kwargs):
+    log_cfg = LogConfiguration()
+    group = [LLMProviderConfig(model_id=f"p{i}", impl=impl) for i, impl in enumerate(providers)]
+    manager = ProviderStatusManager(log_cfg, {"group1": group}, CooldownConfig(), MemoryCache(log_cfg))
+    config = HealthCheckConfig(enabled=True, **kwargs)
+    return HealthProbeScheduler(log_cfg, config, manager), group
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_provider_is_removed():
+    scheduler, group = create_scheduler([ProbedProvider([False, True]), ProbedProvider([])])
+    manager = scheduler.provider_status_manager
+    assert await scheduler.probe(group[0]) is False
+    assert await manager.get_available_providers("group1") == [group[1]]
+    assert await scheduler.probe(group[0]) is True
+    assert await manager.get_available_providers("group1") == group
+
+
+@pytest.mark.asyncio
+async def test_probe_exception_and_timeout_are_unhealthy():
+    scheduler, group = create_scheduler(
+        [ProbedProvider([RuntimeError("boom")]), SlowProbedProvider()], timeout_seconds=0.01
+    )
+    assert await scheduler.probe(group[0]) is False
+    assert await scheduler.probe(group[1]) is False
+    assert scheduler.provider_status_manager.unhealthy == {group[0].id, group[1].id}
+
+
+@pytest.mark.asyncio
+async def test_interval_backoff():
+    scheduler, group = create_scheduler(
+        [ProbedProvider([True, True, True, False])], interval_seconds=1, max_interval_seconds=3, jitter=0
+    )
+    provider_id = group[0].id
+    expected = [2, 3, 3, 1]
+    for interval in expected:
+        await scheduler.probe(group[0])
+        assert scheduler.next_delay(provider_id) == interval
+
+
+@pytest.mark.asyncio
+async def test_unsupported_provider_is_not_probed():
+    scheduler, group = create_scheduler([MockLLMProvider()], interval_seconds=0.01)
+    await scheduler.start_probe_task()
+    try:
+        await asyncio.wait_for(asyncio.gather(*scheduler.probe_tasks), timeout=1)
+    finally:
+        await scheduler.stop_probe_task()
+    assert not scheduler.provider_status_manager.unhealthy
+
+
+@pytest.mark.asyncio
+async def test_probe_loop():
+    impl = ProbedProvider([False])
+    scheduler, group = create_scheduler([impl], interval_seconds=0.01, max_interval_seconds=0.01)
+    await scheduler.start_probe_task()
+    try:
+        while impl.probes < 2:
+            await asyncio.sleep(0.01)
+    finally:
+        await scheduler.stop_probe_task()
+    assert scheduler.probe_tasks == []
+    assert not scheduler.provider_status_manager.unhealthy
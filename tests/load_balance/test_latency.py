@@ -0,0 +1,53 @@
+import pytest
+
+from src.load_balance.latency import LatencyTracker
+
+
+def test_record_and_percentile():
+    tracker = LatencyTracker(window_size=100)
+    for i in range(1, 101):
+        tracker.record("p1", i / 100)
+    assert tracker.count("p1") == 100
+    assert tracker.percentile("p1", 0.5) == 0.5
+    assert tracker.percentile("p1", 0.95) == 0.95
+    assert tracker.percentile("p1", 1) == 1.0
+
+
+def test_ring_buffer_keeps_recent_samples():
+    tracker = LatencyTracker(window_size=4)
+    for v in [10, 10, 10, 10, 1, 1, 1, 1]:
+        tracker.record("p1", v)
+    assert tracker.count("p1") == 4
+    assert sorted(tracker.samples("p1")) == [1, 1, 1, 1]
+
+
+def test_last_samples():
+    tracker = LatencyTracker(window_size=4)
+    for v in [10, 10, 10, 1, 2, 3]:
+        tracker.record("p1", v)
+    assert tracker.recorded("p1") == 6
+    assert sorted(tracker.samples("p1", last=3)) == [1, 2, 3]
+    assert sorted(tracker.samples("p1", last=1)) == [3]
+    assert tracker.percentile("p1", 1, last=3) == 3
+    assert len(tracker.samples("p1", last=10)) == 4
+
+
+def test_group_percentile():
+    tracker = LatencyTracker()
+    tracker.record("p1", 1)
+    tracker.record("p2", 3)
+    assert tracker.group_percentile(["p1", "p2", "p3"], 1) == 3
+    assert tracker.group_percentile(["p3"], 0.5) is None
+
+
+def test_remove():
+    tracker = LatencyTracker()
+    tracker.record("p1", 1)
+    tracker.remove("p1")
+    assert tracker.count("p1") == 0
+    assert tracker.percentile("p1", 0.5) is None
+
+
+def test_invalid_window_size():
+    with pytest.raises(ValueError):
+        LatencyTracker(window_size=0)
@@ -0,0 +1,61 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.config import LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.cache.memory import MemoryCache
+from src.config.config import LLMProviderConfig
+from src.utils.context import RouterContext, router_context
+from tests.mock_provider import MockLLMProvider
+from src.load_balance.latency import LatencyTracker
+from src.load_balance.latency_based import LatencyBasedBalancer
+from src.load_balance.rpm_tpm_manager import RpmTpmManager
+
+
+@pytest.fixture
+def balancer():
+    cache = MemoryCache(LogConfiguration())
+    instance = LatencyBasedBalancer(
+        cache,
+        LogConfiguration(),
+        LoadBalancerConfig(strategy=LoadBalancerStrategy.LATENCY_BASED_BALANCER),
+        RpmTpmManager(cache, LogConfiguration()),
+        LatencyTracker(),
+    )
+    instance.logger = MagicMock()
+    return instance
+
+
+@pytest.fixture(autouse=True)
+def context():
+    token = router_context.set(RouterContext(model_group="group1", token_count=10))
+    yield
+    router_context.reset(token)
+
+
+@pytest.mark.asyncio
+async def test_select_lowest_latency(balancer):
+    fast = LLMProviderConfig(model_id="fast", impl=MockLLMProvider())
+    slow = LLMProviderConfig(model_id="slow", impl=MockLLMProvider())
+    for _ in range(5):
+        balancer.latency_tracker.record(fast.id, 0.1)
+        balancer.latency_tracker.record(slow.id, 1)
+    for _ in range(10):
+        assert await balancer.schedule_provider("group1", [slow, fast]) is fast
+
+
+@pytest.mark.asyncio
+async def test_unmeasured_provider_is_preferred(balancer):
+    measured = LLMProviderConfig(model_id="measured", impl=MockLLMProvider())
+    unmeasured = LLMProviderConfig(model_id="unmeasured", impl=MockLLMProvider())
+    balancer.latency_tracker.record(measured.id, 0.1)
+    assert await balancer.schedule_provider("group1", [measured, unmeasured]) is unmeasured
+
+
+@pytest.mark.asyncio
+async def test_skip_provider_over_tpm_limit(balancer):
+    small = LLMProviderConfig(model_id="small", impl=MockLLMProvider(), tpm=5)
+    large = LLMProviderConfig(model_id="large", impl=MockLLMProvider(), tpm=100)
+    balancer.latency_tracker.record(large.id, 10)
+    assert await balancer.schedule_provider("group1", [small, large]) is large
+    assert await balancer.schedule_provider("group1", [small]) is None
@@ -0,0 +1,121 @@
+import pytest
+
+from src.config import CooldownConfig, LogConfiguration, OutlierDetectionConfig
+from src.cache.memory import MemoryCache
+from src.config.config import LLMProviderConfig
+from tests.mock_provider import MockLLMProvider
+from src.load_balance.latency import LatencyTracker
+from src.load_balance.provider_manager import ProviderStatusManager
+from src.load_balance.outlier_detection import OutlierDetector
+
+
+def create_providers(n):
+    return [LLMProviderConfig(model_id=f"p{i}", impl=MockLLMProvider()) for i in range(n)]
+
+
+def create_detector(**kwargs):
+    tracker = LatencyTracker()
+    config = OutlierDetectionConfig(enabled=True, min_samples=5, **kwargs)
+    return OutlierDetector(LogConfiguration(), config, tracker), tracker
+
+
+def record(tracker, provider, seconds, n=10):
+    for _ in range(n):
+        tracker.record(provider.id, seconds)
+
+
+def test_slow_provider_is_ejected():
+    detector, tracker = create_detector()
+    providers = create_providers(3)
+    record(tracker, providers[0], 0.1)
+    record(tracker, providers[1], 0.12)
+    record(tracker, providers[2], 1)
+    assert detector.filter("group1", providers) == providers[:2]
+    assert detector.is_ejected(providers[2].id)
+    # The samples are kept, so the balancers sharing the tracker don't rank it as the fastest provider.
+    assert tracker.count(providers[2].id) == 10
+
+
+def test_no_ejection_within_threshold():
+    detector, tracker = create_detector(threshold_multiplier=3)
+    providers = create_providers(2)
+    record(tracker, providers[0], 0.1)
+    record(tracker, providers[1], 0.25)
+    assert detector.filter("group1", providers) == providers
+
+
+def test_not_enough_samples():
+    detector, tracker = create_detector()
+    providers = create_providers(2)
+    record(tracker, providers[0], 0.1)
+    record(tracker, providers[1], 10, n=4)
+    assert detector.filter("group1", providers) == providers
+
+
+def test_max_ejection_percent():
+    detector, tracker = create_detector(max_ejection_percent=25)
+    providers = create_providers(4)
+    record(tracker, providers[0], 0.1)
+    record(tracker, providers[1], 0.1)
+    record(tracker, providers[2], 1)
+    record(tracker, providers[3], 2)
+    # Only the slowest provider is ejected.
+    assert detector.filter("group1", providers) == providers[:3]
+
+
+def test_ejection_expires_and_grows():
+    detector, tracker = create_detector(base_ejection_seconds=10, max_ejection_seconds=15)
+    providers = create_providers(2)
+    record(tracker, providers[0], 0.1)
+    record(tracker, providers[1], 1)
+    detector.evaluate(providers, now=0)
+    assert detector.ejected[providers[1].id] == 10
+    record(tracker, providers[1], 1)
+    detector.evaluate(providers, now=11)
+    assert detector.ejected[providers[1].id] == 26
+    detector.evaluate(providers, now=30)
+    assert providers[1].id not in detector.ejected
+
+
+def test_judged_by_new_latencies_after_ejection():
+    detector, tracker = create_detector(base_ejection_seconds=10)
+    providers = create_providers(2)
+    record(tracker, providers[0], 0.1)
+    record(tracker, providers[1], 1)
+    detector.evaluate(providers, now=0)
+    assert providers[1].id in detector.ejected
+    # Not enough latencies since the ejection, the old ones don't eject it again.
+    record(tracker, providers[1], 0.1, n=4)
+    detector.evaluate(providers, now=11)
+    assert providers[1].id not in detector.ejected
+    record(tracker, providers[1], 0.1)
+    detector.evaluate(providers, now=12)
+    assert providers[1].id not in detector.ejected
+
+
+def test_lazy_evaluation():
+    detector, tracker = create_detector(interval_seconds=60)
+    providers = create_providers(2)
+    assert detector.filter("group1", providers) == providers
+    record(tracker, providers[0], 0.1)
+    record(tracker, providers[1], 1)
+    # Not evaluated again within the interval.
+    assert detector.filter("group1", providers) == providers
+
+
+@pytest.mark.asyncio
+async def test_provider_manager_filters_ejected():
+    log_cfg = LogConfiguration()
+    providers = create_providers(2)
+    tracker = LatencyTracker()
+    manager = ProviderStatusManager(
+        log_cfg,
+        {"group1": providers},
+        CooldownConfig(),
+        MemoryCache(log_cfg),
+        latency_tracker=tracker,
+        outlier_detection_config=OutlierDetectionConfig(enabled=True, min_samples=5),
+    )
+    record(tracker, providers[0], 0.1)
+    record(tracker, providers[1], 1)
+    assert await manager.get_available_providers("group1") == providers[:1]
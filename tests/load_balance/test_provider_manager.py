@@ -1,4 +1,5 @@
 import time
+import asyncio
 from unittest.mock import AsyncMock, MagicMock
 
 import httpx
@@ -6,15 +7,20 @@ import pytest
 
 from src.config import CooldownConfig, LogConfiguration, AllowedFailsPolicy
 from src.cache.base import BaseCache
+from src.cache.memory import MemoryCache
 from src.config.config import LLMProviderConfig
 from tests.mock_provider import MockLLMProvider
 from src.exceptions.exceptions import (
     RateLimitError,
     BadRequestError,
+    APIConnectionError,
     ModelGroupNotFound,
+    AuthenticationError,
+    InternalServerError,
     RequestTimeoutError,
 )
-from src.load_balance.provider_manager import CooldownState, ProviderStatusManager
+from src.load_balance.circuit_breaker import CircuitState, CooldownState
+from src.load_balance.provider_manager import ProviderStatusManager
 
 
 @pytest.fixture
@@ -50,6 +56,14 @@ def mock_rate_limit():
     )
 
 
+@pytest.fixture
+def mock_rate_limit_retry_after():
+    return RateLimitError(
+        "Rate limit error",
+        response=httpx.Response(status_code=429, headers={"Retry-After": "30"}, request=httpx.Request("GET", "")),
+    )
+
+
 @pytest.fixture
 def mock_request_timeout():
     return RequestTimeoutError(
@@ -71,6 +85,7 @@ def mock_manager(mock_cache, mock_providers):
         ),
         general_allowed_fails=2,
         cooldown_seconds=300,
+        min_request_volume=0,
     )
     return ProviderStatusManager(
         log_cfg=LogConfiguration(), provider_groups=provider_groups, cooldown_config=cooldown_config, cache=mock_cache
@@ -86,27 +101,77 @@ async def test_get_available_providers(mock_manager):
 
 @pytest.mark.asyncio
 async def test_get_available_providers_with_cooldown(mock_manager, mock_cache):
-    cooldown_data = CooldownState(
-        exception="RateLimitError", timestamp=time.time() - 100, cooldown_seconds=300
-    ).serialize()
-    mock_cache.async_get_value.side_effect = [cooldown_data, None]
+    await mock_manager._add_cooldown("RateLimitError", "provider1")
     providers = await mock_manager.get_available_providers("group1")
     assert len(providers) == 1
     assert "provider1" not in [p.id for p in providers]
     assert "provider2" in [p.id for p in providers]
+    # The circuit breaker is held in memory, the cache is not read.
+    mock_cache.async_get_value.assert_not_awaited()
 
 
 @pytest.mark.asyncio
-async def test_critical_exception_cooldown(mock_manager, mock_cache, mock_rate_limit):
-    exception = mock_rate_limit
-    await mock_manager.try_add_cooldown("provider1", exception)
-    mock_cache.async_set_value.assert_awaited_once()
+async def test_cooldown_spans_minute_boundary(mock_manager):
+    await mock_manager._add_cooldown("RateLimitError", "provider1")
+    circuit = mock_manager.circuit_breaker.circuits["provider1"]
+    circuit.opened_at = time.time() - 299
+    assert await mock_manager._is_in_cooldown("provider1")
+    circuit.opened_at = time.time() - 301
+    assert not await mock_manager._is_in_cooldown("provider1")
+
+
+@pytest.mark.asyncio
+async def test_critical_exception_cooldown(mock_manager, mock_cache, mock_rate_limit_retry_after):
+    await mock_manager.try_add_cooldown("provider1", mock_rate_limit_retry_after)
+    assert mock_manager.circuit_breaker.state("provider1") == CircuitState.OPEN
+    await mock_manager.try_add_cooldown("provider2", AuthenticationError("unauthorized"))
+    assert mock_manager.circuit_breaker.state("provider2") == CircuitState.OPEN
+    mock_cache.async_set_value.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_burst_of_failures_keeps_the_cooldown(mock_cache, mock_providers):
+    manager = ProviderStatusManager(LogConfiguration(), {"group1": mock_providers}, CooldownConfig(), mock_cache)
+    listener = MagicMock()
+    manager.add_cooldown_listener(listener)
+    await asyncio.gather(
+        *(manager.try_add_cooldown("provider1", AuthenticationError("unauthorized")) for _ in range(5))
+    )
+    circuit = manager.circuit_breaker.circuits["provider1"]
+    assert circuit.state == CircuitState.OPEN
+    assert circuit.cooldown_seconds == CooldownConfig().cooldown_seconds
+    assert circuit.open_count == 1
+    listener.assert_called_once()
 
 
 @pytest.mark.asyncio
-async def test_non_critical_exception_cooldown(mock_manager, mock_cache, mock_bad_request):
+async def test_rate_limit_without_retry_after_is_counted(mock_manager, mock_rate_limit):
+    # RateLimitErrorAllowedFails is 1.
+    await mock_manager.try_add_cooldown("provider1", mock_rate_limit)
+    assert mock_manager.circuit_breaker.state("provider1") == CircuitState.CLOSED
+    await mock_manager.try_add_cooldown("provider1", mock_rate_limit)
+    assert mock_manager.circuit_breaker.state("provider1") == CircuitState.OPEN
+
+
+@pytest.mark.asyncio
+async def test_isolated_server_error_at_high_volume(mock_cache, mock_providers):
+    manager = ProviderStatusManager(
+        log_cfg=LogConfiguration(),
+        provider_groups={"group1": mock_providers},
+        cooldown_config=CooldownConfig(),
+        cache=mock_cache,
+    )
+    for _ in range(10_000):
+        await manager.record_success("provider1")
+    await manager.try_add_cooldown("provider1", InternalServerError("internal error"))
+    assert manager.circuit_breaker.state("provider1") == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_non_critical_exception_cooldown(mock_manager, mock_bad_request):
     exception = mock_bad_request
-    mock_cache.async_get_value.return_value = 2
+    assert not await mock_manager._should_cooldown("provider1", exception)
+    assert not await mock_manager._should_cooldown("provider1", exception)
     result = await mock_manager._should_cooldown("provider1", exception)
     assert result is True
 
@@ -119,13 +184,42 @@ async def test_temp_exception_no_cooldown(mock_manager, mock_request_timeout):
 
 
 @pytest.mark.asyncio
-async def test_failure_count_increment(mock_manager, mock_cache, mock_request_timeout):
+async def test_failure_count_increment(mock_manager, mock_request_timeout):
     exception = mock_request_timeout
-    mock_cache.async_get_value.side_effect = [None, 1, 2]
     assert not await mock_manager._should_cooldown("provider1", exception)
     assert not await mock_manager._should_cooldown("provider1", exception)
     assert await mock_manager._should_cooldown("provider1", exception)
-    assert mock_cache.async_set_value.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_successes_lower_failure_rate(mock_manager, mock_request_timeout):
+    exception = mock_request_timeout
+    for _ in range(10):
+        await mock_manager.record_success("provider1")
+    for _ in range(5):
+        assert not await mock_manager._should_cooldown("provider1", exception)
+    # 6 failures out of 16 calls.
+    assert not await mock_manager._should_cooldown("provider1", exception)
+    for _ in range(3):
+        await mock_manager._should_cooldown("provider1", exception)
+    # 10 failures out of 20 calls reach the threshold.
+    assert await mock_manager._should_cooldown("provider1", exception)
+
+
+@pytest.mark.asyncio
+async def test_min_request_volume(mock_manager, mock_request_timeout):
+    mock_manager.min_request_volume = 5
+    for _ in range(4):
+        assert not await mock_manager._should_cooldown("provider1", mock_request_timeout)
+    assert await mock_manager._should_cooldown("provider1", mock_request_timeout)
+
+
+@pytest.mark.asyncio
+async def test_cooldown_resets_failure_rate(mock_manager, mock_request_timeout):
+    for _ in range(3):
+        await mock_manager._should_cooldown("provider1", mock_request_timeout)
+    await mock_manager._add_cooldown("RequestTimeoutError", "provider1")
+    assert mock_manager.failure_rate_tracker.stats("provider1") == (0, 0)
 
 
 @pytest.mark.asyncio
@@ -156,9 +250,70 @@ async def test_model_group_not_found(mock_manager):
 
 
 @pytest.mark.asyncio
-async def test_lock_mechanism(mock_manager):
-    key = "test_key"
-    lock1 = mock_manager._fetch_or_create_lock(key)
-    lock2 = mock_manager._fetch_or_create_lock(key)
-    assert lock1 is lock2
-    assert key in mock_manager._locks
+async def test_half_open_failure_reopens(mock_manager, mock_request_timeout):
+    await mock_manager._add_cooldown("RateLimitError", "provider1")
+    mock_manager.circuit_breaker.circuits["provider1"].opened_at = 0
+    assert [p.id for p in await mock_manager.get_available_providers("group1")] == ["provider1", "provider2"]
+    mock_manager.on_provider_selected("provider1")
+    # The only probe slot is taken.
+    assert [p.id for p in await mock_manager.get_available_providers("group1")] == ["provider2"]
+    await mock_manager.try_add_cooldown("provider1", mock_request_timeout)
+    assert mock_manager.circuit_breaker.state("provider1") == CircuitState.OPEN
+    assert mock_manager.circuit_breaker.circuits["provider1"].cooldown_seconds == 600
+
+
+@pytest.mark.asyncio
+async def test_feedback_pipeline(mock_manager, mock_rate_limit_retry_after):
+    mock_manager.report("provider1", mock_rate_limit_retry_after, 0.1)
+    mock_manager.report("provider2", None, 0.1)
+    assert mock_manager.circuit_breaker.state("provider1") == CircuitState.CLOSED
+    await mock_manager.flush_feedback()
+    assert mock_manager.circuit_breaker.state("provider1") == CircuitState.OPEN
+    assert mock_manager.circuit_breaker.state("provider2") == CircuitState.CLOSED
+    await mock_manager.stop_feedback_task()
+
+
+@pytest.mark.asyncio
+async def test_feedback_ignores_non_provider_errors(mock_manager):
+    mock_manager.report("provider1", ValueError("bug"), 0.1)
+    await mock_manager.flush_feedback()
+    assert "provider1" not in mock_manager.circuit_breaker.circuits
+    await mock_manager.stop_feedback_task()
+
+
+@pytest.mark.asyncio
+async def test_connection_error_is_counted(mock_manager):
+    error = APIConnectionError(request=httpx.Request("GET", ""))
+    assert not mock_manager._is_cooldown_required_for_exception(error)
+    assert not await mock_manager._should_cooldown("provider1", error)
+
+
+@pytest.mark.asyncio
+async def test_circuits_are_synced_between_routers(mock_cache, mock_providers):
+    config = CooldownConfig(shared_cache=MemoryCache(LogConfiguration()), shared_sync_seconds=0.01)
+    managers = [
+        ProviderStatusManager(LogConfiguration(), {"group1": mock_providers}, config, mock_cache) for _ in range(2)
+    ]
+    notified = []
+    managers[1].add_cooldown_listener(notified.append)
+    try:
+        assert len(await managers[1].get_available_providers("group1")) == 2
+        await managers[0].try_add_cooldown("provider1", AuthenticationError("unauthorized"))
+        await asyncio.sleep(0.05)
+        assert [p.id for p in await managers[1].get_available_providers("group1")] == ["provider2"]
+        assert notified == ["provider1"]
+    finally:
+        for manager in managers:
+            await manager.stop_sync_task()
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_provider_notifies_listeners(mock_manager):
+    notified = []
+    mock_manager.add_cooldown_listener(notified.append)
+    mock_manager.mark_unhealthy("provider1")
+    mock_manager.mark_unhealthy("provider1")
+    assert [p.id for p in await mock_manager.get_available_providers("group1")] == ["provider2"]
+    mock_manager.mark_healthy("provider1")
+    assert len(await mock_manager.get_available_providers("group1")) == 2
+    assert notified == ["provider1", "provider1"]
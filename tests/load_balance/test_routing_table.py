@@ -0,0 +1,140 @@
+import json
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.config import CooldownConfig, LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.cache.memory import MemoryCache
+from src.config.config import LLMProviderConfig
+from src.utils.context import RouterContext, router_context
+from tests.mock_provider import MockLLMProvider
+from src.load_balance.routing_table import RoutingTable, RoutingSnapshot
+from src.load_balance.rpm_tpm_manager import RpmTpmManager
+from src.load_balance.provider_manager import ProviderStatusManager
+
+
+def create_provider(model_id, **kwargs):
+    return LLMProviderConfig(model_id=model_id, impl=MockLLMProvider(), **kwargs)
+
+
+def create_table(providers, strategy=LoadBalancerStrategy.RANDOM, capacity_dimension=None):
+    log_cfg = LogConfiguration()
+    cache = MemoryCache(log_cfg)
+    lb_config = LoadBalancerConfig(
+        strategy=strategy,
+        capacity_dimension=capacity_dimension,
+        routing_table_enabled=True,
+        routing_table_refresh_ms=60_000,
+    )
+    status_manager = ProviderStatusManager(log_cfg, {"group1": providers}, CooldownConfig(), cache)
+    rpm_tpm_manager = RpmTpmManager(cache, log_cfg)
+    return RoutingTable(log_cfg, lb_config, status_manager, rpm_tpm_manager), cache
+
+
+@pytest.fixture(autouse=True)
+def context():
+    token = router_context.set(RouterContext(model_group="group1", token_count=0))
+    yield
+    router_context.reset(token)
+
+
+def test_snapshot_candidates_weighted():
+    p1 = create_provider("p1", weight=0)
+    p2 = create_provider("p2", weight=10)
+    snapshot = RoutingSnapshot(providers=(p1, p2), cumulative_weights=(0, 10))
+    for _ in range(20):
+        assert next(snapshot.candidates()) is p2
+
+
+def test_snapshot_candidates_empty():
+    assert list(RoutingSnapshot(providers=()).candidates()) == []
+
+
+def test_snapshot_candidates_spread_within_tier():
+    p1, p2, p3 = create_provider("p1", cost=1), create_provider("p2", cost=1), create_provider("p3", cost=2)
+    snapshot = RoutingSnapshot.ranked([p3, p2, p1], lambda p: p.cost)
+    assert snapshot.tiers == (2, 3)
+    firsts = set()
+    for _ in range(50):
+        candidates = [p.model_id for p in snapshot.candidates()]
+        assert sorted(candidates[:2]) == ["p1", "p2"]
+        assert candidates[2] == "p3"
+        firsts.add(candidates[0])
+    assert firsts == {"p1", "p2"}
+
+
+@pytest.mark.asyncio
+async def test_schedule_from_snapshot():
+    p1 = create_provider("p1")
+    table, _ = create_table([p1])
+    try:
+        assert await table.schedule_provider("group1", 10) is p1
+        table.provider_status_manager.get_available_providers = AsyncMock(return_value=[])
+        # The snapshot is reused, the provider status is not checked on the hot path.
+        assert await table.schedule_provider("group1", 10) is p1
+        table.provider_status_manager.get_available_providers.assert_not_awaited()
+    finally:
+        await table.stop_refresh_task()
+
+
+@pytest.mark.asyncio
+async def test_schedule_skips_provider_over_limit():
+    p1 = create_provider("p1", rpm=1)
+    p2 = create_provider("p2", rpm=10)
+    table, cache = create_table([p1, p2])
+    try:
+        await table.refresh("group1")
+        key = f"rpm:group1:{p1.id}:{router_context.get().start_minute_str()}"
+        await cache.async_set_value(key, json.dumps({"used": 1, "occupying": 0}))
+        for _ in range(10):
+            assert await table.schedule_provider("group1", 0) is p2
+        assert table._dirty.is_set()
+    finally:
+        await table.stop_refresh_task()
+
+
+@pytest.mark.asyncio
+async def test_lowest_tpm_snapshot_is_ordered():
+    p1 = create_provider("p1", tpm=1000)
+    p2 = create_provider("p2", tpm=1000)
+    table, cache = create_table([p1, p2], strategy=LoadBalancerStrategy.LOWEST_TPM_BALANCER)
+    key = f"tpm:group1:{p1.id}:{router_context.get().start_minute_str()}"
+    await cache.async_set_value(key, json.dumps({"used": 500, "occupying": 0}))
+    snapshot = await table.refresh("group1")
+    assert snapshot.ordered
+    assert snapshot.providers == (p2, p1)
+    assert snapshot.tiers == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_cooldown_invalidates_table():
+    p1 = create_provider("p1")
+    table, _ = create_table([p1])
+    try:
+        await table.start_refresh_task()
+        assert not table._dirty.is_set()
+        await table.provider_status_manager._add_cooldown("RateLimitError", p1.id)
+        assert table._dirty.is_set()
+    finally:
+        await table.stop_refresh_task()
+    assert table.refresh_task is None
+
+
+@pytest.mark.asyncio
+async def test_capacity_snapshot_weights():
+    p1 = create_provider("p1", rpm=10)
+    p2 = create_provider("p2", rpm=30)
+    table, _ = create_table([p1, p2], strategy=LoadBalancerStrategy.CAPACITY_BASED_BALANCER, capacity_dimension="rpm")
+    snapshot = await table.refresh("group1")
+    assert snapshot.cumulative_weights == (10, 40)
+
+
+@pytest.mark.asyncio
+async def test_group_strategy_snapshot():
+    cheap = create_provider("cheap", cost=0.1)
+    expensive = create_provider("expensive", cost=1)
+    table, _ = create_table([expensive, cheap])
+    table.group_load_balancer_config = {"group1": LoadBalancerConfig(strategy=LoadBalancerStrategy.COST_BASED_BALANCER)}
+    snapshot = await table.refresh("group1")
+    assert snapshot.ordered
+    assert snapshot.providers == (cheap, expensive)
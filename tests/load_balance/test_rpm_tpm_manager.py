@@ -28,6 +28,7 @@ def create_router_context():
 @pytest.mark.asyncio
 async def test_increase_rpm_occupied(mock_rpm_tpm_manager, mock_cache):
     router_context.set(create_router_context())
+    mock_cache.async_get_value.return_value = None
     with patch.object(router_context.get(), "start_minute_str", return_value="202310101200"):
         await mock_rpm_tpm_manager.increase_rpm_occupied("group1", "provider1", 2)
 
@@ -40,14 +41,26 @@ async def test_increase_rpm_occupied(mock_rpm_tpm_manager, mock_cache):
 @pytest.mark.asyncio
 async def test_increase_tpm_occupied(mock_rpm_tpm_manager, mock_cache):
     router_context.set(create_router_context())
+    mock_cache.async_get_value.return_value = None
     with patch.object(router_context.get(), "start_minute_str", return_value="202310101200"):
         await mock_rpm_tpm_manager.increase_tpm_occupied("group1", "provider1", 5)
 
-    expected_key = "rpm:group1:provider1:202310101200"
+    expected_key = "tpm:group1:provider1:202310101200"
     expected_usage = json.dumps({"used": 0, "occupying": 5})
     mock_cache.async_set_value.assert_awaited_once_with(expected_key, expected_usage, ttl=86400)
 
 
+@pytest.mark.asyncio
+async def test_increase_occupied_keeps_usage(mock_rpm_tpm_manager, mock_cache):
+    router_context.set(create_router_context())
+    mock_cache.async_get_value.return_value = json.dumps({"used": 4, "occupying": 1})
+    with patch.object(router_context.get(), "start_minute_str", return_value="202310101200"):
+        await mock_rpm_tpm_manager.increase_rpm_occupied("group1", "provider1")
+
+    expected_usage = json.dumps({"used": 4, "occupying": 2})
+    mock_cache.async_set_value.assert_awaited_once_with("rpm:group1:provider1:202310101200", expected_usage, ttl=86400)
+
+
 @pytest.mark.asyncio
 async def test_update_rpm_used_usage(mock_rpm_tpm_manager, mock_cache):
     router_context.set(create_router_context())
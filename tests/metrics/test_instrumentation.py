@@ -0,0 +1,178 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.config import (
+    MetricsConfig,
+    LogConfiguration,
+    LoadBalancerConfig,
+    ResponseCacheConfig,
+    LoadBalancerStrategy,
+)
+from src.metrics import Instrumentation
+from src.model.input import UserParams, RouterParams
+from src.router.retry import RetryManager
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from src.utils.context import RouterContext, router_context
+from tests.mock_provider import MockStreamingProvider
+from src.exceptions.exceptions import RequestTimeoutError
+from src.load_balance.rpm_tpm_manager import RpmTpmManager
+
+
+class FakeSpan:
+    def __init__(self, tracer, name, attributes, start_time=None):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.start_time = start_time
+        self.end_time = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc_info):
+        self.tracer.ended.append(self.name)
+
+    def end(self, end_time=None):
+        self.end_time = end_time
+        self.tracer.ended.append(self.name)
+
+
+class FakeTracer:
+    def __init__(self):
+        self.spans: list[FakeSpan] = []
+        self.ended: list[str] = []
+
+    def start_as_current_span(self, name, attributes=None):
+        self.spans.append(FakeSpan(self, name, attributes))
+        return self.spans[-1]
+
+    def start_span(self, name, start_time=None, attributes=None):
+        self.spans.append(FakeSpan(self, name, attributes, start_time))
+        return self.spans[-1]
+
+
+def create_router(metrics_config: MetricsConfig, **kwargs) -> Router:
+    return Router(
+        RouterConfig(
+            llm_provider_group={
+                "chat": [LLMProviderConfig(model_id="chat", impl=MockStreamingProvider(["a"]), rpm=10)]
+            },
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            metrics_config=metrics_config,
+            **kwargs,
+        )
+    )
+
+
+def test_disabled_stage_is_noop():
+    metrics = Instrumentation(MetricsConfig(), tracer=FakeTracer())
+    with metrics.stage("request", "chat"):
+        pass
+    metrics.observe("retry_wait", "chat", None, 1.0)
+
+    assert metrics.stage_seconds.labels() == []
+    assert metrics.tracer is None
+
+
+def test_stage_spans():
+    tracer = FakeTracer()
+    metrics = Instrumentation(MetricsConfig(enabled=True, tracing_enabled=True), tracer=tracer)
+    with metrics.stage("provider_call", "chat", "p1"):
+        pass
+    metrics.observe("retry_wait", "chat", "p1", 0.5)
+
+    assert metrics.stage_seconds.count(("provider_call", "chat", "p1")) == 1
+    assert metrics.stage_seconds.sum(("retry_wait", "chat", "p1")) == 0.5
+    assert [s.name for s in tracer.spans] == ["llm_router.provider_call", "llm_router.retry_wait"]
+    assert tracer.spans[0].attributes == {"llm_router.group": "chat", "llm_router.provider": "p1"}
+    assert tracer.spans[1].end_time - tracer.spans[1].start_time == 500_000_000
+    assert tracer.ended == ["llm_router.provider_call", "llm_router.retry_wait"]
+
+
+@pytest.mark.asyncio
+async def test_router_stages():
+    router = create_router(MetricsConfig(enabled=True))
+    try:
+        assert await router.async_completion(RouterParams(model_group="chat", text="hi")) == "a"
+        provider_id = router.routing_state.providers("chat")[0].id
+        stages = {labels[0]: labels for labels in router.metrics.stage_seconds.labels()}
+        assert set(stages) == {
+            "request",
+            "token_counter",
+            "get_available_providers",
+            "schedule_provider",
+            "provider_call",
+            "usage_accounting",
+        }
+        assert stages["provider_call"] == ("provider_call", "chat", provider_id)
+
+        text = await router.metrics_text()
+        assert f'llm_router_rpm_limit{{group="chat",provider="{provider_id}"}} 10' in text
+        assert f'llm_router_circuit_state{{group="chat",provider="{provider_id}"}} 0' in text
+        assert "\nllm_router_feedback_queue_size " in text
+        assert 'llm_router_stage_seconds_count{stage="request",group="chat",provider=""} 1' in text
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_router_counters():
+    router = create_router(
+        MetricsConfig(), response_cache_config=ResponseCacheConfig(enabled=True), single_flight_enabled=True
+    )
+    try:
+        for _ in range(3):
+            await router.async_completion(RouterParams(model_group="chat", text="hi"))
+        text = await router.metrics_text()
+        assert "# TYPE llm_router_response_cache_hits_total counter" in text
+        assert "\nllm_router_response_cache_hits_total 2" in text
+        assert "\nllm_router_response_cache_misses_total 1" in text
+        assert "\nllm_router_response_cache_similar_hits_total 0" in text
+        assert "\nllm_router_coalesced_requests_total 0" in text
+        # Hedging is disabled.
+        assert "\nllm_router_hedged_requests_total " not in text
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_router_metrics_disabled():
+    router = create_router(MetricsConfig())
+    try:
+        await router.async_completion(RouterParams(model_group="chat", text="hi"))
+        assert router.metrics.stage_seconds.labels() == []
+        assert "llm_router_circuit_state" in await router.metrics_text()
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_retry_wait():
+    metrics = Instrumentation(MetricsConfig(enabled=True))
+    outcomes = iter([RequestTimeoutError(message="timeout"), "ok"])
+
+    async def wrapped(_param):
+        await manager.occupy()
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    manager = RetryManager(
+        async_wrapped_fn=wrapped,
+        log_cfg=LogConfiguration(),
+        rpm_tpm_manager=AsyncMock(spec=RpmTpmManager),
+        fix_wait_seconds=0.01,
+        metrics=metrics,
+    )
+    token = router_context.set(RouterContext(model_group="chat", provider_id="p1", token_count=1))
+    try:
+        assert await manager.execute(UserParams(model_group="chat", text="hi")) == "ok"
+    finally:
+        router_context.reset(token)
+
+    assert metrics.stage_seconds.count(("retry_wait", "chat", "p1")) == 1
+    assert metrics.stage_seconds.sum(("retry_wait", "chat", "p1")) == pytest.approx(0.01)
+    assert metrics.stage_seconds.count(("usage_accounting", "chat", "p1")) == 3
@@ -0,0 +1,63 @@
+import pytest
+
+from src.config import MetricsConfig
+from src.metrics import MetricsRegistry
+
+
+def test_histogram_buckets_and_quantile():
+    histogram = MetricsRegistry().histogram("latency", "The latency.", ("group",), (0.1, 0.5, 1.0))
+    for value in (0.05, 0.1, 0.3, 0.7, 2.0):
+        histogram.observe(("g",), value)
+
+    assert histogram.count(("g",)) == 5
+    assert histogram.sum(("g",)) == pytest.approx(3.15)
+    assert histogram.count(("other",)) == 0
+    # The median is the third observation, in the (0.1, 0.5] bucket.
+    assert histogram.quantile(("g",), 0.5) == pytest.approx(0.3)
+    assert histogram.quantile(("g",), 1.0) == 1.0
+    assert histogram.quantile(("other",), 0.5) is None
+
+
+def test_render():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency", "The latency.", ("group",), (0.1, 1.0))
+    gauge = registry.gauge("queue", "The queue.", ())
+    labeled = registry.gauge("usage", "The usage.", ("provider",))
+    counter = registry.counter("hits_total", "The hits.", ())
+    histogram.observe(("g",), 0.1)
+    histogram.observe(("g",), 0.5)
+    gauge.set((), 3)
+    labeled.set(('a"b',), 1)
+    counter.set((), 5)
+
+    assert registry.render().splitlines() == [
+        "# HELP latency The latency.",
+        "# TYPE latency histogram",
+        'latency_bucket{group="g",le="0.1"} 1',
+        'latency_bucket{group="g",le="1.0"} 2',
+        'latency_bucket{group="g",le="+Inf"} 2',
+        'latency_sum{group="g"} 0.6',
+        'latency_count{group="g"} 2',
+        "# HELP queue The queue.",
+        "# TYPE queue gauge",
+        "queue 3",
+        "# HELP usage The usage.",
+        "# TYPE usage gauge",
+        'usage{provider="a\\"b"} 1',
+        "# HELP hits_total The hits.",
+        "# TYPE hits_total counter",
+        "hits_total 5",
+    ]
+
+
+def test_duplicate_metric():
+    registry = MetricsRegistry()
+    registry.gauge("queue", "The queue.", ())
+    with pytest.raises(ValueError, match="already registered"):
+        registry.gauge("queue", "The queue.", ())
+
+
+@pytest.mark.parametrize("buckets", [(), (1.0, 0.5), (0.0, 1.0), (1.0, 1.0)])
+def test_invalid_buckets(buckets):
+    with pytest.raises(ValueError, match="Invalid buckets value"):
+        MetricsConfig(buckets=buckets)
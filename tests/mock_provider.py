@@ -1,4 +1,5 @@
-from typing import Any
+import asyncio
+from typing import Any, Optional, AsyncIterator
 
 from src.model import ChatMessageValues
 from src.router.base_provider import BaseLLMProvider
@@ -8,5 +9,71 @@ class MockLLMProvider(BaseLLMProvider):
     async def completion(self, messages: list[ChatMessageValues], **kwargs) -> Any:
         pass
 
-    async def embedding(self, texts: list[str], **kwargs) -> Any:
+    async def embedding(self, *_args, **_kwargs) -> Any:
         pass
+
+
+class MockStreamingProvider(BaseLLMProvider):
+    def __init__(
+        self,
+        chunks: list[str],
+        delay: float = 0,
+        first_chunk_errors: Optional[list[Exception]] = None,
+        error_after: Optional[int] = None,
+    ):
+        """
+        A local streaming provider.
+        :param chunks: the chunks of each stream.
+        :param delay: the delay before each chunk.
+        :param first_chunk_errors: raised by the successive streams before their first chunk.
+        :param error_after: raise an error after this many chunks.
+        """
+        self.chunks = chunks
+        self.delay = delay
+        self.first_chunk_errors = list(first_chunk_errors or [])
+        self.error_after = error_after
+        self.streams = 0
+        self.closed = 0
+        # The chunks read from the streams.
+        self.read = 0
+
+    async def completion(self, *_args, **_kwargs) -> Any:
+        return "".join(self.chunks)
+
+    async def stream_completion(self, *_args, **_kwargs) -> AsyncIterator[Any]:
+        self.streams += 1
+        try:
+            if self.first_chunk_errors:
+                raise self.first_chunk_errors.pop(0)
+            for i, chunk in enumerate(self.chunks):
+                if self.error_after is not None and i == self.error_after:
+                    raise RuntimeError("stream broken")
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                self.read += 1
+                yield chunk
+        finally:
+            self.closed += 1
+
+
+class MockEmbeddingProvider(BaseLLMProvider):
+    def __init__(self, delay: float = 0, errors: Optional[list[Exception]] = None):
+        """
+        A local embedding provider, the embedding of a text is its length.
+        :param delay: the delay of each call.
+        :param errors: raised by the successive calls.
+        """
+        self.delay = delay
+        self.errors = list(errors or [])
+        self.batches: list[list[str]] = []
+
+    async def completion(self, *_args, **_kwargs) -> Any:
+        pass
+
+    async def embedding(self, param) -> list[Any]:
+        self.batches.append(param.texts)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.errors:
+            raise self.errors.pop(0)
+        return [len(text) for text in param.texts]
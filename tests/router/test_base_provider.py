@@ -37,3 +37,14 @@ async def test_completion(mock_external_call):
 
     assert result == "mocked"
     mock_external_call.assert_awaited_once_with(mock_param)
+
+
+@pytest.mark.asyncio
+@patch.object(ConcreteLLMProvider, "external_call", new_callable=AsyncMock)
+async def test_default_stream_completion(mock_external_call):
+    provider = ConcreteLLMProvider()
+    mock_external_call.return_value = "mocked"
+
+    chunks = [chunk async for chunk in provider.stream_completion(UserParams(model_group="m", text="t"))]
+
+    assert chunks == ["mocked"]
@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.config import LoadBalancerConfig, LoadBalancerStrategy
+from src.model.input import RouterParams
+from src.router.batch import run_batch
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import DEFAULT_BATCH_CONCURRENCY, Router
+from tests.mock_provider import MockStreamingProvider
+
+
+class Completion:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.started = 0
+
+    async def __call__(self, params: RouterParams):
+        self.started += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # The later items complete first.
+            await asyncio.sleep(0.01 / (1 + int(params.text)))
+            if params.text == "3":
+                raise ValueError("bad item")
+            return params.text
+        finally:
+            self.in_flight -= 1
+
+
+def create_params(n):
+    return (RouterParams(model_group="group1", text=str(i)) for i in range(n))
+
+
+@pytest.mark.asyncio
+async def test_unordered_batch():
+    completion = Completion()
+    results = [r async for r in run_batch(completion, create_params(10), concurrency=4)]
+    assert sorted(r.index for r in results) == list(range(10))
+    assert completion.max_in_flight == 4
+    failed = [r for r in results if not r.ok]
+    assert len(failed) == 1
+    assert failed[0].index == 3
+    assert isinstance(failed[0].exception, ValueError)
+    assert all(r.result == str(r.index) for r in results if r.ok)
+
+
+@pytest.mark.asyncio
+async def test_ordered_batch():
+    completion = Completion()
+    results = [r async for r in run_batch(completion, create_params(10), concurrency=3, ordered=True)]
+    assert [r.index for r in results] == list(range(10))
+    assert completion.max_in_flight == 3
+
+
+@pytest.mark.asyncio
+async def test_async_iterable_input():
+    async def params():
+        for p in create_params(5):
+            yield p
+
+    results = [r async for r in run_batch(Completion(), params(), concurrency=2, ordered=True)]
+    assert [r.index for r in results] == list(range(5))
+
+
+@pytest.mark.asyncio
+async def test_batch_pulls_input_lazily():
+    completion = Completion()
+    infinite = (RouterParams(model_group="group1", text="0") for _ in itertools.count())
+    batch = run_batch(completion, infinite, concurrency=2, ordered=True)
+    for _ in range(5):
+        await anext(batch)
+    await batch.aclose()
+    # At most the reorder window is started ahead of the consumer.
+    assert completion.started <= 5 + 4
+
+
+@pytest.mark.asyncio
+async def test_invalid_concurrency():
+    with pytest.raises(ValueError):
+        await anext(run_batch(Completion(), create_params(1), concurrency=0))
+
+
+@pytest.mark.asyncio
+async def test_router_batch_completion():
+    impl = MockStreamingProvider(["a", "b"])
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"group1": [LLMProviderConfig(model_id="p1", impl=impl)]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+        )
+    )
+    try:
+        results = [r async for r in router.abatch_completion(create_params(5), ordered=True)]
+        assert [r.result for r in results] == ["ab"] * 5
+        assert [r async for r in router.abatch_completion([])] == []
+    finally:
+        await router.close()
+
+
+def test_batch_concurrency():
+    providers = [MagicMock(id="p1", rpm=600), MagicMock(id="p2", rpm=600)]
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"group1": providers, "group2": [MagicMock(id="p3", rpm=None)]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+        )
+    )
+    # 20 requests per second with the default latency of 1s.
+    assert router._batch_concurrency("group1") == 20
+    for _ in range(10):
+        router.latency_tracker.record("p1", 0.5)
+    assert router._batch_concurrency("group1") == 10
+    assert router._batch_concurrency("group2") == DEFAULT_BATCH_CONCURRENCY
@@ -0,0 +1,176 @@
+import json
+import asyncio
+from typing import Any
+
+import pytest
+
+from src.config import LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.model.input import RouterParams
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.config.loader import ConfigLoader
+from src.router.router import Router
+from src.utils.context import router_context
+from src.router.base_provider import BaseLLMProvider
+from src.router.config_watcher import ConfigWatcher
+
+
+class NamedProvider(BaseLLMProvider):
+    def __init__(self, name: str, release: asyncio.Event = None):
+        self.name = name
+        self.release = release
+        self.states = []
+
+    def __repr__(self):
+        return f"NamedProvider({self.name})"
+
+    async def completion(self, *_args, **_kwargs) -> Any:
+        self.states.append(router_context.get().routing_state)
+        if self.release:
+            await self.release.wait()
+        return self.name
+
+
+def create_config(*providers, strategy=LoadBalancerStrategy.RANDOM):
+    return RouterConfig(
+        llm_provider_group={"g": list(providers)},
+        load_balancer_config=LoadBalancerConfig(strategy=strategy),
+    )
+
+
+def params():
+    return RouterParams(model_group="g", text="t")
+
+
+@pytest.mark.asyncio
+async def test_update_keeps_state_of_unchanged_providers():
+    p1 = LLMProviderConfig(model_id="m1", impl=NamedProvider("p1"), rpm=100)
+    router = Router(create_config(p1))
+    try:
+        assert await router.async_completion(params()) == "p1"
+        await router.rpm_tpm_manager.increase_rpm_occupied("g", p1.id)
+        await router.provider_status_manager.circuit_breaker.open(p1.id, "RateLimitError")
+        load_balancer = router.load_balancer
+
+        # The same provider is rebuilt by the new config, e.g. by a config file reload.
+        p1_again = LLMProviderConfig(model_id="m1", impl=p1.impl, rpm=100)
+        p2 = LLMProviderConfig(model_id="m2", impl=NamedProvider("p2"))
+        await router.update_config(create_config(p1_again, p2))
+        assert p1_again.id == p1.id
+        assert await router.rpm_tpm_manager.rpm_usage_at_minute("g", p1.id) >= 1
+        assert not router.provider_status_manager.circuit_breaker.is_available(p1.id)
+        assert router.load_balancer is load_balancer
+        # p1 is still in cooldown.
+        assert await router.async_completion(params()) == "p2"
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_update_keeps_state_of_provider_with_new_limits():
+    p1 = LLMProviderConfig(model_id="m1", impl=NamedProvider("p1"), rpm=100)
+    router = Router(create_config(p1))
+    try:
+        assert await router.async_completion(params()) == "p1"
+        await router.rpm_tpm_manager.increase_rpm_occupied("g", p1.id)
+        await router.provider_status_manager.circuit_breaker.open(p1.id, "RateLimitError")
+        router.latency_tracker.record(p1.id, 0.5)
+
+        p1_limited = LLMProviderConfig(model_id="m1", impl=p1.impl, rpm=10, tpm=1000)
+        await router.update_config(create_config(p1_limited))
+        assert p1_limited.id == p1.id
+        assert await router.rpm_tpm_manager.rpm_usage_at_minute("g", p1.id) == 2
+        assert not router.provider_status_manager.circuit_breaker.is_available(p1.id)
+        assert router.latency_tracker.count(p1.id) == 1
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_update_rebuilds_changed_load_balancer():
+    router = Router(create_config(LLMProviderConfig(model_id="m1", impl=NamedProvider("p1"))))
+    try:
+        p2 = LLMProviderConfig(model_id="m2", impl=NamedProvider("p2"), cost=1)
+        await router.update_config(create_config(p2, strategy=LoadBalancerStrategy.COST_BASED_BALANCER))
+        assert router.load_balancers["g"] is router.load_balancer
+        assert type(router.load_balancer).__name__ == "CostBasedBalancer"
+        assert await router.async_completion(params()) == "p2"
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_request_in_flight_completes_against_old_state():
+    release = asyncio.Event()
+    old_impl = NamedProvider("old", release)
+    router = Router(create_config(LLMProviderConfig(model_id="old", impl=old_impl)))
+    try:
+        old_state = router.routing_state
+        task = asyncio.create_task(router.async_completion(params()))
+        while not old_impl.states:
+            await asyncio.sleep(0.001)
+        await router.update_config(create_config(LLMProviderConfig(model_id="new", impl=NamedProvider("new"))))
+        assert router.routing_state is not old_state
+        release.set()
+        assert await task == "old"
+        assert old_impl.states == [old_state]
+        assert await router.async_completion(params()) == "new"
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_config_watcher(tmp_path):
+    path = tmp_path / "router.json"
+    data = {
+        "load_balancer_config": {"strategy": "random-balancer"},
+        "llm_provider_group": {"g": [{"model_id": "m1", "impl": "tests.mock_provider:MockLLMProvider"}]},
+    }
+    path.write_text(json.dumps(data))
+    loader = ConfigLoader()
+    router = Router(loader.load(path))
+    watcher = ConfigWatcher(router.log_cfg, path, router.update_config, loader, interval_seconds=0.01)
+    try:
+        ids = [p.id for p in router.routing_state.providers("g")]
+        assert not await watcher.check()
+
+        data["llm_provider_group"]["g"].append({"model_id": "m2", "impl": "tests.mock_provider:MockLLMProvider"})
+        path.write_text(json.dumps(data))
+        await watcher.start_watch_task()
+        while len(router.routing_state.providers("g")) < 2:
+            await asyncio.sleep(0.01)
+        assert [p.id for p in router.routing_state.providers("g")][:1] == ids
+
+        # An invalid config is skipped.
+        path.write_text("{")
+        assert not await watcher.check()
+        assert len(router.routing_state.providers("g")) == 2
+    finally:
+        await watcher.stop_watch_task()
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_config_watcher_retries_failed_update(tmp_path):
+    path = tmp_path / "router.json"
+    data = {
+        "load_balancer_config": {"strategy": "random-balancer"},
+        "llm_provider_group": {"g": [{"model_id": "m1", "impl": "tests.mock_provider:MockLLMProvider"}]},
+    }
+    path.write_text(json.dumps(data))
+    applied = []
+
+    async def on_change(cfg):
+        if not applied:
+            applied.append(None)
+            raise RuntimeError("update failed")
+        applied.append(cfg)
+
+    watcher = ConfigWatcher(LogConfiguration(), path, on_change)
+    data["llm_provider_group"]["g"][0]["model_id"] = "m2"
+    path.write_text(json.dumps(data))
+    with pytest.raises(RuntimeError):
+        await watcher.check()
+    # The file is unchanged, but the failed update is applied again.
+    assert await watcher.check()
+    assert applied[-1].llm_provider_group["g"][0].model_id == "m2"
+    assert not await watcher.check()
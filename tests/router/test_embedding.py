@@ -0,0 +1,179 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.config import (
+    RetryConfig,
+    FallbackConfig,
+    LogConfiguration,
+    LoadBalancerConfig,
+    EmbeddingBatchConfig,
+    LoadBalancerStrategy,
+)
+from src.model.input import EmbeddingParams
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from tests.mock_provider import MockEmbeddingProvider
+from src.router.embedding import EmbeddingBatcher, split_batches
+from src.exceptions.exceptions import InvalidInputError, DeadlineExceededError
+
+
+def create_router(groups, batch_config=None, fallback_config=None):
+    return Router(
+        RouterConfig(
+            llm_provider_group=groups,
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            retry_config=RetryConfig(max_attempt=2),
+            fallback_config=fallback_config or FallbackConfig(),
+            embedding_batch_config=batch_config or EmbeddingBatchConfig(),
+        )
+    )
+
+
+def test_split_batches():
+    assert split_batches([1, 1, 1, 1, 1], 2, None) == [(0, 2), (2, 4), (4, 5)]
+    assert split_batches([3, 3, 3, 10, 1], 10, 6) == [(0, 2), (2, 3), (3, 4), (4, 5)]
+    assert split_batches([5], 10, 1) == [(0, 1)]
+
+
+def test_embedding_params():
+    with pytest.raises(InvalidInputError):
+        EmbeddingParams(model_group="g", texts=[])
+    with pytest.raises(ValueError):
+        EmbeddingBatchConfig(max_batch_size=0)
+    with pytest.raises(ValueError):
+        EmbeddingBatchConfig(linger_seconds=-1)
+
+
+def create_batcher(send, linger_seconds=0.01, max_size=4, max_tokens=None):
+    return EmbeddingBatcher(LogConfiguration(), linger_seconds, max_size, max_tokens, send)
+
+
+@pytest.mark.asyncio
+async def test_batcher_merges_within_linger():
+    batches = []
+
+    async def send(texts, token_count):
+        batches.append((texts, token_count))
+        return [t.upper() for t in texts]
+
+    batcher = create_batcher(send)
+    first = batcher.submit(["a"], [1])
+    second = batcher.submit(["b", "c"], [1, 1])
+    assert await asyncio.gather(*first, *second) == ["A", "B", "C"]
+    assert batches == [(["a", "b", "c"], 3)]
+    # A full batch is sent without waiting for the linger window.
+    futures = batcher.submit(["d", "e", "f", "g", "h"], [1, 2, 1, 1, 1])
+    await asyncio.wait_for(asyncio.gather(*futures[:4]), 0.005)
+    await batcher.close()
+    assert batches[1:] == [(["d", "e", "f", "g"], 5), (["h"], 1)]
+    assert (batcher.batches, batcher.texts) == (3, 8)
+
+
+@pytest.mark.asyncio
+async def test_batcher_failure():
+    async def send(_texts, _token_count):
+        raise ValueError("broken")
+
+    batcher = create_batcher(send, max_tokens=2)
+    futures = batcher.submit(["a", "b", "c"], [1, 1, 1])
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert batcher.batches == 2
+
+
+@pytest.mark.asyncio
+async def test_batcher_isolates_rejected_request():
+    batches = []
+
+    async def send(texts, _token_count):
+        batches.append(texts)
+        if "bad" in texts:
+            raise InvalidInputError(message="invalid input")
+        return [t.upper() for t in texts]
+
+    batcher = create_batcher(send)
+    first = batcher.submit(["a", "bad"], [1, 1])
+    second = batcher.submit(["b"], [1])
+    third = batcher.submit(["c"], [1])
+    await batcher.close()
+    assert all(isinstance(f.exception(), InvalidInputError) for f in first)
+    assert [f.result() for f in second + third] == ["B", "C"]
+    assert batches[0] == ["a", "bad", "b", "c"]
+    assert sorted(batches[1:]) == [["a", "bad"], ["b"], ["c"]]
+
+
+@pytest.mark.asyncio
+async def test_embedding_batching_isolates_rejected_request():
+    provider = LLMProviderConfig(model_id="p1", impl=MockEmbeddingProvider(errors=[InvalidInputError(message="bad")]))
+    router = create_router({"emb": [provider]}, EmbeddingBatchConfig(enabled=True, linger_seconds=0.05))
+    try:
+        results = await asyncio.gather(
+            router.async_embedding(EmbeddingParams(model_group="emb", texts=["a"])),
+            router.async_embedding(EmbeddingParams(model_group="emb", texts=["bb"])),
+        )
+        assert results == [[1], [2]]
+        assert provider.impl.batches[0] == ["a", "bb"]
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_embedding_splits_by_provider_limits():
+    impl = MockEmbeddingProvider()
+    provider = LLMProviderConfig(model_id="p1", impl=impl, max_batch_size=2)
+    router = create_router({"emb": [provider]})
+    router.rpm_tpm_manager.update_tpm_used_usage = AsyncMock()
+    try:
+        result = await router.async_embedding(EmbeddingParams(model_group="emb", texts=["a", "bb", "ccc", "dddd", "e"]))
+        assert result == [1, 2, 3, 4, 1]
+        assert sorted(impl.batches) == [["a", "bb"], ["ccc", "dddd"], ["e"]]
+        # TPM is charged per batch with the tokens of its texts.
+        assert router.rpm_tpm_manager.update_tpm_used_usage.await_count == 3
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_embedding_batching_merges_concurrent_requests():
+    impl = MockEmbeddingProvider()
+    provider = LLMProviderConfig(model_id="p1", impl=impl)
+    router = create_router({"emb": [provider]}, EmbeddingBatchConfig(enabled=True, linger_seconds=0.05))
+    try:
+        results = await asyncio.gather(
+            *(router.async_embedding(EmbeddingParams(model_group="emb", texts=["x" * i])) for i in range(1, 11))
+        )
+        assert results == [[i] for i in range(1, 11)]
+        assert len(impl.batches) == 1
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_embedding_batching_deadline():
+    provider = LLMProviderConfig(model_id="p1", impl=MockEmbeddingProvider(delay=1))
+    router = create_router({"emb": [provider]}, EmbeddingBatchConfig(enabled=True, linger_seconds=0.01))
+    try:
+        with pytest.raises(DeadlineExceededError):
+            await router.async_embedding(EmbeddingParams(model_group="emb", texts=["a"], timeout_seconds=0.1))
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_embedding_fallback():
+    broken = MockEmbeddingProvider(errors=[InvalidInputError(message="invalid input")])
+    backup = MockEmbeddingProvider()
+    router = create_router(
+        {
+            "emb": [LLMProviderConfig(model_id="p1", impl=broken)],
+            "emb2": [LLMProviderConfig(model_id="p2", impl=backup)],
+        },
+        fallback_config=FallbackConfig(allow_fallback=True, degraded_map={"emb": ["emb2"]}),
+    )
+    try:
+        assert await router.async_embedding(EmbeddingParams(model_group="emb", texts=["ab"])) == [2]
+        assert backup.batches == [["ab"]]
+    finally:
+        await router.close()
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from src.config import FallbackMode, FallbackConfig, LogConfiguration
+from src.router.fallback import FallbackExecutor
+
+
+def create_executor(mode, stagger_seconds=0.05):
+    return FallbackExecutor(LogConfiguration(), FallbackConfig(mode=mode, stagger_seconds=stagger_seconds))
+
+
+class Calls:
+    def __init__(self, outcomes):
+        """
+        :param outcomes: group -> (delay in seconds or an event to wait for, result or exception)
+        """
+        self.outcomes = outcomes
+        self.started = []
+        self.cancelled = []
+
+    async def __call__(self, group):
+        self.started.append(group)
+        delay, outcome = self.outcomes[group]
+        try:
+            if isinstance(delay, asyncio.Event):
+                await delay.wait()
+            else:
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(group)
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.mark.asyncio
+async def test_sequential():
+    calls = Calls({"a": (0, ValueError("a")), "b": (0.1, "b"), "c": (0, "c")})
+    assert await create_executor(FallbackMode.SEQUENTIAL).execute(["a", "b", "c"], calls) == "b"
+    # The next group is started only when the previous one failed.
+    assert calls.started == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_staggered():
+    calls = Calls({"a": (1, "a"), "b": (0.01, "b"), "c": (0, "c")})
+    assert await create_executor(FallbackMode.STAGGERED).execute(["a", "b", "c"], calls) == "b"
+    assert calls.started == ["a", "b"]
+    assert calls.cancelled == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_race():
+    calls = Calls({"a": (1, "a"), "b": (1, "b"), "c": (0.01, "c")})
+    assert await create_executor(FallbackMode.RACE).execute(["a", "b", "c"], calls) == "c"
+    assert sorted(calls.cancelled) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_all_failed_raises_last_exception():
+    calls = Calls({"a": (0.02, ValueError("a")), "b": (0, KeyError("b"))})
+    with pytest.raises(KeyError):
+        await create_executor(FallbackMode.RACE).execute(["a", "b"], calls)
+
+
+@pytest.mark.asyncio
+async def test_discard_losers():
+    # Both calls succeed at once, the result of the loser is discarded.
+    done = asyncio.Event()
+    calls = Calls({"a": (done, "a"), "b": (done, "b")})
+    discarded = []
+
+    async def discard(result):
+        discarded.append(result)
+
+    asyncio.get_running_loop().call_later(0.01, done.set)
+    assert await create_executor(FallbackMode.RACE).execute(["a", "b"], calls, discard) == "a"
+    assert discarded == ["b"]
+
+
+@pytest.mark.parametrize(
+    "degraded_map, chains",
+    [
+        # One level of fallback, the fallback groups don't fall back themselves.
+        ({"a": ["b", "c"], "b": ["d"]}, {"a": ("b", "c"), "b": ("d",)}),
+        ({"a": ["b", "b"]}, {"a": ("b",)}),
+        ({"a": ["b", "c"], "b": ["c"]}, {"a": ("b", "c"), "b": ("c",)}),
+    ],
+)
+def test_compile_chains(degraded_map, chains):
+    assert FallbackConfig(degraded_map=degraded_map).chains == chains
+
+
+@pytest.mark.parametrize(
+    "degraded_map", [{"a": ["b", "a"]}, {"a": ["b"], "b": ["a"]}, {"a": ["b"], "b": ["c"], "c": ["a"]}]
+)
+def test_fallback_cycle(degraded_map):
+    with pytest.raises(ValueError, match="cycle"):
+        FallbackConfig(degraded_map=degraded_map)
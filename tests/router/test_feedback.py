@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+from src.config import RetryConfig, CooldownConfig, LoadBalancerConfig, LoadBalancerStrategy
+from src.model.input import UserParams, RouterParams
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from src.router.base_provider import BaseLLMProvider
+from src.exceptions.exceptions import InternalServerError, RetryExhaustedError
+
+
+class FlakyProvider(BaseLLMProvider):
+    def __init__(self, name: str, fail_after: int = None):
+        self.name = name
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def __repr__(self):
+        return f"<FlakyProvider {self.name}>"
+
+    async def completion(self, _param: UserParams) -> Any:
+        self.calls += 1
+        # Simulate the network I/O.
+        await asyncio.sleep(0)
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise InternalServerError("provider is down")
+        return self.name
+
+
+@pytest.mark.asyncio
+async def test_traffic_shifts_away_from_failing_provider():
+    flaky = FlakyProvider("flaky", fail_after=10)
+    healthy = FlakyProvider("healthy")
+    router = Router(
+        RouterConfig(
+            llm_provider_group={
+                "group1": [
+                    LLMProviderConfig(model_id="flaky", impl=flaky),
+                    LLMProviderConfig(model_id="healthy", impl=healthy),
+                ]
+            },
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            retry_config=RetryConfig(max_attempt=1),
+            cooldown_config=CooldownConfig(cooldown_seconds=60),
+        )
+    )
+    try:
+        results = []
+        for _ in range(200):
+            try:
+                results.append(await router.async_completion(RouterParams(model_group="group1", text="t")))
+            except RetryExhaustedError:
+                results.append("error")
+        # The provider is put in cooldown once its failures in the window are as many as its 10 successes,
+        # all the traffic goes to the healthy provider afterwards.
+        assert 10 <= flaky.calls - flaky.fail_after <= 12
+        assert results.count("error") <= 12
+        assert results[-100:] == ["healthy"] * 100
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_success_feedback_records_latency():
+    healthy = FlakyProvider("healthy")
+    provider = LLMProviderConfig(model_id="healthy", impl=healthy)
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"group1": [provider]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+        )
+    )
+    try:
+        for _ in range(3):
+            await router.async_completion(RouterParams(model_group="group1", text="t"))
+        await router.provider_status_manager.flush_feedback()
+        assert router.latency_tracker.count(provider.id) == 3
+    finally:
+        await router.close()
+    assert router.provider_status_manager.feedback_task is None
@@ -0,0 +1,147 @@
+import asyncio
+from unittest.mock import Mock, MagicMock
+
+import pytest
+
+from src.config import HedgingConfig, LogConfiguration
+from src.utils.context import RouterContext, router_context
+from src.router.hedging import HedgingManager
+from src.load_balance.latency import LatencyTracker
+from src.load_balance.rpm_tpm_manager import RpmTpmManager
+
+
+@pytest.fixture
+def rpm_tpm_manager():
+    return Mock(spec=RpmTpmManager)
+
+
+@pytest.fixture(autouse=True)
+def context():
+    token = router_context.set(RouterContext(model_group="group1", token_count=10, provider_id="p1"))
+    yield
+    router_context.reset(token)
+
+
+def create_manager(rpm_tpm_manager, **kwargs):
+    return HedgingManager(LogConfiguration(), HedgingConfig(enabled=True, **kwargs), LatencyTracker(), rpm_tpm_manager)
+
+
+def create_call(latencies: dict, errors: dict = None):
+    cancelled = []
+
+    async def call(p):
+        try:
+            await asyncio.sleep(latencies[p.id])
+        except asyncio.CancelledError:
+            cancelled.append(p.id)
+            raise
+        if errors and p.id in errors:
+            raise errors[p.id]
+        return p.id
+
+    return call, cancelled
+
+
+async def pick(_primary):
+    return MagicMock(id="p2")
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins(rpm_tpm_manager):
+    manager = create_manager(rpm_tpm_manager, delay_seconds=0.01, budget_ratio=1)
+    call, cancelled = create_call({"p1": 1, "p2": 0})
+    result = await manager.execute("group1", [], MagicMock(id="p1"), call, pick)
+    await asyncio.sleep(0)
+    assert result == "p2"
+    assert cancelled == ["p1"]
+    assert manager.hedged_requests == 1
+    assert router_context.get().provider_id == "p2"
+    rpm_tpm_manager.increase_rpm_occupied.assert_called_once_with("group1", "p2")
+    rpm_tpm_manager.increase_tpm_occupied.assert_called_once_with("group1", "p2", 10)
+    rpm_tpm_manager.release_rpm_occupied.assert_called_once_with("group1", "p1")
+    rpm_tpm_manager.release_tpm_occupied.assert_called_once_with("group1", "p1", 10)
+
+
+@pytest.mark.asyncio
+async def test_primary_wins_after_hedging(rpm_tpm_manager):
+    manager = create_manager(rpm_tpm_manager, delay_seconds=0.01, budget_ratio=1)
+    call, cancelled = create_call({"p1": 0.05, "p2": 1})
+    result = await manager.execute("group1", [], MagicMock(id="p1"), call, pick)
+    await asyncio.sleep(0)
+    assert result == "p1"
+    assert cancelled == ["p2"]
+    assert router_context.get().provider_id == "p1"
+    rpm_tpm_manager.release_rpm_occupied.assert_called_once_with("group1", "p2")
+
+
+@pytest.mark.asyncio
+async def test_no_hedging_when_primary_is_fast(rpm_tpm_manager):
+    manager = create_manager(rpm_tpm_manager, delay_seconds=0.5, budget_ratio=1)
+    call, _ = create_call({"p1": 0, "p2": 0})
+    assert await manager.execute("group1", [], MagicMock(id="p1"), call, pick) == "p1"
+    assert manager.hedged_requests == 0
+    rpm_tpm_manager.increase_rpm_occupied.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_budget_limits_hedging(rpm_tpm_manager):
+    manager = create_manager(rpm_tpm_manager, delay_seconds=0, budget_ratio=0.5)
+    call, _ = create_call({"p1": 0.01, "p2": 0})
+    for _ in range(4):
+        await manager.execute("group1", [], MagicMock(id="p1"), call, pick)
+    assert manager.hedged_requests == 2
+
+
+@pytest.mark.asyncio
+async def test_both_calls_fail(rpm_tpm_manager):
+    manager = create_manager(rpm_tpm_manager, delay_seconds=0, budget_ratio=1)
+    call, _ = create_call({"p1": 0.01, "p2": 0}, errors={"p1": ValueError("p1"), "p2": KeyError("p2")})
+    with pytest.raises(ValueError):
+        await manager.execute("group1", [], MagicMock(id="p1"), call, pick)
+    rpm_tpm_manager.release_rpm_occupied.assert_called_once_with("group1", "p2")
+
+
+@pytest.mark.asyncio
+async def test_no_secondary_provider(rpm_tpm_manager):
+    manager = create_manager(rpm_tpm_manager, delay_seconds=0, budget_ratio=1)
+    call, _ = create_call({"p1": 0.01})
+
+    async def pick_none(_primary):
+        return None
+
+    assert await manager.execute("group1", [], MagicMock(id="p1"), call, pick_none) == "p1"
+    assert manager.budget == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_pick_keeps_primary(rpm_tpm_manager):
+    manager = create_manager(rpm_tpm_manager, delay_seconds=0, budget_ratio=1)
+    call, cancelled = create_call({"p1": 0.01})
+
+    async def pick_failing(_primary):
+        raise RuntimeError("scheduling failed")
+
+    assert await manager.execute("group1", [], MagicMock(id="p1"), call, pick_failing) == "p1"
+    assert cancelled == []
+    assert manager.hedged_requests == 0
+    assert manager.budget == 1
+    rpm_tpm_manager.increase_rpm_occupied.assert_not_called()
+
+
+def test_learned_threshold(rpm_tpm_manager):
+    manager = create_manager(rpm_tpm_manager, min_samples=10, percentile=0.9)
+    providers = [MagicMock(id="p1"), MagicMock(id="p2")]
+    assert manager.threshold("group1", providers) is None
+    for i in range(1, 11):
+        manager.latency_tracker.record("p1" if i % 2 else "p2", i)
+    manager._thresholds.clear()
+    assert manager.threshold("group1", providers) == 9
+
+
+def test_invalid_hedging_config():
+    with pytest.raises(ValueError):
+        HedgingConfig(percentile=0)
+    with pytest.raises(ValueError):
+        HedgingConfig(budget_ratio=2)
+    with pytest.raises(ValueError):
+        HedgingConfig(delay_seconds=-1)
@@ -0,0 +1,55 @@
+import sys
+import subprocess
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parents[2]
+# The packages which are loaded on first use, not when the router is imported.
+LAZY_PACKAGES = ("tiktoken", "tokenizers", "openai", "httpx")
+# A generous budget, the router imports in about 0.1s, the tokenizers and the OpenAI SDK added 0.4s.
+IMPORT_BUDGET_SECONDS = 1.0
+
+
+def python(code: str, *options: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *options, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True, timeout=60
+    )
+
+
+def import_times(module: str) -> dict[str, float]:
+    """
+    The cumulative import time of each module imported by `module`, in seconds, by `python -X importtime`.
+    :param module:
+    :return:
+    """
+    times = {}
+    for line in python(f"import {module}", "-X", "importtime").stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.parametrize("module", ["src.router.router", "src.server"])
+def test_import_is_lazy(module):
+    times = import_times(module)
+    loaded = sorted({name.split(".")[0] for name in times} & set(LAZY_PACKAGES))
+    assert loaded == []
+    slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:10]
+    assert times[module] < IMPORT_BUDGET_SECONDS, f"Import of {module} is slow: {slowest}"
+
+
+def test_token_counter_loads_on_first_use():
+    code = (
+        "import sys\n"
+        "from src.config import LogConfiguration\n"
+        "from src.token.counter import TokenCounter\n"
+        "tc = TokenCounter(LogConfiguration())\n"
+        "assert 'tiktoken' not in sys.modules\n"
+        "assert tc.token_counter(text='hello world') == 2\n"
+        "assert 'tiktoken' in sys.modules and 'tokenizers' not in sys.modules\n"
+    )
+    python(code)
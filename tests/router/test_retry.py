@@ -1,3 +1,4 @@
+import time
 from unittest.mock import Mock, AsyncMock, MagicMock, patch
 
 import pytest
@@ -95,11 +96,37 @@ async def test_retry_policy_limits(mock_wrapped_fn, retry_manager_with_policy):
 
 
 @pytest.mark.asyncio
-async def test_rpm_tpm_updates(mock_wrapped_fn, mock_rpm_tpm_manager, retry_manager):
+async def test_retry_skipped_before_deadline(mock_wrapped_fn, retry_manager):
+    ctx = RouterContext(model_group="m", provider_id="p", token_count=0, deadline=time.monotonic() + 0.5)
+    router_context.set(ctx)
+    mock_wrapped_fn.side_effect = [RateLimitError("rate limit")] * 3
+    # The retry wouldn't finish before the deadline.
+    retry_manager.expected_latency = lambda: 1
+    with pytest.raises(RetryExhaustedError):
+        await retry_manager.execute(UserParams(model_group="test_group", text="text"))
+    mock_wrapped_fn.assert_awaited_once()
+    # The rate limit backoff has a random wait up to 1s.
+    ctx.deadline = time.monotonic() + 5
+    retry_manager.expected_latency = lambda: None
+    mock_wrapped_fn.side_effect = [RateLimitError("rate limit"), "success"]
+    assert await retry_manager.execute(UserParams(model_group="test_group", text="text")) == "success"
+
+
+@pytest.mark.asyncio
+async def test_rpm_tpm_updates(mock_rpm_tpm_manager, retry_manager):
     ctx = RouterContext(model_group="test_group", provider_id="test_provider", token_count=100)
     token = router_context.set(ctx)
     try:
-        mock_wrapped_fn.side_effect = [RateLimitError("rate limit"), "success"]
+        outcomes = iter([RateLimitError("rate limit"), "success"])
+
+        async def call(_param):
+            await retry_manager.occupy()
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        retry_manager.async_wrapped_fn = call
         await retry_manager.execute(UserParams(model_group="test_group", text="text"))
         assert mock_rpm_tpm_manager.increase_rpm_occupied.call_count == 2
         assert mock_rpm_tpm_manager.release_rpm_occupied.call_count == 1
@@ -108,6 +135,17 @@ async def test_rpm_tpm_updates(mock_wrapped_fn, mock_rpm_tpm_manager, retry_mana
         router_context.reset(token)
 
 
+@pytest.mark.asyncio
+async def test_no_release_before_occupancy(mock_wrapped_fn, mock_rpm_tpm_manager, retry_manager):
+    router_context.set(RouterContext(model_group="m", token_count=1))
+    # The attempt failed before a provider was scheduled.
+    mock_wrapped_fn.side_effect = [RateLimitError("rate limit"), NoProviderAvailableError()]
+    with pytest.raises(NoProviderAvailableError):
+        await retry_manager.execute(UserParams(model_group="test_group", text="text"))
+    mock_rpm_tpm_manager.release_rpm_occupied.assert_not_called()
+    mock_rpm_tpm_manager.release_tpm_occupied.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_should_stop_exceptions(mock_wrapped_fn, retry_manager):
     router_context.set(RouterContext(model_group="m", provider_id="p", token_count=0))
@@ -1,18 +1,33 @@
+import asyncio
 import logging
 from unittest.mock import AsyncMock, MagicMock
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
-
-from src.config import RetryConfig, LogConfiguration, LoadBalancerConfig
+import pytest_asyncio
+
+from src.config import (
+    RetryConfig,
+    HedgingConfig,
+    CooldownConfig,
+    FallbackConfig,
+    LogConfiguration,
+    LoadBalancerConfig,
+    ResponseCacheConfig,
+)
 from src.model.input import RouterParams
+from src.load_balance import RandomBalancer, CostBasedBalancer, LatencyBasedBalancer
 from src.config.config import RouterConfig, LoadBalancerStrategy
 from src.router.router import Router
+from src.utils.context import router_context
 from src.exceptions.exceptions import (
     RateLimitError,
     InvalidInputError,
+    DeadlineExceededError,
     NoProviderAvailableError,
     ContentPolicyViolationError,
 )
+from src.load_balance.rpm_tpm_manager import RpmTpmManager
 
 
 @pytest.fixture
@@ -22,15 +37,17 @@ def mock_router_config():
         log_config=LogConfiguration(),
         load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
         retry_config=RetryConfig(max_attempt=3),
-        fallback_config=MagicMock(allow_fallback=True, degraded_map={"group1": ["group2"]}),
-        cooldown_config=MagicMock(),
+        fallback_config=FallbackConfig(allow_fallback=True, degraded_map={"group1": ["group2"]}),
+        cooldown_config=CooldownConfig(),
         timeout_seconds=30,
     )
 
 
-@pytest.fixture
-def router(mock_router_config):
-    return Router(mock_router_config)
+@pytest_asyncio.fixture(loop_scope="function")
+async def router(mock_router_config):
+    instance = Router(mock_router_config)
+    yield instance
+    await instance.close()
 
 
 @pytest.mark.asyncio
@@ -74,6 +91,103 @@ async def test_async_completion_fallback_triggered(caplog, router):
     assert caplog.text.count("No fallback model specified") == 0
 
 
+@pytest.mark.asyncio
+async def test_fallback_reuses_request_context(router):
+    mock_main_provider = MagicMock(id="p1")
+    mock_main_provider.impl.completion = AsyncMock(side_effect=InvalidInputError(message="invalid input"))
+    contexts = []
+
+    async def fallback_completion(_param):
+        contexts.append(router_context.get())
+        return "fallback_success"
+
+    mock_fallback_provider = MagicMock(id="p2")
+    mock_fallback_provider.impl.completion = fallback_completion
+    router.provider_status_manager.get_available_providers = AsyncMock(return_value=[])
+    router.load_balancer.schedule_provider = AsyncMock(side_effect=[mock_main_provider, mock_fallback_provider])
+    router.tc.token_counter = MagicMock(return_value=42)
+
+    assert await router.async_completion(RouterParams(model_group="group1", text="t")) == "fallback_success"
+    router.tc.token_counter.assert_called_once()
+    main_ctx = router_context.get()
+    assert (contexts[0].model_group, contexts[0].provider_id, contexts[0].token_count) == ("group2", "p2", 42)
+    assert (contexts[0].request_id, contexts[0].deadline) == (main_ctx.request_id, main_ctx.deadline)
+    assert main_ctx.provider_id == "p1"
+
+
+@pytest.mark.asyncio
+async def test_fallback_shares_input_without_mutating(router):
+    mock_main_provider = MagicMock()
+    mock_main_provider.impl.completion = AsyncMock(side_effect=InvalidInputError(message="invalid input"))
+    mock_fallback_provider = MagicMock()
+    mock_fallback_provider.impl.completion = AsyncMock(return_value="fallback_success")
+    router.provider_status_manager.get_available_providers = AsyncMock(
+        side_effect=[[mock_main_provider], [mock_fallback_provider]]
+    )
+    router.load_balancer.schedule_provider = AsyncMock(side_effect=[mock_main_provider, mock_fallback_provider])
+
+    messages = [{"role": "user", "content": "t"}]
+    arg = RouterParams(model_group="group1", messages=messages)
+    assert await router.async_completion(arg) == "fallback_success"
+    main_arg = mock_main_provider.impl.completion.call_args.args[0]
+    fallback_arg = mock_fallback_provider.impl.completion.call_args.args[0]
+    assert (main_arg.model_group, fallback_arg.model_group) == ("group1", "group2")
+    assert main_arg.retry_config is router.retry_config
+    assert fallback_arg.retry_config.max_attempt == 1
+    # The messages are shared, and the caller's params are unchanged.
+    assert main_arg.messages is messages and fallback_arg.messages is messages
+    assert (arg.model_group, arg.retry_config, arg.fallback_config) == ("group1", None, None)
+
+
+def test_normalize_input_keeps_complete_input(router):
+    arg = RouterParams(
+        model_group="group1", text="t", timeout_seconds=10, retry_config=RetryConfig(), fallback_config=MagicMock()
+    )
+    assert router.normalize_input(arg) is arg
+
+
+@pytest.mark.asyncio
+async def test_deadline_cancels_provider_call(router):
+    calls = []
+
+    async def slow_completion(param):
+        calls.append(param.timeout_seconds)
+        await asyncio.sleep(1)
+
+    mock_provider = MagicMock(id="p1")
+    mock_provider.impl.completion = slow_completion
+    router.provider_status_manager.get_available_providers = AsyncMock(return_value=[mock_provider])
+    router.load_balancer.schedule_provider = AsyncMock(return_value=mock_provider)
+    router.provider_status_manager.report = MagicMock()
+
+    with pytest.raises(DeadlineExceededError):
+        await router.async_completion(RouterParams(model_group="group1", text="t", timeout_seconds=0.05))
+    # The provider is given the remaining time, and the deadline is neither retried nor counted against it.
+    assert len(calls) == 1 and 0 < calls[0] <= 0.05
+    router.provider_status_manager.report.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_deadline_skips_fallback(router):
+    mock_main_provider = MagicMock(id="p1")
+    mock_main_provider.impl.completion = AsyncMock(side_effect=InvalidInputError(message="invalid input"))
+    router.provider_status_manager.get_available_providers = AsyncMock(return_value=[mock_main_provider])
+    router.load_balancer.schedule_provider = AsyncMock(return_value=mock_main_provider)
+    # The fallback group is slower than the time left.
+    router._expected_latency = lambda group: 10 if group == "group2" else None
+
+    with pytest.raises(DeadlineExceededError) as exc_info:
+        await router.async_completion(RouterParams(model_group="group1", text="t", timeout_seconds=5))
+    assert isinstance(exc_info.value.__cause__, InvalidInputError)
+    router.load_balancer.schedule_provider.assert_awaited_once()
+
+
+def test_default_timeout(router):
+    assert router.normalize_input(RouterParams(model_group="group1", text="t")).timeout_seconds == 30
+    with pytest.raises(InvalidInputError):
+        RouterParams(model_group="group1", text="t", timeout_seconds=0)
+
+
 @pytest.mark.asyncio
 async def test_async_completion_fallback_failed(caplog, router):
     caplog.set_level(logging.INFO)
@@ -90,7 +204,8 @@ async def test_async_completion_fallback_failed(caplog, router):
     with pytest.raises(InvalidInputError):
         await router.async_completion(RouterParams(model_group="group1", text="t"))
     assert caplog.text.count("Trying fallback model") == 1
-    assert caplog.text.count("No fallback model specified") == 1
+    # The fallback group is completed directly, it doesn't fall back again.
+    assert caplog.text.count("No fallback model specified") == 0
 
 
 @pytest.mark.asyncio
@@ -137,3 +252,184 @@ async def test_rpm_tpm_released_on_failure(router):
         await router.async_completion(RouterParams(model_group="group99", text="test"))
     router.rpm_tpm_manager.release_rpm_occupied.assert_awaited_once()
     router.rpm_tpm_manager.release_tpm_occupied.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_async_completion_with_routing_table():
+    mock_provider = MagicMock(id="test_provider", rpm=None, tpm=None)
+    mock_provider.impl.completion = AsyncMock(return_value="success")
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"group1": [mock_provider]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM, routing_table_enabled=True),
+        )
+    )
+    try:
+        router.load_balancer.schedule_provider = AsyncMock()
+        result = await router.async_completion(RouterParams(model_group="group1", text="t"))
+        assert result == "success"
+        assert "group1" in router.routing_table.snapshots
+        router.load_balancer.schedule_provider.assert_not_awaited()
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_async_completion_with_hedging():
+    slow_provider = MagicMock(id="slow", rpm=None, tpm=None)
+    fast_provider = MagicMock(id="fast", rpm=None, tpm=None)
+
+    async def slow_completion(*_args, **_kwargs):
+        await asyncio.sleep(1)
+        return "slow"
+
+    slow_provider.impl.completion = slow_completion
+    fast_provider.impl.completion = AsyncMock(return_value="fast")
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"group1": [slow_provider, fast_provider]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            hedging_config=HedgingConfig(enabled=True, delay_seconds=0.01, budget_ratio=1),
+        )
+    )
+    router.load_balancer.schedule_provider = AsyncMock(side_effect=[slow_provider, fast_provider])
+    result = await router.async_completion(RouterParams(model_group="group1", text="t"))
+    assert result == "fast"
+    assert router.hedging_manager.hedged_requests == 1
+    await router.provider_status_manager.flush_feedback()
+    assert router.latency_tracker.count("fast") == 1
+    # The cancelled primary is recorded with its elapsed time.
+    assert router.latency_tracker.samples("slow")[0] >= 0.01
+    # The occupancy of the loser is released, and that of the winner is converted to usage.
+    minute = router_context.get().start_minute_str()
+    for dimension, used in (("rpm", 1), ("tpm", router_context.get().token_count)):
+        for provider_id, expected in (("slow", 0), ("fast", used)):
+            data = await router.cache.async_get_value(f"{dimension}:group1:{provider_id}:{minute}")
+            assert RpmTpmManager.Usage.deserialize(data) == RpmTpmManager.Usage(used=expected, occupying=0)
+    await router.close()
+
+
+def test_group_load_balancers():
+    provider = MagicMock(id="p1", rpm=None, tpm=None)
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"chat": [provider], "batch": [provider], "embedding": [provider]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            group_load_balancer_config={
+                "chat": LoadBalancerConfig(strategy=LoadBalancerStrategy.LATENCY_BASED_BALANCER),
+                "batch": LoadBalancerConfig(strategy=LoadBalancerStrategy.COST_BASED_BALANCER),
+            },
+        )
+    )
+    assert isinstance(router.load_balancers["chat"], LatencyBasedBalancer)
+    assert isinstance(router.load_balancers["batch"], CostBasedBalancer)
+    assert router.load_balancers["embedding"] is router.load_balancer
+    assert isinstance(router.load_balancer, RandomBalancer)
+    assert router.routing_table is None
+
+
+@pytest.mark.asyncio
+async def test_async_completion_with_response_cache():
+    provider = MagicMock(id="p1", rpm=None, tpm=None)
+    provider.impl.completion = AsyncMock(return_value="cached")
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"group1": [provider]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            response_cache_config=ResponseCacheConfig(enabled=True),
+        )
+    )
+    try:
+        assert await router.async_completion(RouterParams(model_group="group1", text="t")) == "cached"
+        router.tc.token_counter = MagicMock()
+        router.load_balancer.schedule_provider = AsyncMock()
+        router.rpm_tpm_manager.increase_rpm_occupied = AsyncMock()
+        assert await router.async_completion(RouterParams(model_group="group1", text="t")) == "cached"
+        router.tc.token_counter.assert_not_called()
+        router.load_balancer.schedule_provider.assert_not_awaited()
+        router.rpm_tpm_manager.increase_rpm_occupied.assert_not_awaited()
+        assert provider.impl.completion.await_count == 1
+        # The cache is bypassed on demand.
+        router.tc.token_counter.return_value = 1
+        router.load_balancer.schedule_provider.return_value = provider
+        await router.async_completion(RouterParams(model_group="group1", text="t", use_cache=False))
+        assert provider.impl.completion.await_count == 2
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_fallback_result_is_cached_under_fallback_group():
+    main = MagicMock(id="main", rpm=None, tpm=None)
+    main.impl.completion = AsyncMock(side_effect=InvalidInputError(message="invalid input"))
+    backup = MagicMock(id="backup", rpm=None, tpm=None)
+    backup.impl.completion = AsyncMock(return_value="degraded")
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"group1": [main], "group2": [backup]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            fallback_config=FallbackConfig(allow_fallback=True, degraded_map={"group1": ["group2"]}),
+            response_cache_config=ResponseCacheConfig(enabled=True),
+        )
+    )
+    try:
+        assert await router.async_completion(RouterParams(model_group="group1", text="t")) == "degraded"
+        # The result is not served to the original group, it's tried again.
+        assert not (await router.response_cache.get(RouterParams(model_group="group1", text="t").request_key()))[0]
+        assert await router.async_completion(RouterParams(model_group="group2", text="t")) == "degraded"
+        assert backup.impl.completion.await_count == 1
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_async_completion_with_similar_prompt():
+    provider = MagicMock(id="p1", rpm=None, tpm=None)
+    provider.impl.completion = AsyncMock(return_value="cached")
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"group1": [provider]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            response_cache_config=ResponseCacheConfig(enabled=True, similarity_threshold=0.9),
+        )
+    )
+    try:
+        text = "Reply to ticket 1 about the export button which is greyed out since the last update"
+        similar = "reply to ticket 1, about the export button, which is greyed out since the last update!"
+        assert await router.async_completion(RouterParams(model_group="group1", text=text)) == "cached"
+        assert await router.async_completion(RouterParams(model_group="group1", text=similar)) == "cached"
+        assert provider.impl.completion.await_count == 1
+        assert router.response_cache.similar_hits == 1
+    finally:
+        await router.close()
+
+
+def test_sync_completion_from_threads():
+    loops = set()
+
+    async def completion(param):
+        loops.add(asyncio.get_running_loop())
+        await asyncio.sleep(0.001)
+        return param.text
+
+    provider = MagicMock(id="p1", rpm=None, tpm=None)
+    provider.impl.completion = completion
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"group1": [provider]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+        )
+    )
+    router.tc.token_counter = MagicMock(return_value=1)
+    router.load_balancer.schedule_provider = AsyncMock(return_value=provider)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(
+                executor.map(lambda i: router.completion(RouterParams(model_group="group1", text=str(i))), range(32))
+            )
+        assert results == [str(i) for i in range(32)]
+        # All the threads share the background loop of the router.
+        assert loops == {router.background_loop.loop}
+    finally:
+        router.shutdown()
+    assert not router.background_loop.is_running()
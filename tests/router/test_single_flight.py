@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+
+from src.config import RetryConfig, FallbackConfig, LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.model.input import RouterParams
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from tests.mock_provider import MockStreamingProvider
+from src.router.single_flight import SingleFlight
+from src.exceptions.exceptions import DeadlineExceededError
+
+
+class Call:
+    def __init__(self, result="result", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_are_coalesced():
+    single_flight = SingleFlight(LogConfiguration())
+    call = Call()
+    tasks = [asyncio.create_task(single_flight.do("key", call)) for _ in range(5)]
+    await asyncio.sleep(0)
+    call.release.set()
+    assert await asyncio.gather(*tasks) == ["result"] * 5
+    assert call.calls == 1
+    assert single_flight.coalesced == 4
+    assert not single_flight.calls
+
+
+@pytest.mark.asyncio
+async def test_exception_is_shared():
+    single_flight = SingleFlight(LogConfiguration())
+    call = Call(error=ValueError("boom"))
+    tasks = [asyncio.create_task(single_flight.do("key", call)) for _ in range(2)]
+    await asyncio.sleep(0)
+    call.release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert call.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_fail_followers():
+    single_flight = SingleFlight(LogConfiguration())
+    call = Call()
+    leader = asyncio.create_task(single_flight.do("key", call))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(single_flight.do("key", call))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0)
+    call.release.set()
+    assert await follower == "result"
+    assert leader.cancelled()
+    assert not call.cancelled
+
+
+@pytest.mark.asyncio
+async def test_call_is_cancelled_without_waiters():
+    single_flight = SingleFlight(LogConfiguration())
+    call = Call()
+    leader = asyncio.create_task(single_flight.do("key", call))
+    await asyncio.sleep(0)
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    await asyncio.sleep(0)
+    assert call.cancelled
+    assert not single_flight.calls
+
+
+@pytest.mark.asyncio
+async def test_sequential_calls_are_not_coalesced():
+    single_flight = SingleFlight(LogConfiguration())
+    call = Call()
+    call.release.set()
+    assert await single_flight.do("key", call) == "result"
+    assert await single_flight.do("key", call) == "result"
+    assert call.calls == 2
+    assert single_flight.coalesced == 0
+
+
+@pytest.mark.asyncio
+async def test_follower_times_out_on_its_own_deadline():
+    single_flight = SingleFlight(LogConfiguration())
+    call = Call()
+    leader = asyncio.create_task(single_flight.do("key", call, timeout=10))
+    await asyncio.sleep(0)
+    with pytest.raises(DeadlineExceededError):
+        await single_flight.do("key", call, timeout=0.01)
+    # The leader still waits for the call.
+    assert not call.cancelled
+    call.release.set()
+    assert await leader == "result"
+
+
+@pytest.mark.asyncio
+async def test_call_is_cancelled_when_all_callers_time_out():
+    single_flight = SingleFlight(LogConfiguration())
+    call = Call()
+    with pytest.raises(DeadlineExceededError):
+        await single_flight.do("key", call, timeout=0.01)
+    await asyncio.sleep(0)
+    assert call.cancelled
+    assert not single_flight.calls
+
+
+def test_request_key():
+    a = RouterParams(model_group="g", messages=[{"role": "user", "content": "hi"}], timeout_seconds=1)
+    b = RouterParams(model_group="g", messages=[{"content": "hi", "role": "user"}], timeout_seconds=2)
+    assert a.request_key() == b.request_key()
+    assert a.request_key() != RouterParams(model_group="g2", messages=a.messages).request_key()
+    assert a.request_key() != RouterParams(model_group="g", text="hi").request_key()
+    # The requests with other retry or fallback settings don't share a call, the timeout is per caller.
+    assert a.coalescing_key() == b.coalescing_key()
+    assert a.coalescing_key() != a.override(retry_config=RetryConfig(max_attempt=1)).coalescing_key()
+    assert a.coalescing_key() != a.override(fallback_config=FallbackConfig(allow_fallback=False)).coalescing_key()
+
+
+@pytest.mark.asyncio
+async def test_router_single_flight():
+    impl = MockStreamingProvider(["a"], delay=0.01)
+    calls = 0
+    completion = impl.completion
+
+    async def slow_completion(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return await completion(*args, **kwargs)
+
+    impl.completion = slow_completion
+    router = Router(
+        RouterConfig(
+            llm_provider_group={"group1": [LLMProviderConfig(model_id="p1", impl=impl)]},
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            single_flight_enabled=True,
+        )
+    )
+    try:
+        results = await asyncio.gather(
+            *(router.async_completion(RouterParams(model_group="group1", text="same")) for _ in range(3))
+        )
+        assert results == ["a"] * 3
+        assert calls == 1
+        assert router.single_flight.coalesced == 2
+    finally:
+        await router.close()
@@ -0,0 +1,186 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+import pytest_asyncio
+
+from src.config import RetryConfig, FallbackMode, FallbackConfig, LoadBalancerConfig, LoadBalancerStrategy
+from src.model.input import RouterParams
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from tests.mock_provider import MockStreamingProvider
+from src.exceptions.exceptions import InvalidInputError, RequestTimeoutError
+
+
+def create_router(groups, fallback_config=None):
+    return Router(
+        RouterConfig(
+            llm_provider_group=groups,
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            retry_config=RetryConfig(max_attempt=3),
+            fallback_config=fallback_config or FallbackConfig(),
+        )
+    )
+
+
+@pytest_asyncio.fixture(loop_scope="function")
+async def stream_provider():
+    return LLMProviderConfig(model_id="stream", impl=MockStreamingProvider(["a", "b", "c"]))
+
+
+async def collect(router, group="group1"):
+    return [chunk async for chunk in router.astream_completion(RouterParams(model_group=group, text="t"))]
+
+
+@pytest.mark.asyncio
+async def test_stream_chunks(stream_provider):
+    router = create_router({"group1": [stream_provider]})
+    router.rpm_tpm_manager.update_rpm_used_usage = AsyncMock()
+    router.rpm_tpm_manager.release_rpm_occupied = AsyncMock()
+    try:
+        assert await collect(router) == ["a", "b", "c"]
+        assert router.ttft_tracker.count(stream_provider.id) == 1
+        assert router.inter_chunk_tracker.count(stream_provider.id) == 2
+        router.rpm_tpm_manager.update_rpm_used_usage.assert_awaited_once()
+        router.rpm_tpm_manager.release_rpm_occupied.assert_not_awaited()
+        assert stream_provider.impl.closed == 1
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_inter_chunk_time_excludes_the_caller():
+    impl = MockStreamingProvider(["a", "b", "c"], delay=0.01)
+    router = create_router({"group1": [LLMProviderConfig(model_id="p1", impl=impl)]})
+    try:
+        async for _ in router.astream_completion(RouterParams(model_group="group1", text="t")):
+            await asyncio.sleep(0.1)
+        provider_id = router.routing_state.providers("group1")[0].id
+        assert router.inter_chunk_tracker.count(provider_id) == 2
+        assert router.inter_chunk_tracker.percentile(provider_id, 1) < 0.1
+
+        text = await router.metrics_text()
+        assert f'llm_router_ttft_seconds{{group="group1",provider="{provider_id}",quantile="0.5"}}' in text
+        assert f'llm_router_inter_chunk_seconds{{group="group1",provider="{provider_id}",quantile="0.99"}}' in text
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_read_ahead_is_bounded():
+    impl = MockStreamingProvider([str(i) for i in range(100)])
+    router = create_router({"group1": [LLMProviderConfig(model_id="p1", impl=impl)]})
+    try:
+        stream = router.astream_completion(RouterParams(model_group="group1", text="t"))
+        assert await anext(stream) == "0"
+        assert await anext(stream) == "1"
+        await asyncio.sleep(0.05)
+        provider_id = router.routing_state.providers("group1")[0].id
+        # The reader waits for the caller once the queue is full.
+        assert impl.read < 30
+        await stream.aclose()
+        assert router.inter_chunk_tracker.count(provider_id) == 1
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_retry_before_first_chunk():
+    impl = MockStreamingProvider(["a"], first_chunk_errors=[RequestTimeoutError(message="timeout")])
+    router = create_router({"group1": [LLMProviderConfig(model_id="p1", impl=impl)]})
+    try:
+        assert await collect(router) == ["a"]
+        assert impl.streams == 2
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_fallback_before_first_chunk():
+    broken = MockStreamingProvider(["a"], first_chunk_errors=[InvalidInputError(message="invalid input")])
+    backup = MockStreamingProvider(["b"])
+    router = create_router(
+        {
+            "group1": [LLMProviderConfig(model_id="p1", impl=broken)],
+            "group2": [LLMProviderConfig(model_id="p2", impl=backup)],
+        },
+        fallback_config=FallbackConfig(allow_fallback=True, degraded_map={"group1": ["group2"]}),
+    )
+    try:
+        assert await collect(router) == ["b"]
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_fallback_race_closes_losers():
+    broken = MockStreamingProvider(["a"], first_chunk_errors=[InvalidInputError(message="invalid input")])
+    fast = MockStreamingProvider(["b", "c"])
+    slow = MockStreamingProvider(["d"], delay=1)
+    router = create_router(
+        {
+            "group1": [LLMProviderConfig(model_id="p1", impl=broken)],
+            "group2": [LLMProviderConfig(model_id="p2", impl=slow)],
+            "group3": [LLMProviderConfig(model_id="p3", impl=fast)],
+        },
+        fallback_config=FallbackConfig(
+            allow_fallback=True, degraded_map={"group1": ["group2", "group3"]}, mode=FallbackMode.RACE
+        ),
+    )
+    router.rpm_tpm_manager.release_rpm_occupied = AsyncMock()
+    try:
+        assert await collect(router) == ["b", "c"]
+        # The slow group is cancelled before its first chunk, and its occupancy is released.
+        assert slow.closed == 1
+        released = [c.args for c in router.rpm_tpm_manager.release_rpm_occupied.await_args_list]
+        assert ("group2", slow_id(router)) in released
+    finally:
+        await router.close()
+
+
+def slow_id(router):
+    return router.provider_status_manager.provider_groups["group2"][0].id
+
+
+@pytest.mark.asyncio
+async def test_stream_error_after_first_chunk_is_raised():
+    impl = MockStreamingProvider(["a", "b"], error_after=1)
+    router = create_router({"group1": [LLMProviderConfig(model_id="p1", impl=impl)]})
+    router.rpm_tpm_manager.release_rpm_occupied = AsyncMock()
+    chunks = []
+    try:
+        with pytest.raises(RuntimeError):
+            async for chunk in router.astream_completion(RouterParams(model_group="group1", text="t")):
+                chunks.append(chunk)
+        assert chunks == ["a"]
+        assert impl.streams == 1
+        router.rpm_tpm_manager.release_rpm_occupied.assert_awaited_once()
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_closed_early_releases_occupancy(stream_provider):
+    router = create_router({"group1": [stream_provider]})
+    router.rpm_tpm_manager.update_rpm_used_usage = AsyncMock()
+    router.rpm_tpm_manager.release_rpm_occupied = AsyncMock()
+    try:
+        stream = router.astream_completion(RouterParams(model_group="group1", text="t"))
+        assert await anext(stream) == "a"
+        await stream.aclose()
+        router.rpm_tpm_manager.release_rpm_occupied.assert_awaited_once()
+        router.rpm_tpm_manager.update_rpm_used_usage.assert_not_awaited()
+        assert stream_provider.impl.closed == 1
+    finally:
+        await router.close()
+
+
+@pytest.mark.asyncio
+async def test_empty_stream():
+    impl = MockStreamingProvider([])
+    router = create_router({"group1": [LLMProviderConfig(model_id="p1", impl=impl)]})
+    try:
+        assert await collect(router) == []
+        assert router.ttft_tracker.count(router.routing_state.providers("group1")[0].id) == 0
+    finally:
+        await router.close()
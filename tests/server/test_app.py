@@ -0,0 +1,160 @@
+import asyncio
+from typing import Any
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from src.config import RetryConfig, GatewayConfig, LoadBalancerConfig, LoadBalancerStrategy
+from src.server import GatewayApp, codec
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from tests.mock_provider import MockEmbeddingProvider, MockStreamingProvider
+from src.router.base_provider import BaseLLMProvider
+from src.exceptions.exceptions import RateLimitError
+
+
+class SlowProvider(BaseLLMProvider):
+    def __init__(self, release: asyncio.Event):
+        self.release = release
+
+    async def completion(self, *_args, **_kwargs) -> Any:
+        await self.release.wait()
+        return "slow"
+
+
+class FailingProvider(BaseLLMProvider):
+    async def completion(self, *_args, **_kwargs) -> Any:
+        raise RateLimitError(message="rate limited")
+
+
+def create_app(groups, config=None):
+    router = Router(
+        RouterConfig(
+            llm_provider_group=groups,
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            retry_config=RetryConfig(max_attempt=1),
+        )
+    )
+    return GatewayApp(router, config)
+
+
+@pytest_asyncio.fixture(loop_scope="function")
+async def app():
+    app = create_app(
+        {
+            "chat": [LLMProviderConfig(model_id="chat", impl=MockStreamingProvider(["a", "b"]))],
+            "emb": [LLMProviderConfig(model_id="emb", impl=MockEmbeddingProvider())],
+            "failing": [LLMProviderConfig(model_id="failing", impl=FailingProvider())],
+        }
+    )
+    yield app
+    await app.router.close()
+
+
+def client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gateway")
+
+
+@pytest.mark.asyncio
+async def test_chat_completion(app):
+    async with client(app) as c:
+        response = await c.post(
+            "/v1/chat/completions", json={"model": "chat", "messages": [{"role": "user", "content": "hi"}]}
+        )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["choices"][0]["message"]["content"] == "ab"
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert app.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_chat_completion_stream(app):
+    async with client(app) as c:
+        response = await c.post("/v1/chat/completions", json={"model": "chat", "prompt": "hi", "stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/event-stream"
+    events = [line.removeprefix("data: ") for line in response.text.split("\n\n") if line]
+    assert [codec.loads(e)["choices"][0]["delta"]["content"] for e in events[:-1]] == ["a", "b"]
+    assert events[-1] == "[DONE]"
+
+
+@pytest.mark.asyncio
+async def test_embeddings(app):
+    async with client(app) as c:
+        response = await c.post("/v1/embeddings", json={"model": "emb", "input": ["a", "bcd"]})
+    assert response.status_code == 200
+    assert [d["embedding"] for d in response.json()["data"]] == [1, 3]
+
+
+@pytest.mark.asyncio
+async def test_errors(app):
+    async with client(app) as c:
+        assert (await c.get("/v1/models")).status_code == 404
+        assert (await c.post("/v1/embeddings", content=b"{")).status_code == 400
+        assert (await c.post("/v1/embeddings", json={"model": "emb", "input": []})).status_code == 400
+        assert (await c.post("/v1/embeddings", json={"model": "unknown", "input": "a"})).status_code == 404
+        response = await c.post("/v1/chat/completions", json={"model": "failing", "prompt": "hi"})
+    assert response.status_code == 429
+    assert response.json()["error"]["type"] == "rate_limit_error"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("timeout", ["soon", True, 0, -1, [1]])
+async def test_invalid_timeout(app, timeout):
+    async with client(app) as c:
+        chat = await c.post("/v1/chat/completions", json={"model": "chat", "prompt": "hi", "timeout": timeout})
+        embeddings = await c.post("/v1/embeddings", json={"model": "emb", "input": "a", "timeout": timeout})
+    assert (chat.status_code, embeddings.status_code) == (400, 400)
+    assert chat.json()["error"]["type"] == "invalid_request_error"
+
+
+@pytest.mark.asyncio
+async def test_load_shedding():
+    release = asyncio.Event()
+    app = create_app(
+        {"slow": [LLMProviderConfig(model_id="slow", impl=SlowProvider(release))]}, GatewayConfig(max_in_flight=2)
+    )
+    try:
+        async with client(app) as c:
+            request = {"model": "slow", "prompt": "hi"}
+            pending = [asyncio.create_task(c.post("/v1/chat/completions", json=request)) for _ in range(2)]
+            while app.in_flight < 2:
+                await asyncio.sleep(0.001)
+            shed = await c.post("/v1/chat/completions", json=request)
+            assert shed.status_code == 503
+            assert shed.headers["retry-after"] == "1"
+            # The scrapes are not shed.
+            scrape = await c.get("/metrics")
+            assert scrape.status_code == 200
+            assert scrape.headers["content-type"].startswith("text/plain; version=0.0.4")
+            assert "\nllm_router_gateway_in_flight 2\n" in scrape.text
+            assert "\nllm_router_gateway_shed_total 1\n" in scrape.text
+            release.set()
+            assert [r.status_code for r in await asyncio.gather(*pending)] == [200, 200]
+        assert (app.shed, app.in_flight) == (1, 0)
+    finally:
+        await app.router.close()
+
+
+def test_codec():
+    assert codec.loads(codec.dumps({"a": [1, "é"]})) == {"a": [1, "é"]}
+    assert b" " not in codec.dumps({"a": [1, 2]})
+
+
+@pytest.mark.asyncio
+async def test_lifespan_warms_up_and_closes(app, caplog):
+    messages = asyncio.Queue()
+    sent = []
+
+    async def send(message):
+        sent.append(message["type"])
+
+    await messages.put({"type": "lifespan.startup"})
+    await messages.put({"type": "lifespan.shutdown"})
+    await app({"type": "lifespan"}, messages.get, send)
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert app.warmup_task.done() and app.warmup_task.exception() is None
+    # The codec in use is logged at startup.
+    assert any(codec.NAME in r.getMessage() for r in caplog.records)
@@ -17,6 +17,7 @@ def mock_token_counter(mock_logger):
     logger_cfg = LogConfiguration()
     counter = TokenCounter(logger_cfg)
     counter.logger = mock_logger
+    counter.registry.logger = mock_logger
     return counter
 
 
@@ -39,8 +40,7 @@ def mock_messages(mock_text):
 
 
 def test_select_llama_tokenizer(mock_token_counter):
-    mock_token_counter._select_tokenizer_helper.cache_clear()
-    with patch("src.token.counter.Tokenizer.from_pretrained") as mock_from_pretrained:
+    with patch("tokenizers.Tokenizer.from_pretrained") as mock_from_pretrained:
         result = mock_token_counter._select_tokenizer_helper("llama-3-8b")
         mock_from_pretrained.assert_called_once_with("Xenova/llama-3-tokenizer")
         assert result.tokenizer_type == TokenizerType.HuggingFace
@@ -69,7 +69,7 @@ def test_openai_token_counting_with_tools(mock_token_counter):
 
 
 def test_token_counter_with_huggingface(mock_token_counter):
-    with patch("src.token.counter.Tokenizer") as mock_tokenizer:
+    with patch("tokenizers.Tokenizer") as mock_tokenizer:
         mock_encoder = Mock()
         mock_encoder.encode.return_value.ids = [1, 2, 3]
         mock_token_counter._select_tokenizer_helper = Mock(
@@ -92,8 +92,7 @@ def test_tool_choice_handling(mock_token_counter):
 
 
 def test_caching_mechanism(mock_token_counter):
-    mock_token_counter._select_tokenizer_helper.cache_clear()
-    with patch("src.token.counter.Tokenizer.from_pretrained") as mock_from_pretrained:
+    with patch("tokenizers.Tokenizer.from_pretrained") as mock_from_pretrained:
         mock_token_counter._select_tokenizer_helper("llama-3-8b")
         mock_token_counter._select_tokenizer_helper("llama-3-8b")
         actual_call = mock_from_pretrained.call_count
@@ -0,0 +1,112 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+
+from src.config import TokenizerSpec, TokenizerConfig, LogConfiguration, LoadBalancerConfig, LoadBalancerStrategy
+from src.model.input import RouterParams
+from src.config.config import RouterConfig, LLMProviderConfig
+from src.router.router import Router
+from src.token.counter import TokenCounter
+from src.token.registry import TokenizerType, TokenizerRegistry
+from tests.mock_provider import MockStreamingProvider
+
+
+@pytest.fixture
+def tokenizer_file(tmp_path):
+    tokenizer = Tokenizer(WordLevel({"[UNK]": 0, "hello": 1, "world": 2}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    path = tmp_path / "tokenizer.json"
+    tokenizer.save(str(path))
+    return str(path)
+
+
+def create_registry(**kwargs) -> TokenizerRegistry:
+    return TokenizerRegistry(LogConfiguration(), TokenizerConfig(**kwargs))
+
+
+def test_match_in_order():
+    registry = create_registry(
+        tokenizers=[TokenizerSpec("gpt-4o*", encoding="o200k_base"), TokenizerSpec("gpt-*", encoding="cl100k_base")]
+    )
+    assert registry.match("GPT-4o-mini").encoding == "o200k_base"
+    assert registry.match("gpt-3.5-turbo").encoding == "cl100k_base"
+    assert registry.match("qwen2.5") is None
+
+
+def test_local_tokenizer_without_download(tokenizer_file):
+    registry = create_registry(tokenizers=[TokenizerSpec("llama-3*", path=tokenizer_file)])
+    counter = TokenCounter(LogConfiguration(), registry)
+    with patch("tokenizers.Tokenizer.from_pretrained") as from_pretrained:
+        assert counter.token_counter(model="llama-3-8b", text="hello big world") == 3
+        assert counter.token_counter(model="Llama-3-70b", text="hello") == 1
+        from_pretrained.assert_not_called()
+    # The models of a rule share its tokenizer.
+    assert registry.get("llama-3-8b") is registry.get("Llama-3-70b")
+    assert registry.get("llama-3-8b").tokenizer_type == TokenizerType.HuggingFace
+
+
+def test_download_disabled():
+    registry = create_registry(allow_download=False)
+    with patch("tokenizers.Tokenizer.from_pretrained") as from_pretrained:
+        func = registry.get("llama-3-8b")
+        from_pretrained.assert_not_called()
+    assert func is registry.get("")
+    assert func.tokenizer.name == "cl100k_base"
+
+
+def test_tiktoken_cache_dir_is_scoped_to_the_load(monkeypatch):
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", "/shared/cache")
+    registry = create_registry(tiktoken_cache_dir="/router/cache")
+    assert os.environ["TIKTOKEN_CACHE_DIR"] == "/shared/cache"
+    with patch("src.token.registry._tiktoken") as tiktoken:
+        tiktoken.return_value.get_encoding.side_effect = lambda _name: os.environ["TIKTOKEN_CACHE_DIR"]
+        assert registry.get("").tokenizer == "/router/cache"
+    assert os.environ["TIKTOKEN_CACHE_DIR"] == "/shared/cache"
+
+
+def test_warmup_loads_every_rule(tokenizer_file):
+    registry = create_registry(
+        tokenizers=[TokenizerSpec("llama-3*", path=tokenizer_file), TokenizerSpec("gpt-*", encoding="cl100k_base")]
+    )
+    registry.warmup()
+    assert set(registry._loaded) == {("encoding", "cl100k_base"), ("path", tokenizer_file)}
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"pattern": "", "encoding": "cl100k_base"}, {"pattern": "x"}, {"pattern": "x", "encoding": "e", "path": "p"}],
+)
+def test_invalid_spec(kwargs):
+    with pytest.raises(ValueError):
+        TokenizerSpec(**kwargs)
+
+
+@pytest.mark.asyncio
+async def test_router_uses_the_tokenizer_of_the_group(tokenizer_file):
+    router = Router(
+        RouterConfig(
+            llm_provider_group={
+                "llama": [LLMProviderConfig(model_id="llama-3-8b", impl=MockStreamingProvider(["a"]))],
+                "other": [LLMProviderConfig(model_id="qwen2.5", impl=MockStreamingProvider(["a"]))],
+            },
+            load_balancer_config=LoadBalancerConfig(strategy=LoadBalancerStrategy.RANDOM),
+            tokenizer_config=TokenizerConfig(tokenizers=[TokenizerSpec("llama-3*", path=tokenizer_file)]),
+        )
+    )
+    try:
+        await router.warmup()
+        assert ("path", tokenizer_file) in router.tokenizers._loaded
+        assert router._token_model("llama") == "llama-3-8b"
+        assert router._token_model("other") == ""
+        assert (
+            router._create_context(
+                router.normalize_input(RouterParams(model_group="llama", text="hello big world"))
+            ).token_count
+            == 3
+        )
+    finally:
+        await router.close()
@@ -1,9 +1,11 @@
 import asyncio
+import threading
 from unittest.mock import MagicMock, patch
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
-from src.utils.asyncy import run_async_function
+from src.utils.asyncy import BackgroundLoop, run_async_function
 
 
 async def sample_async_function(x):
@@ -78,3 +80,57 @@ def test_multiple_concurrent_calls():
 
     results = run_async_function(run_multiple)
     assert results == [0, 2, 4, 6, 8]
+
+
+def test_background_loop_shares_state_across_threads():
+    background = BackgroundLoop()
+    lock_holder = {}
+
+    async def locked_increment(x):
+        # The lock is bound to the background loop, it works for every caller thread.
+        lock = lock_holder.setdefault("lock", asyncio.Lock())
+        async with lock:
+            await asyncio.sleep(0.001)
+            return x + 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: background.run(locked_increment(i)), range(32)))
+        assert results == list(range(1, 33))
+    finally:
+        background.stop()
+    assert not background.is_running()
+
+
+def test_background_loop_timeout_cancels():
+    background = BackgroundLoop()
+    cancelled = threading.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    try:
+        with pytest.raises(TimeoutError):
+            background.run(slow(), timeout=0.01)
+        assert cancelled.wait(1)
+        with pytest.raises(ValueError, match="Test error"):
+            background.run(failing_async_function())
+    finally:
+        background.stop()
+
+
+def test_background_loop_rejects_own_thread():
+    background = BackgroundLoop()
+
+    async def reenter():
+        return background.run(sample_async_function(1))
+
+    try:
+        with pytest.raises(RuntimeError):
+            background.run(reenter())
+    finally:
+        background.stop()